@@ -0,0 +1,162 @@
+"""
+Fake Office applications for the benchmarks of the COM (office_toolbox) code paths, without Windows nor Office.
+
+FakeDispatch replaces win32com.client.Dispatch as the dispatch function of an ApplicationPool. Every method call on
+a fake COM object sleeps a configurable latency (the cost of a cross-process COM call) and is counted, so that the
+benchmarks measure the number of round trips of a code path as well as its overhead.
+
+Example::
+
+    dispatch = FakeDispatch(latency=0.02, startup_latency=2.0)
+    with LabelingSession(configuration_file, pool=ApplicationPool(dispatch=dispatch)) as session:
+        ...
+    print(dispatch.calls)
+"""
+
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+
+class FakeDispatch:
+    """
+    Creates fake Office applications, ex: FakeDispatch(latency=0.01)("Excel.Application").
+
+    Attributes:
+        latency (float): Time, in seconds, slept by each COM method call.
+        startup_latency (float): Time, in seconds, slept when an application is started.
+        calls (Counter): Number of COM method calls, by "<Object>.<Method>".
+    """
+
+    def __init__(self, latency: float = 0.0, startup_latency: float = 0.0):
+        self.latency = latency
+        self.startup_latency = startup_latency
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def call(self, name: str) -> None:
+        """Records a COM method call and sleeps the latency."""
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def __call__(self, prog_id: str) -> "FakeApplication":
+        self.call("Dispatch")
+        if self.startup_latency:
+            time.sleep(self.startup_latency)
+        return FakeApplication(self, prog_id)
+
+
+class FakeLabelInfo:
+    """A LabelInfo object, each read or write of one of its properties is a counted COM call."""
+
+    _PROPERTIES = {
+        "ActionId": "",
+        "AssignmentMethod": -1,
+        "ContentBits": 0,
+        "IsEnabled": False,
+        "Justification": "",
+        "LabelId": "",
+        "LabelName": "",
+        "SetDate": "",
+        "SiteId": "",
+    }
+
+    def __init__(self, dispatch: FakeDispatch):
+        object.__setattr__(self, "_dispatch", dispatch)
+        object.__setattr__(self, "_values", dict(self._PROPERTIES))
+
+    def __getattr__(self, name: str):
+        # only called for the names that are not regular attributes
+        values = object.__getattribute__(self, "_values")
+        if name not in values:
+            raise AttributeError(name)
+        object.__getattribute__(self, "_dispatch").call(f"LabelInfo.{name}")
+        return values[name]
+
+    def __setattr__(self, name: str, value) -> None:
+        if name not in self._PROPERTIES:
+            raise AttributeError(name)
+        self._dispatch.call(f"LabelInfo.{name}=")
+        self._values[name] = value
+
+    def __dir__(self):
+        return list(self._PROPERTIES)
+
+
+class FakeSensitivityLabel:
+    """The SensitivityLabel object of a document."""
+
+    def __init__(self, document: "FakeDocument"):
+        self._document = document
+
+    def CreateLabelInfo(self) -> FakeLabelInfo:
+        self._document._dispatch.call("SensitivityLabel.CreateLabelInfo")
+        return FakeLabelInfo(self._document._dispatch)
+
+    def GetLabel(self) -> FakeLabelInfo:
+        self._document._dispatch.call("SensitivityLabel.GetLabel")
+        return self._document._label or FakeLabelInfo(self._document._dispatch)
+
+    def SetLabel(self, label_info: FakeLabelInfo, context: object) -> None:
+        self._document._dispatch.call("SensitivityLabel.SetLabel")
+        label_info._values["IsEnabled"] = True
+        self._document._label = label_info
+
+
+class FakeDocument:
+    """A workbook or a Word document. Saving does not write the file."""
+
+    def __init__(self, dispatch: FakeDispatch, filename: Optional[str] = None):
+        self._dispatch = dispatch
+        self._label: Optional[FakeLabelInfo] = None
+        self.FullName = filename
+
+    @property
+    def SensitivityLabel(self) -> FakeSensitivityLabel:
+        self._dispatch.call("Document.SensitivityLabel")
+        return FakeSensitivityLabel(self)
+
+    def Save(self) -> None:
+        self._dispatch.call("Document.Save")
+
+    def SaveAs(self, filename: str, *argv, **kwargs) -> None:
+        self._dispatch.call("Document.SaveAs")
+        self.FullName = filename
+
+    def SaveAs2(self, filename: str, *argv, **kwargs) -> None:
+        self._dispatch.call("Document.SaveAs2")
+        self.FullName = filename
+
+    def Close(self, *argv, **kwargs) -> None:
+        self._dispatch.call("Document.Close")
+
+
+class FakeDocuments:
+    """The Workbooks (Excel) or Documents (Word) collection of an application."""
+
+    def __init__(self, dispatch: FakeDispatch):
+        self._dispatch = dispatch
+
+    def Open(self, filename: str, *argv, **kwargs) -> FakeDocument:
+        self._dispatch.call("Documents.Open")
+        return FakeDocument(self._dispatch, filename)
+
+    def Add(self, *argv, **kwargs) -> FakeDocument:
+        self._dispatch.call("Documents.Add")
+        return FakeDocument(self._dispatch)
+
+
+class FakeApplication:
+    """An Excel.Application or Word.Application object."""
+
+    def __init__(self, dispatch: FakeDispatch, prog_id: str):
+        self._dispatch = dispatch
+        self.prog_id = prog_id
+        self.Visible = False
+        self.Workbooks = self.Documents = FakeDocuments(dispatch)
+
+    def Quit(self) -> None:
+        self._dispatch.call("Application.Quit")
@@ -0,0 +1,226 @@
+"""
+Import time regression check of the pygadgeteer entry points.
+
+A short lived process (a bulk_label run on one folder, a label_client call, ...) pays the import of its modules on
+every start. Each entry module is imported in a fresh interpreter, which reports the import time and the heavy
+modules loaded: pydantic and openpyxl are imported when a label is validated or a workbook is labeled with openpyxl,
+pywin32 when Office is driven through COM, not when the modules are imported::
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 10 --max-milliseconds 150
+
+The command exits with status 1 when an entry module imports a heavy module it is not allowed to, or when its import
+takes longer than the given budget (the time budget is machine dependent, so it is only checked when given).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# modules that take a significant part of the start of a process, or are not available on every platform
+HEAVY_MODULES = (
+    "pydantic",
+    "openpyxl",
+    "pandas",
+    "xlsxwriter",
+    "pythoncom",
+    "win32com",
+)
+
+# entry modules, and the heavy modules each of them is allowed to import
+ENTRY_MODULES: Dict[str, Tuple[str, ...]] = {
+    "label_toolbox.bulk_label": (),
+    "label_toolbox.label_classifier": (),
+    "label_toolbox.label_client": (),
+    "label_toolbox.label_definition": (),
+    "label_toolbox.label_engine": (),
+    "label_toolbox.label_inventory": (),
+    "label_toolbox.label_policy": (),
+    "label_toolbox.label_service": (),
+    "label_toolbox.label_table": (),
+    "label_toolbox.label_watcher": (),
+    "ooxml_toolbox.sensitivity_manager": (),
+    "office_toolbox.labeling_session": (),
+    "office_toolbox.set_sensitivity_label": (),
+    # MSIP_Label is a pydantic model
+    "openpyxl_toolbox.sensitivity_manager": ("pydantic",),
+}
+
+# run by the fresh interpreter: json is imported after the measure, the entry module may need it
+_PROBE = """
+import importlib, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+import json
+print(json.dumps({"seconds": seconds, "modules": [name for name in sys.argv[2:] if name in sys.modules]}))
+"""
+
+# directory of the pygadgeteer packages
+_PACKAGES_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ImportReport(NamedTuple):
+    """Import of an entry module in a fresh interpreter.
+
+    Attributes:
+        module (str): The entry module.
+        seconds (float): The fastest import of the module, in seconds.
+        process_seconds (float): The fastest run of the interpreter importing the module (start, import and exit),
+            in seconds.
+        heavy_modules (Tuple[str, ...]): The heavy modules loaded by the import.
+        unexpected (Tuple[str, ...]): The heavy modules loaded that the module is not allowed to import.
+    """
+
+    module: str
+    seconds: float
+    process_seconds: float
+    heavy_modules: Tuple[str, ...]
+    unexpected: Tuple[str, ...]
+
+
+def import_command(module: str) -> List[str]:
+    """Returns the command importing a module in a fresh interpreter and printing its import report as JSON."""
+    return [sys.executable, "-c", _PROBE, module, *HEAVY_MODULES]
+
+
+def import_environment() -> Dict[str, str]:
+    """Returns the environment of the fresh interpreters, where the pygadgeteer packages can be imported."""
+    environment = dict(os.environ)
+    path = environment.get("PYTHONPATH")
+    environment["PYTHONPATH"] = (
+        os.pathsep.join((_PACKAGES_ROOT, path)) if path else _PACKAGES_ROOT
+    )
+    return environment
+
+
+def measure_import(
+    module: str, repeat: int = 3, allowed: Iterable[str] = ()
+) -> ImportReport:
+    """
+    Imports a module in fresh interpreters.
+
+    Args:
+        module (str): The module to import.
+        repeat (int): Number of interpreters started, the fastest one is reported.
+        allowed (Iterable[str]): The heavy modules the module is allowed to import.
+
+    Returns:
+        ImportReport: The import time and the heavy modules loaded.
+
+    Raises:
+        subprocess.CalledProcessError: If the module cannot be imported.
+    """
+    command = import_command(module)
+    environment = import_environment()
+    seconds = process_seconds = float("inf")
+    heavy_modules: Tuple[str, ...] = ()
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            command, env=environment, capture_output=True, text=True, check=True
+        )
+        process_seconds = min(process_seconds, time.perf_counter() - start)
+        report = json.loads(completed.stdout.splitlines()[-1])
+        seconds = min(seconds, report["seconds"])
+        heavy_modules = tuple(report["modules"])
+    allowed = set(allowed)
+    unexpected = tuple(name for name in heavy_modules if name not in allowed)
+    return ImportReport(module, seconds, process_seconds, heavy_modules, unexpected)
+
+
+def check_imports(
+    modules: Optional[Dict[str, Tuple[str, ...]]] = None,
+    repeat: int = 3,
+    max_seconds: Optional[float] = None,
+) -> Tuple[List[ImportReport], List[str]]:
+    """
+    Imports the entry modules and checks them against their allowed heavy modules and the time budget.
+
+    Args:
+        modules (Optional[Dict[str, Tuple[str, ...]]]): The modules to import, and the heavy modules each of them is
+            allowed to import. Defaults to ENTRY_MODULES.
+        repeat (int): Number of imports of each module, the fastest one is checked.
+        max_seconds (Optional[float]): Import time budget of each module, in seconds. Not checked when None.
+
+    Returns:
+        Tuple[List[ImportReport], List[str]]: The report of each module, and the description of each regression.
+    """
+    reports = []
+    regressions = []
+    for module, allowed in (modules or ENTRY_MODULES).items():
+        try:
+            report = measure_import(module, repeat, allowed)
+        except subprocess.CalledProcessError as error:
+            # the last line of the traceback
+            reason = error.stderr.strip().splitlines()[-1]
+            regressions.append(f"{module} cannot be imported: {reason}")
+            continue
+        reports.append(report)
+        if report.unexpected:
+            regressions.append(f"{module} imports {', '.join(report.unexpected)}")
+        if max_seconds is not None and report.seconds > max_seconds:
+            regressions.append(
+                f"{module} takes {report.seconds * 1000:.0f}ms to import,"
+                f" more than {max_seconds * 1000:.0f}ms"
+            )
+    return reports, regressions
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.import_time",
+        description="Checks the import time and the heavy imports of the pygadgeteer entry points.",
+    )
+    parser.add_argument(
+        "modules",
+        nargs="*",
+        help="modules to check, default to the entry modules (see ENTRY_MODULES)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="imports of each module, the fastest one is checked",
+    )
+    parser.add_argument(
+        "--max-milliseconds",
+        type=float,
+        help="import time budget of each module, not checked by default",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="prints the reports as JSON"
+    )
+    args = parser.parse_args(argv)
+
+    modules = (
+        {module: ENTRY_MODULES.get(module, ()) for module in args.modules}
+        if args.modules
+        else None
+    )
+    max_seconds = (
+        args.max_milliseconds / 1000 if args.max_milliseconds is not None else None
+    )
+    reports, regressions = check_imports(modules, args.repeat, max_seconds)
+    if args.json:
+        print(json.dumps([report._asdict() for report in reports], indent=4))
+    else:
+        for report in reports:
+            print(
+                f"{report.module:40} {report.seconds * 1000:8.1f}ms"
+                f" {report.process_seconds * 1000:8.1f}ms"
+                f"  {', '.join(report.heavy_modules)}"
+            )
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
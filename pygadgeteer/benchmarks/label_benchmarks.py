@@ -0,0 +1,624 @@
+"""
+Benchmarks of the sensitivity label read and write paths, across engines and document sizes.
+
+Each benchmark case runs in a fresh process (so that its peak RSS is its own), on synthetic documents generated in a
+work directory (see benchmarks.synthetic_documents). A case measures the latency of each operation, the throughput
+(operations, files and bytes per second) and the peak RSS of the process. The COM code paths are measured with fake
+Office applications (see benchmarks.fake_office) and a configurable latency per COM call; pywin32 is imported on
+first use, so they also run where it is not installed. The import cases start a fresh interpreter importing an entry
+module (see benchmarks.import_time).
+
+The results are written as JSON, with the commit and the platform, so that two runs can be compared::
+
+    python -m benchmarks.label_benchmarks --output before.json
+    git checkout <branch>
+    python -m benchmarks.label_benchmarks --output after.json --baseline before.json
+
+Profiles: "quick" (documents up to 10 MB, a few minutes) and "full" (documents up to hundreds of MB and thousands of
+custom properties).
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from json_toolbox import DateTimeEncoder
+
+from .fake_office import FakeDispatch
+from .import_time import ENTRY_MODULES, import_command, import_environment
+from .synthetic_documents import write_synthetic_document, write_synthetic_tree
+
+logger = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+BENCHMARK_LABEL = "Benchmark"
+DEFAULT_REPEAT = 5
+DEFAULT_LATENCY = 0.005
+
+KB = 1024
+MB = 1024 * KB
+
+
+class BenchmarkSkipped(Exception):
+    """Raised by the setup of a benchmark that cannot run here (ex: pywin32 not installed)."""
+
+
+class BenchmarkCase(NamedTuple):
+    """A benchmark to run.
+
+    Attributes:
+        name (str): Unique name of the case, ex: "get_label_from_file/xlsx/10MB".
+        benchmark (str): Name of the benchmark, a key of BENCHMARKS.
+        parameters (Dict[str, Any]): Arguments of the benchmark setup.
+        repeat (int): Number of measured operations (after one warm up operation).
+    """
+
+    name: str
+    benchmark: str
+    parameters: Dict[str, Any]
+    repeat: int = DEFAULT_REPEAT
+
+
+# an operation, the number of files and the number of bytes it processes; the operations of the COM benchmarks have
+# a com_calls attribute, the COM calls counter of their fake Office
+Operation = Tuple[Callable[[], Any], int, int]
+
+
+def peak_rss() -> Optional[int]:
+    """Returns the peak resident set size of the process, in bytes (None if it cannot be measured)."""
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * KB
+
+
+def _children_peak_rss() -> Optional[int]:
+    """Peak resident set size of the largest terminated child process (bulk workers), in bytes."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * KB
+
+
+def _write_configuration(filename: str, labels: int) -> None:
+    """Writes an openpyxl labels configuration, its first label is BENCHMARK_LABEL."""
+    configuration = {}
+    for index in range(labels):
+        name = BENCHMARK_LABEL if index == 0 else f"{BENCHMARK_LABEL}{index}"
+        configuration[name] = {
+            "LabelId": f"00000000-0000-0000-0000-{index:012d}",
+            "LabelName": name,
+            "ActionId": None,
+            "AssignmentMethod": "Privileged",
+            "ContentBits": 0,
+            "IsEnabled": True,
+            "Justification": None,
+            "SetDate": None,
+            "SiteId": "00000000-0000-0000-0000-000000000000",
+        }
+    with open(filename, "w") as fh_out:
+        json.dump(configuration, fh_out, indent=4)
+
+
+def _document(work_dir: str, extension: str, size: int, properties: int) -> str:
+    """Generates (once per work directory) a labeled synthetic document."""
+    filename = os.path.join(work_dir, f"document_{size}_{properties}{extension}")
+    if not os.path.exists(filename):
+        from openpyxl_toolbox.label_record import label_to_properties
+
+        label = _label(work_dir)
+        write_synthetic_document(
+            filename, size, properties, label_to_properties(label.model_copy())
+        )
+    return filename
+
+
+def _configuration(work_dir: str, labels: int = 1) -> str:
+    filename = os.path.join(work_dir, f"labels_{labels}.json")
+    if not os.path.exists(filename):
+        _write_configuration(filename, labels)
+    return filename
+
+
+def _label(work_dir: str):
+    from openpyxl_toolbox.sensitivity_manager import MSIP_Configuration
+
+    return (
+        MSIP_Configuration(_configuration(work_dir))
+        .load()
+        .get_sensitivity_label(BENCHMARK_LABEL)
+    )
+
+
+def _tree(
+    work_dir: str, extension: str, files: int, size: int
+) -> Tuple[str, List[str]]:
+    root = os.path.join(work_dir, f"tree_{files}_{size}{extension[1:]}")
+    template = _document(work_dir, extension, size, 0)
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    return root, write_synthetic_tree(root, files, template)
+
+
+def _bench_get_label_from_file(
+    work_dir: str, extension: str, size: int, properties: int = 0
+) -> Operation:
+    from openpyxl_toolbox.sensitivity_manager import get_label_from_file
+
+    filename = _document(work_dir, extension, size, properties)
+    return (
+        lambda: get_label_from_file(filename),
+        1,
+        os.path.getsize(filename),
+    )
+
+
+def _bench_set_label_to_file(
+    work_dir: str, extension: str, size: int, properties: int = 0
+) -> Operation:
+    from openpyxl_toolbox.sensitivity_manager import set_label_to_file
+
+    filename = _document(work_dir, extension, size, properties)
+    # labeled in place: work on a copy of the generated document
+    root, extension = os.path.splitext(filename)
+    copy = f"{root}_{os.getpid()}{extension}"
+    shutil.copyfile(filename, copy)
+    label = _label(work_dir)
+    return (
+        lambda: set_label_to_file(copy, label, force=True),
+        1,
+        os.path.getsize(filename),
+    )
+
+
+def _bench_configuration_load(work_dir: str, labels: int, cold: bool) -> Operation:
+    from label_toolbox.label_registry import clear_label_registries
+    from openpyxl_toolbox.sensitivity_manager import MSIP_Configuration
+
+    filename = _configuration(work_dir, labels)
+
+    def operation():
+        if cold:
+            clear_label_registries()
+        return MSIP_Configuration(filename).load()
+
+    return operation, 1, os.path.getsize(filename)
+
+
+def _bench_bulk_label(
+    work_dir: str, extension: str, files: int, size: int, workers: Optional[int]
+) -> Operation:
+    from collections import deque
+
+    from label_toolbox.bulk_label import bulk_label
+
+    root, paths = _tree(work_dir, extension, files, size)
+    label = _label(work_dir)
+    total_size = sum(os.path.getsize(path) for path in paths)
+    return (
+        lambda: deque(bulk_label(root, label, max_workers=workers, force=True), 0),
+        files,
+        total_size,
+    )
+
+
+def _bench_read_label_table(
+    work_dir: str, extension: str, files: int, size: int
+) -> Operation:
+    from label_toolbox.label_table import read_label_table
+
+    _, paths = _tree(work_dir, extension, files, size)
+    total_size = sum(os.path.getsize(path) for path in paths)
+    return lambda: read_label_table(paths), files, total_size
+
+
+def _com_modules():
+    try:
+        from office_toolbox.application_pool import ApplicationPool
+        from office_toolbox.labeling_session import LabelingSession
+        from office_toolbox.set_sensitivity_label import (
+            set_sensitivity_label_to_file,
+        )
+    except ImportError as error:
+        raise BenchmarkSkipped(f"COM code path not available: {error}")
+    return ApplicationPool, LabelingSession, set_sensitivity_label_to_file
+
+
+def _bench_com_labeling_session(work_dir: str, files: int, latency: float) -> Operation:
+    ApplicationPool, LabelingSession, _ = _com_modules()
+    _, paths = _tree(work_dir, ".xlsx", files, 0)
+    configuration = _configuration(work_dir)
+
+    dispatch = FakeDispatch(latency)
+
+    def operation():
+        pool = ApplicationPool(dispatch=dispatch, max_size=1)
+        with LabelingSession(configuration, pool=pool) as session:
+            for _ in session.label_files(paths, BENCHMARK_LABEL, force=True):
+                pass
+        pool.close()
+
+    operation.com_calls = dispatch.calls
+    return operation, files, 0
+
+
+def _bench_com_set_sensitivity_label_to_file(
+    work_dir: str, files: int, latency: float
+) -> Operation:
+    ApplicationPool, _, set_sensitivity_label_to_file = _com_modules()
+    _, paths = _tree(work_dir, ".xlsx", files, 0)
+    configuration = _configuration(work_dir)
+
+    dispatch = FakeDispatch(latency)
+
+    def operation():
+        pool = ApplicationPool(dispatch=dispatch, max_size=1)
+        for path in paths:
+            set_sensitivity_label_to_file(
+                path, BENCHMARK_LABEL, configuration, pool=pool, force=True
+            )
+        pool.close()
+
+    operation.com_calls = dispatch.calls
+    return operation, files, 0
+
+
+def _bench_import(work_dir: str, module: str) -> Operation:
+    command = import_command(module)
+    environment = import_environment()
+
+    def operation():
+        subprocess.run(command, env=environment, capture_output=True, check=True)
+
+    return operation, 0, 0
+
+
+BENCHMARKS: Dict[str, Callable[..., Operation]] = {
+    "get_label_from_file": _bench_get_label_from_file,
+    "set_label_to_file": _bench_set_label_to_file,
+    "configuration_load": _bench_configuration_load,
+    "bulk_label": _bench_bulk_label,
+    "read_label_table": _bench_read_label_table,
+    "com_labeling_session": _bench_com_labeling_session,
+    "com_set_sensitivity_label_to_file": _bench_com_set_sensitivity_label_to_file,
+    "import": _bench_import,
+}
+
+
+def _size_name(size: int) -> str:
+    return f"{size // MB}MB" if size >= MB else f"{size // KB}KB"
+
+
+def benchmark_cases(
+    profile: str = "quick",
+    repeat: int = DEFAULT_REPEAT,
+    latency: float = DEFAULT_LATENCY,
+) -> List[BenchmarkCase]:
+    """
+    Returns the benchmark cases of a profile.
+
+    Args:
+        profile (str): "quick" or "full".
+        repeat (int): Number of measured operations per case (the bulk and COM cases run once per file already).
+        latency (float): Latency of each fake COM call, in seconds.
+
+    Raises:
+        ValueError: If the profile is unknown.
+    """
+    if profile == "quick":
+        sizes = [10 * KB, MB, 10 * MB]
+        properties = [1000]
+        labels = [10, 1000]
+        files, com_files = 200, 20
+    elif profile == "full":
+        sizes = [10 * KB, MB, 10 * MB, 100 * MB, 500 * MB]
+        properties = [1000, 5000]
+        labels = [10, 1000, 10000]
+        files, com_files = 5000, 200
+    else:
+        raise ValueError(f"Unknown benchmark profile {profile}")
+
+    cases = []
+    for extension in (".xlsx", ".docx"):
+        for size in sizes:
+            parameters = {"extension": extension, "size": size}
+            suffix = f"{extension[1:]}/{_size_name(size)}"
+            cases.append(
+                BenchmarkCase(
+                    f"get_label_from_file/{suffix}",
+                    "get_label_from_file",
+                    parameters,
+                    repeat,
+                )
+            )
+            cases.append(
+                BenchmarkCase(
+                    f"set_label_to_file/{suffix}",
+                    "set_label_to_file",
+                    parameters,
+                    repeat,
+                )
+            )
+    for count in properties:
+        parameters = {"extension": ".xlsx", "size": MB, "properties": count}
+        for benchmark in ("get_label_from_file", "set_label_to_file"):
+            cases.append(
+                BenchmarkCase(
+                    f"{benchmark}/xlsx/1MB/{count}_properties",
+                    benchmark,
+                    parameters,
+                    repeat,
+                )
+            )
+    for count in labels:
+        for cold in (True, False):
+            cases.append(
+                BenchmarkCase(
+                    f"configuration_load/{count}_labels/{'cold' if cold else 'warm'}",
+                    "configuration_load",
+                    {"labels": count, "cold": cold},
+                    repeat,
+                )
+            )
+    for workers in (1, None):
+        cases.append(
+            BenchmarkCase(
+                f"bulk_label/xlsx/{files}_files/{workers or 'all'}_workers",
+                "bulk_label",
+                {
+                    "extension": ".xlsx",
+                    "files": files,
+                    "size": 10 * KB,
+                    "workers": workers,
+                },
+                1,
+            )
+        )
+    cases.append(
+        BenchmarkCase(
+            f"read_label_table/xlsx/{files}_files",
+            "read_label_table",
+            {"extension": ".xlsx", "files": files, "size": 10 * KB},
+            1,
+        )
+    )
+    for benchmark in ("com_labeling_session", "com_set_sensitivity_label_to_file"):
+        cases.append(
+            BenchmarkCase(
+                f"{benchmark}/{com_files}_files/{latency * 1000:g}ms",
+                benchmark,
+                {"files": com_files, "latency": latency},
+                1,
+            )
+        )
+    for module in ENTRY_MODULES:
+        cases.append(
+            BenchmarkCase(f"import/{module}", "import", {"module": module}, repeat)
+        )
+    return cases
+
+
+def run_case(case: BenchmarkCase, work_dir: str) -> Dict[str, Any]:
+    """
+    Runs a benchmark case in the current process.
+
+    Args:
+        case (BenchmarkCase): The case to run.
+        work_dir (str): Directory of the synthetic documents.
+
+    Returns:
+        Dict[str, Any]: The result of the case (see run_benchmarks).
+    """
+    result: Dict[str, Any] = {
+        "name": case.name,
+        "benchmark": case.benchmark,
+        "parameters": case.parameters,
+        "repeat": case.repeat,
+    }
+    try:
+        operation, files, size = BENCHMARKS[case.benchmark](work_dir, **case.parameters)
+    except BenchmarkSkipped as skipped:
+        result["skipped"] = str(skipped)
+        return result
+    result["setup_peak_rss"] = peak_rss()
+    # warm up: imports, caches, first read of the files
+    operation()
+    latencies = []
+    for _ in range(case.repeat):
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    latencies.sort()
+    result["latency"] = {
+        "min": latencies[0],
+        "median": statistics.median(latencies),
+        "mean": total / len(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        "max": latencies[-1],
+    }
+    result["throughput"] = {
+        "operations_per_s": case.repeat / total if total else None,
+        "files_per_s": files * case.repeat / total if total else None,
+        "mb_per_s": size * case.repeat / total / MB if total and size else None,
+    }
+    result["files"] = files
+    result["bytes"] = size
+    com_calls = getattr(operation, "com_calls", None)
+    if com_calls is not None:
+        # COM round trips of the fake Office, per file (warm up run included)
+        runs = (case.repeat + 1) * files
+        result["com_calls_per_file"] = {
+            name: count / runs for name, count in sorted(com_calls.items())
+        }
+    result["peak_rss"] = peak_rss()
+    result["children_peak_rss"] = _children_peak_rss()
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    cases: List[BenchmarkCase],
+    work_dir: Optional[str] = None,
+    isolate: bool = True,
+) -> Dict[str, Any]:
+    """
+    Runs benchmark cases and returns the results as a JSON serializable document.
+
+    Args:
+        cases (List[BenchmarkCase]): The cases to run.
+        work_dir (Optional[str]): Directory of the synthetic documents, kept (and reused by the next runs) when
+            given. Defaults to a temporary directory, removed at the end.
+        isolate (bool): Runs each case in a fresh process, so that the peak RSS of a case is its own.
+
+    Returns:
+        Dict[str, Any]: The run (version, date, commit, platform) and the result of each case: latency statistics
+        (seconds), throughput, files and bytes per operation, peak RSS (bytes), or the reason why it was skipped.
+    """
+    temporary = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="label_benchmarks_")
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    try:
+        for case in cases:
+            logger.info(f"Running {case.name}")
+            if isolate:
+                with ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+                    result = executor.submit(run_case, case, work_dir).result()
+            else:
+                result = run_case(case, work_dir)
+            results.append(result)
+    finally:
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(),
+        "commit": _git_commit(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "processors": os.cpu_count(),
+        "results": results,
+    }
+
+
+def compare_results(
+    baseline: Dict[str, Any], current: Dict[str, Any]
+) -> List[Tuple[str, float, float, float]]:
+    """
+    Compares the median latency of the cases of two runs.
+
+    Returns:
+        List[Tuple[str, float, float, float]]: For each case measured in both runs: its name, the baseline and the
+        current median latency, and their ratio (above 1 is slower).
+    """
+    baseline_latencies = {
+        result["name"]: result["latency"]["median"]
+        for result in baseline["results"]
+        if "latency" in result
+    }
+    comparison = []
+    for result in current["results"]:
+        before = baseline_latencies.get(result["name"])
+        if before is None or "latency" not in result:
+            continue
+        after = result["latency"]["median"]
+        comparison.append(
+            (result["name"], before, after, after / before if before else None)
+        )
+    return comparison
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.label_benchmarks",
+        description="Benchmarks the sensitivity label read and write paths.",
+    )
+    parser.add_argument("--profile", choices=("quick", "full"), default="quick")
+    parser.add_argument(
+        "--only", help="runs the cases whose name matches this pattern, ex: 'get_*'"
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=DEFAULT_LATENCY,
+        help="latency of each fake COM call, in seconds",
+    )
+    parser.add_argument(
+        "--work-dir", help="keeps (and reuses) the synthetic documents there"
+    )
+    parser.add_argument(
+        "--no-isolate",
+        action="store_true",
+        help="runs all the cases in this process (peak RSS is then cumulative)",
+    )
+    parser.add_argument("--output", help="JSON results file, default to stdout")
+    parser.add_argument("--baseline", help="JSON results file to compare with")
+    parser.add_argument("--list", action="store_true", help="lists the cases")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    cases = benchmark_cases(args.profile, args.repeat, args.latency)
+    if args.only:
+        cases = [case for case in cases if fnmatch.fnmatch(case.name, args.only)]
+    if args.list:
+        for case in cases:
+            print(case.name)
+        return
+
+    results = run_benchmarks(cases, args.work_dir, isolate=not args.no_isolate)
+    if args.output:
+        with open(args.output, "w") as fh_out:
+            json.dump(results, fh_out, indent=4, cls=DateTimeEncoder)
+    else:
+        print(json.dumps(results, indent=4, cls=DateTimeEncoder))
+
+    if args.baseline:
+        with open(args.baseline) as fh_in:
+            baseline = json.load(fh_in)
+        for name, before, after, ratio in compare_results(baseline, results):
+            print(
+                f"{name:70} {before * 1000:10.2f}ms {after * 1000:10.2f}ms {ratio:6.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
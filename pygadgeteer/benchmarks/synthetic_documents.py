@@ -0,0 +1,269 @@
+"""
+Synthetic Office Open XML documents for the benchmarks.
+
+The documents are written directly as zip packages (no openpyxl, no Office): a minimal but valid workbook (.xlsx)
+or Word document (.docx), with a payload of pseudo-random cells or words of the requested size, and the requested
+number of custom document properties. The content only depends on the arguments and the seed, so that two runs of
+the benchmarks on two commits measure the same files.
+"""
+
+import os
+import random
+import shutil
+import zipfile
+from typing import Dict, List, Optional
+
+from ooxml_toolbox.custom_properties import (
+    CONTENT_TYPES_NAMESPACE,
+    CONTENT_TYPES_PART,
+    CUSTOM_PROPERTIES_CONTENT_TYPE,
+    CUSTOM_PROPERTIES_PART,
+    CUSTOM_PROPERTIES_RELATIONSHIP,
+    PACKAGE_RELATIONSHIPS_PART,
+    RELATIONSHIPS_NAMESPACE,
+    CustomProperties,
+)
+
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_OFFICE_DOCUMENT_RELATIONSHIP = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+)
+_SPREADSHEET_NAMESPACE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_WORDPROCESSING_NAMESPACE = (
+    "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+)
+_DOCUMENT_RELATIONSHIPS_NAMESPACE = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+)
+
+# size of the block of rows (or paragraphs) repeated to build the payload, larger than the deflate window so that
+# the payload does not compress better than a real document
+_BLOCK_SIZE = 256 * 1024
+_WORDS = (
+    "label sensitivity document report quarter revenue customer internal public confidential "
+    "budget forecast project review summary account region market product service contract"
+).split()
+
+
+class _DocumentFormat:
+    """Parts of a minimal document of one application."""
+
+    def __init__(
+        self,
+        main_part: str,
+        main_content_type: str,
+        main_xml: str,
+        payload_part: str,
+        payload_content_type: str,
+        payload_header: str,
+        payload_footer: str,
+        main_relationships: Optional[str] = None,
+    ):
+        self.main_part = main_part
+        self.main_content_type = main_content_type
+        self.main_xml = main_xml
+        self.payload_part = payload_part
+        self.payload_content_type = payload_content_type
+        self.payload_header = payload_header
+        self.payload_footer = payload_footer
+        self.main_relationships = main_relationships
+
+
+_SPREADSHEET = _DocumentFormat(
+    main_part="xl/workbook.xml",
+    main_content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml",
+    main_xml=(
+        f'<workbook xmlns="{_SPREADSHEET_NAMESPACE}" xmlns:r="{_DOCUMENT_RELATIONSHIPS_NAMESPACE}">'
+        '<sheets><sheet name="Data" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    payload_part="xl/worksheets/sheet1.xml",
+    payload_content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml",
+    payload_header=f'<worksheet xmlns="{_SPREADSHEET_NAMESPACE}"><sheetData>',
+    payload_footer="</sheetData></worksheet>",
+    main_relationships="xl/_rels/workbook.xml.rels",
+)
+
+_WORDPROCESSING = _DocumentFormat(
+    main_part="word/document.xml",
+    main_content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml",
+    main_xml="",
+    payload_part="word/document.xml",
+    payload_content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml",
+    payload_header=f'<w:document xmlns:w="{_WORDPROCESSING_NAMESPACE}"><w:body>',
+    payload_footer="</w:body></w:document>",
+)
+
+DOCUMENT_FORMATS: Dict[str, _DocumentFormat] = {
+    ".xlsx": _SPREADSHEET,
+    ".docx": _WORDPROCESSING,
+}
+
+
+def _spreadsheet_block(rng: random.Random, block_size: int) -> bytes:
+    rows = []
+    size = 0
+    while size < block_size:
+        # rows without r attribute are numbered in sequence, the block can be repeated as it is
+        row = (
+            "<row>"
+            + "".join(f"<c><v>{rng.randrange(10**9)}</v></c>" for _ in range(8))
+            + "</row>"
+        )
+        rows.append(row)
+        size += len(row)
+    return "".join(rows).encode("utf-8")
+
+
+def _wordprocessing_block(rng: random.Random, block_size: int) -> bytes:
+    paragraphs = []
+    size = 0
+    while size < block_size:
+        text = " ".join(rng.choice(_WORDS) for _ in range(rng.randrange(5, 40)))
+        paragraph = f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+        paragraphs.append(paragraph)
+        size += len(paragraph)
+    return "".join(paragraphs).encode("utf-8")
+
+
+def _content_types(document_format: _DocumentFormat, has_custom: bool) -> str:
+    overrides = {
+        document_format.main_part: document_format.main_content_type,
+        document_format.payload_part: document_format.payload_content_type,
+    }
+    if has_custom:
+        overrides[CUSTOM_PROPERTIES_PART] = CUSTOM_PROPERTIES_CONTENT_TYPE
+    return (
+        f'{_XML_DECLARATION}<Types xmlns="{CONTENT_TYPES_NAMESPACE}">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        + "".join(
+            f'<Override PartName="/{part}" ContentType="{content_type}"/>'
+            for part, content_type in overrides.items()
+        )
+        + "</Types>"
+    )
+
+
+def _relationships(relationships: List[tuple]) -> str:
+    return (
+        f'{_XML_DECLARATION}<Relationships xmlns="{RELATIONSHIPS_NAMESPACE}">'
+        + "".join(
+            f'<Relationship Id="rId{index}" Type="{relationship_type}" Target="{target}"/>'
+            for index, (relationship_type, target) in enumerate(relationships, start=1)
+        )
+        + "</Relationships>"
+    )
+
+
+def write_synthetic_document(
+    filename: str,
+    size: int = 0,
+    custom_properties: int = 0,
+    properties: Optional[Dict[str, str]] = None,
+    seed: int = 0,
+) -> int:
+    """
+    Writes a synthetic workbook (.xlsx) or Word document (.docx).
+
+    Args:
+        filename (str): Path to the document to write, its extension selects the format.
+        size (int): Approximate uncompressed size of the payload (worksheet or document body), in bytes. The
+            payload is made of whole rows or paragraphs.
+        custom_properties (int): Number of filler custom document properties ("Property_<n>").
+        properties (Optional[Dict[str, str]]): Additional custom document properties, written after the filler ones
+            (ex: the MSIP_Label_* properties of a label).
+        seed (int): Seed of the pseudo-random payload.
+
+    Returns:
+        int: The size of the written file, in bytes.
+
+    Raises:
+        NotImplementedError: If the extension is not .xlsx or .docx.
+    """
+    _, extension = os.path.splitext(filename)
+    document_format = DOCUMENT_FORMATS.get(extension.lower())
+    if document_format is None:
+        raise NotImplementedError(
+            f"Synthetic documents for {extension} are not implemented."
+        )
+    rng = random.Random(seed)
+    custom = CustomProperties()
+    for index in range(custom_properties):
+        custom.set(f"Property_{index}", f"Value {rng.randrange(10**9)}")
+    for prop_name, prop_value in (properties or {}).items():
+        custom.set(prop_name, prop_value)
+    has_custom = bool(custom.properties)
+
+    package_relationships = [(_OFFICE_DOCUMENT_RELATIONSHIP, document_format.main_part)]
+    if has_custom:
+        package_relationships.append(
+            (CUSTOM_PROPERTIES_RELATIONSHIP, CUSTOM_PROPERTIES_PART)
+        )
+    block_size = min(size, _BLOCK_SIZE)
+    if document_format is _SPREADSHEET:
+        block = _spreadsheet_block(rng, block_size)
+    else:
+        block = _wordprocessing_block(rng, block_size)
+    # whole blocks only, a cut block would not be well formed
+    blocks = round(size / len(block)) if block else 0
+
+    with zipfile.ZipFile(
+        filename, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1
+    ) as archive:
+        archive.writestr(
+            CONTENT_TYPES_PART, _content_types(document_format, has_custom)
+        )
+        archive.writestr(
+            PACKAGE_RELATIONSHIPS_PART, _relationships(package_relationships)
+        )
+        if document_format.main_relationships:
+            archive.writestr(document_format.main_part, document_format.main_xml)
+            archive.writestr(
+                document_format.main_relationships,
+                _relationships(
+                    [
+                        (
+                            f"{_DOCUMENT_RELATIONSHIPS_NAMESPACE}/worksheet",
+                            "worksheets/sheet1.xml",
+                        )
+                    ]
+                ),
+            )
+        with archive.open(document_format.payload_part, "w", force_zip64=True) as part:
+            part.write((_XML_DECLARATION + document_format.payload_header).encode())
+            for _ in range(blocks):
+                part.write(block)
+            part.write(document_format.payload_footer.encode())
+        if has_custom:
+            archive.writestr(CUSTOM_PROPERTIES_PART, custom.to_xml())
+    return os.path.getsize(filename)
+
+
+def write_synthetic_tree(
+    root: str,
+    count: int,
+    template: str,
+    files_per_directory: int = 100,
+) -> List[str]:
+    """
+    Fills a directory tree with copies of a document, for the bulk benchmarks.
+
+    Args:
+        root (str): The directory to fill, created if needed.
+        count (int): Number of documents.
+        template (str): The document to copy (its extension is kept).
+        files_per_directory (int): Number of documents per sub-directory.
+
+    Returns:
+        List[str]: The paths to the documents.
+    """
+    _, extension = os.path.splitext(template)
+    paths = []
+    for index in range(count):
+        directory = os.path.join(root, f"dir_{index // files_per_directory:05d}")
+        if index % files_per_directory == 0:
+            os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"document_{index:07d}{extension}")
+        shutil.copyfile(template, path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,36 @@
+# This demo labels Word, Excel and PowerPoint documents without Office (no COM, it also runs on Linux).
+# It only needs the configuration created by demo_excel_sensitivity_with_openpyxl.py (or
+# openpyxl_toolbox.sensitivity_manager.create_sensitivity_label_definition) and a few documents to label.
+
+import shutil
+
+from openpyxl_toolbox.sensitivity_manager import MSIP_Configuration
+from ooxml_toolbox.sensitivity_manager import (
+    get_label_from_package,
+    set_label_to_package,
+)
+
+if __name__ == "__main__":
+
+    # use this to load the json configuration
+    msip_configuration = MSIP_Configuration().load()
+    label = msip_configuration.get_sensitivity_label("InternalUseOnly")
+
+    for model, filename in [
+        ("output/dummy.docx", "output/dummy_package_internal_use_only.docx"),
+        ("output/dummy.xlsm", "output/dummy_package_internal_use_only.xlsm"),
+        ("output/dummy.pptx", "output/dummy_package_internal_use_only.pptx"),
+    ]:
+        # Copy a dummy file to the target filename.
+        shutil.copy(model, filename)
+        # set the label directly in the package: the VBA project of .xlsm/.docm files is kept byte for byte
+        set_label_to_package(filename, label)
+
+        check_label = get_label_from_package(filename)
+        # A few assertion to verify the properties are correctly stored.
+        assert check_label is not None
+        assert label.LabelId == check_label.LabelId
+        assert label.LabelName == check_label.LabelName
+        print(
+            f"{filename} is correctly assigned a Sensitivity Label ({label.LabelName})"
+        )
@@ -1 +1,10 @@
 from .datetime_encoder import DateTimeEncoder
+from .serialization import (
+    BACKEND,
+    JsonLinesWriter,
+    dumpb,
+    dumps,
+    iter_json_lines,
+    json_default,
+    loads,
+)
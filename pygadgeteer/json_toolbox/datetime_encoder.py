@@ -1,6 +1,8 @@
 import json
 import datetime
 
+from .serialization import json_default
+
 ## FROM : https://stackoverflow.com/questions/12122007/python-json-encoder-to-support-datetime
 
 
@@ -11,7 +13,8 @@ class DateTimeEncoder(json.JSONEncoder):
         elif isinstance(obj, datetime.timedelta):
             return (datetime.datetime.min + obj).time().isoformat()
 
-        return super(DateTimeEncoder, self).default(obj)
+        # enums, pydantic models, ...
+        return json_default(obj)
 
 
 if __name__ == "__main__":
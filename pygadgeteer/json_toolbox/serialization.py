@@ -0,0 +1,181 @@
+"""
+JSON serialization with the fastest available backend: orjson if it is installed, else the standard library.
+
+Both backends produce the same JSON for the types used by the labeling code:
+
+- datetime, date and time as ISO 8601 text, timedelta as a time of day (as DateTimeEncoder),
+- enums (ex: MsoAssignmentMethod) as their value,
+- pydantic models (ex: MSIP_Label) as their fields (model_dump),
+- named tuples written by JsonLinesWriter (ex: InventoryEntry, BulkResult) as objects.
+
+JsonLinesWriter streams records to a JSON Lines file (one JSON document per line) through a byte buffer, so that
+millions of records can be written without holding them in memory nor paying a system call per record.
+
+Example::
+
+    with JsonLinesWriter("inventory.jsonl") as writer:
+        writer.write_many(inventory.entries())
+"""
+
+import datetime
+import json
+from enum import Enum
+from typing import IO, Any, Iterable, Iterator, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def json_default(obj: Any) -> Any:
+    """
+    Converts the objects that JSON does not support natively, for json.dumps(default=...) and orjson.
+
+    Raises:
+        TypeError: If the object type is not supported.
+    """
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return (datetime.datetime.min + obj).time().isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if hasattr(obj, "model_dump"):
+        # pydantic model
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(
+    default=json_default, ensure_ascii=False, separators=(",", ":")
+)
+if orjson is not None:
+    # non str keys (ex: int) are converted to text, as the standard library does
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumpb(obj: Any) -> bytes:
+    """Serializes obj to compact UTF-8 encoded JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTIONS)
+    return _encoder.encode(obj).encode("utf-8")
+
+
+def dumps(obj: Any, indent: Optional[int] = None) -> str:
+    """
+    Serializes obj to JSON text.
+
+    Args:
+        obj (Any): The object to serialize.
+        indent (Optional[int]): Pretty-prints with this indent. Defaults to None (compact).
+
+    Returns:
+        str: The JSON text.
+    """
+    if indent is None:
+        return dumpb(obj).decode("utf-8")
+    if orjson is not None and indent == 2:
+        return orjson.dumps(
+            obj, default=json_default, option=_ORJSON_OPTIONS | orjson.OPT_INDENT_2
+        ).decode("utf-8")
+    return json.dumps(obj, indent=indent, ensure_ascii=False, default=json_default)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Deserializes JSON text or UTF-8 encoded bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _record(record: Any) -> Any:
+    # named tuples would be written as arrays
+    return record._asdict() if hasattr(record, "_asdict") else record
+
+
+class JsonLinesWriter:
+    """
+    Buffered writer of JSON Lines files, used as a context manager.
+
+    The file is given by path (opened in append mode, unless append is False, and closed by the writer) or as a
+    binary file object (flushed, but not closed, by the writer).
+
+    Attributes:
+        filename (Optional[str]): The file written, None when writing to a given binary file object.
+        buffer_size (int): Size, in bytes, of the buffer: the lines are written to the file when it is full.
+        records (int): Number of records written (including the buffered ones).
+    """
+
+    def __init__(
+        self,
+        file: Union[str, IO[bytes]],
+        append: bool = True,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ):
+        if isinstance(file, str):
+            self.filename: Optional[str] = file
+            # unbuffered: the buffer of the writer is flushed in a single write
+            self._file = open(file, "ab" if append else "wb", buffering=0)
+            self._owned = True
+        else:
+            self.filename = None
+            self._file = file
+            self._owned = False
+        self.buffer_size = buffer_size
+        self.records = 0
+        self._buffer: list = []
+        self._buffered = 0
+
+    def __enter__(self) -> "JsonLinesWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, record: Any) -> None:
+        """Writes a record (dict, named tuple, pydantic model, ...) as one line."""
+        line = dumpb(_record(record)) + b"\n"
+        self._buffer.append(line)
+        self._buffered += len(line)
+        self.records += 1
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[Any]) -> int:
+        """Writes records from an iterable (consumed lazily), returns the number of records written."""
+        count = 0
+        for record in records:
+            self.write(record)
+            count += 1
+        return count
+
+    def flush(self) -> None:
+        """Writes the buffered lines to the file."""
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+        if not self._owned:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Flushes the buffered lines, and closes the file if it was opened by the writer."""
+        if self._file.closed:
+            return
+        self.flush()
+        if self._owned:
+            self._file.close()
+
+
+def iter_json_lines(filename: str) -> Iterator[Any]:
+    """Streams the records of a JSON Lines file, blank lines are skipped."""
+    with open(filename, "rb") as fh_in:
+        for line in fh_in:
+            if line.strip():
+                yield loads(line)
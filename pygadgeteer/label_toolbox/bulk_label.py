@@ -0,0 +1,662 @@
+"""
+Bulk labeling of Office Open XML documents over directory trees.
+
+The files are labeled at package level (ooxml_toolbox) by a pool of worker processes. Paths are submitted by
+chunks through a bounded queue, so that walking a share of millions of files keeps a flat memory footprint, and
+the per file results are streamed back as soon as they are available.
+
+Command line usage::
+
+    python -m label_toolbox.bulk_label <root> <label name> [--workers N] [--dry-run]
+    python -m label_toolbox.bulk_label <root> --repair
+    python -m label_toolbox.bulk_label <root> --policy policy.json
+    python -m label_toolbox.bulk_label <root> <label name> --metrics bulk_label.prom
+"""
+
+import argparse
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from enum import Enum
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from json_toolbox import JsonLinesWriter
+from openpyxl_toolbox.label_record import DEFAULT_SENSITIVITY_LABELS_DEFINITION
+from ooxml_toolbox.package_formats import PACKAGE_EXTENSIONS, is_package
+from ooxml_toolbox.sensitivity_manager import (
+    repair_package_label,
+    set_label_to_package,
+)
+
+from .label_cache import LabelCache
+from .label_metrics import (
+    LabelMetrics,
+    enable_metrics,
+    enable_worker_metrics,
+    get_metrics,
+)
+from .label_registry import CompiledLabel, get_label_registry
+
+if TYPE_CHECKING:
+    from openpyxl_toolbox.sensitivity_manager import MSIP_Label
+
+    from .label_policy import LabelPolicy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 16
+
+
+class BulkStatus(str, Enum):
+    """Outcome of the labeling of one file."""
+
+    Planned = "planned"
+    Labeled = "labeled"
+    Skipped = "skipped"
+    Repaired = "repaired"
+    Unchanged = "unchanged"
+    Excluded = "excluded"
+    Failed = "failed"
+
+
+class BulkResult(NamedTuple):
+    """Result of the labeling of one file.
+
+    Attributes:
+        path (str): Path to the file.
+        status (BulkStatus): Outcome of the labeling.
+        size (int): Size of the file, in bytes.
+        elapsed (float): Time spent on the file, in seconds.
+        error (Optional[str]): Error type and message, when the labeling failed.
+        label (Optional[str]): Name of the label resolved by the policy, when labeling by policy.
+        removed (int): Number of label properties removed by a repair (to be removed, in a dry run).
+    """
+
+    path: str
+    status: BulkStatus
+    size: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    label: Optional[str] = None
+    removed: int = 0
+
+
+class BulkSummary:
+    """Aggregates the results of a bulk labeling run: counts, throughput and failures.
+
+    Attributes:
+        statuses (Counter): Number of files by status.
+        errors (Counter): Number of failures by error type.
+        bytes (int): Total size of the processed files.
+        started (float): Start time of the run (time.perf_counter).
+    """
+
+    def __init__(self):
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.bytes = 0
+        self.started = time.perf_counter()
+
+    def add(self, result: BulkResult) -> BulkResult:
+        """Accounts for one result, and returns it."""
+        self.statuses[result.status] += 1
+        self.bytes += result.size
+        if result.error:
+            self.errors[result.error.split(":", 1)[0]] += 1
+        return result
+
+    @property
+    def files(self) -> int:
+        """Number of processed files."""
+        return sum(self.statuses.values())
+
+    @property
+    def elapsed(self) -> float:
+        """Wall clock time since the start of the run, in seconds."""
+        return time.perf_counter() - self.started
+
+    def report(self) -> str:
+        """Returns a human readable end of run summary."""
+        elapsed = self.elapsed or 1e-9
+        lines = [
+            f"{self.files} files, {self.bytes / 1e6:.1f} MB in {elapsed:.1f}s "
+            f"({self.files / elapsed:.1f} files/s, {self.bytes / 1e6 / elapsed:.1f} MB/s)"
+        ]
+        lines.extend(
+            f"  {status.value}: {count}" for status, count in self.statuses.items()
+        )
+        lines.extend(
+            f"  failed with {error}: {count}" for error, count in self.errors.items()
+        )
+        return "\n".join(lines)
+
+
+def iter_package_entries(
+    root: str,
+    extensions: Iterable[str] = PACKAGE_EXTENSIONS,
+    on_error: Optional[Callable[[str, OSError], None]] = None,
+) -> Iterator[os.DirEntry]:
+    """
+    Walks a directory tree and yields the directory entries of the Office Open XML documents it contains.
+
+    Uses os.scandir, the file type comes from the directory entry and does not cost a stat call per file (the
+    entry caches its stat result, free on Windows). Office lock files (~$name.docx) are skipped. A directory that
+    cannot be read is reported to on_error and the walk goes on: its documents may have been partly yielded, and
+    its subdirectories partly walked.
+
+    Args:
+        root (str): The directory to walk.
+        extensions (Iterable[str]): The file extensions to yield. Defaults to all the package formats.
+        on_error (Optional[Callable[[str, OSError], None]]): Called with each directory that cannot be read and
+            the error. Defaults to logging a warning.
+
+    Yields:
+        os.DirEntry: The directory entry of each document.
+    """
+    extensions = {extension.lower() for extension in extensions}
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                        continue
+                    extension = os.path.splitext(entry.name)[1].lower()
+                    if extension in extensions and not entry.name.startswith("~$"):
+                        yield entry
+        except OSError as error:
+            if on_error is None:
+                logger.warning(f"Error reading the directory {directory} : {error}")
+            else:
+                on_error(directory, error)
+
+
+def iter_package_files(
+    root: str, extensions: Iterable[str] = PACKAGE_EXTENSIONS
+) -> Iterator[str]:
+    """
+    Walks a directory tree and yields the Office Open XML documents it contains (see iter_package_entries).
+
+    Args:
+        root (str): The directory to walk.
+        extensions (Iterable[str]): The file extensions to yield. Defaults to all the package formats.
+
+    Yields:
+        str: The path of each document.
+    """
+    for entry in iter_package_entries(root, extensions):
+        yield entry.path
+
+
+# label applied by the worker processes (None repairs the files), set once per process by _initialize_worker
+_worker_label: Optional[Union["MSIP_Label", CompiledLabel]] = None
+_worker_justification: Optional[str] = None
+_worker_force = False
+_worker_cache: Optional[LabelCache] = None
+_worker_append = False
+_worker_dry_run = False
+# labels of a policy, by name, when the label depends on the file
+_worker_labels: Dict[str, CompiledLabel] = {}
+
+
+def _initialize_worker(
+    label: Optional[Union["MSIP_Label", CompiledLabel]],
+    justification: Optional[str],
+    force: bool = False,
+    cache_database: Optional[str] = None,
+    metrics: bool = False,
+    append: bool = False,
+    labels: Optional[Dict[str, CompiledLabel]] = None,
+    dry_run: bool = False,
+) -> None:
+    global _worker_label, _worker_justification, _worker_force, _worker_cache
+    global _worker_append, _worker_labels, _worker_dry_run
+    _worker_label, _worker_justification = label, justification
+    _worker_force, _worker_append, _worker_dry_run = force, append, dry_run
+    _worker_labels = labels or {}
+    _worker_cache = LabelCache(cache_database) if cache_database else None
+    if metrics:
+        enable_worker_metrics()
+
+
+def _label_file(
+    path: str,
+    label: Optional[Union["MSIP_Label", CompiledLabel]],
+    justification: Optional[str],
+    force: bool = False,
+    cache: Optional[LabelCache] = None,
+    append: bool = False,
+    dry_run: bool = False,
+) -> BulkResult:
+    """Labels (or repairs) one file, a failure is reported in the result instead of being raised.
+
+    A dry run only applies to repairs: the file is Planned when it has properties to remove, and is not rewritten.
+    """
+    started = time.perf_counter()
+    try:
+        size = os.path.getsize(path)
+        if label is None:
+            removed = repair_package_label(path, dry_run=dry_run)
+            if not removed:
+                status = BulkStatus.Unchanged
+            else:
+                status = BulkStatus.Planned if dry_run else BulkStatus.Repaired
+            return BulkResult(
+                path, status, size, time.perf_counter() - started, removed=removed
+            )
+        elif set_label_to_package(
+            path, label, justification, force=force, cache=cache, append=append
+        ):
+            status = BulkStatus.Labeled
+        else:
+            status = BulkStatus.Skipped
+        return BulkResult(path, status, size, time.perf_counter() - started)
+    except Exception as error:
+        return BulkResult(
+            path,
+            BulkStatus.Failed,
+            0,
+            time.perf_counter() - started,
+            f"{type(error).__name__}: {error}",
+        )
+
+
+def _label_chunk(
+    paths: List[str],
+) -> Tuple[List[BulkResult], Optional[Dict[str, Any]]]:
+    """Labels a chunk of files, returns their results and the metrics of the worker (if enabled)."""
+    results = [
+        _label_file(
+            path,
+            _worker_label,
+            _worker_justification,
+            _worker_force,
+            _worker_cache,
+            _worker_append,
+            _worker_dry_run,
+        )
+        for path in paths
+    ]
+    metrics = get_metrics()
+    return results, metrics.collect() if metrics is not None else None
+
+
+def _label_policy_chunk(
+    items: List[Tuple[str, str]],
+) -> Tuple[List[BulkResult], Optional[Dict[str, Any]]]:
+    """Labels a chunk of (path, label name) pairs, the labels being resolved by a policy."""
+    results = [
+        _label_file(
+            path,
+            _worker_labels[label_name],
+            _worker_justification,
+            _worker_force,
+            _worker_cache,
+            _worker_append,
+        )._replace(label=label_name)
+        for path, label_name in items
+    ]
+    metrics = get_metrics()
+    return results, metrics.collect() if metrics is not None else None
+
+
+def _chunk_results(
+    future: Future, metrics: Optional[LabelMetrics], share: str
+) -> List[BulkResult]:
+    results, snapshot = future.result()
+    if metrics is not None:
+        if snapshot:
+            metrics.merge(snapshot)
+        for result in results:
+            metrics.increment("files_total", status=result.status.value, share=share)
+            metrics.observe("file_seconds", result.elapsed, share=share)
+    return results
+
+
+def _excluded_results(
+    excluded: List[BulkResult], metrics: Optional[LabelMetrics], share: str
+) -> List[BulkResult]:
+    results = excluded[:]
+    excluded.clear()
+    if metrics is not None:
+        for result in results:
+            metrics.increment("files_total", status=result.status.value, share=share)
+    return results
+
+
+def _iter_chunks(paths: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_policy_chunks(
+    paths: Iterable[str],
+    policy: "LabelPolicy",
+    chunk_size: int,
+    excluded: List[BulkResult],
+) -> Iterator[List[Tuple[str, str]]]:
+    """
+    Resolves the label of each path, the paths excluded by the policy are appended to excluded.
+
+    A chunk (maybe partial or empty) is also yielded every chunk_size excluded paths, for the caller to drain excluded:
+    a tree excluded by the policy does not pile up its results.
+    """
+    chunk = []
+    for path in paths:
+        label_name = policy.resolve(path)
+        if label_name is None:
+            excluded.append(BulkResult(path, BulkStatus.Excluded))
+            if len(excluded) >= chunk_size:
+                yield chunk
+                chunk = []
+            continue
+        chunk.append((path, label_name))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def plan_bulk_label(paths: Union[str, Iterable[str]]) -> Iterator[BulkResult]:
+    """
+    Dry run of bulk_label: yields the files that would be labeled, without touching them.
+
+    Args:
+        paths (Union[str, Iterable[str]]): A root directory to walk, or an iterable of paths.
+
+    Yields:
+        BulkResult: A Planned result per supported file, a Failed result for unsupported or missing files.
+    """
+    if isinstance(paths, str):
+        paths = iter_package_files(paths)
+    for path in paths:
+        if not is_package(path):
+            yield BulkResult(
+                path, BulkStatus.Failed, error="NotImplementedError: unsupported format"
+            )
+            continue
+        try:
+            yield BulkResult(path, BulkStatus.Planned, os.path.getsize(path))
+        except OSError as error:
+            yield BulkResult(
+                path, BulkStatus.Failed, error=f"{type(error).__name__}: {error}"
+            )
+
+
+def bulk_label(
+    paths: Union[str, Iterable[str]],
+    label: Optional[Union["MSIP_Label", CompiledLabel]],
+    justification: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dry_run: bool = False,
+    summary: Optional[BulkSummary] = None,
+    force: bool = False,
+    cache_database: Optional[str] = None,
+    append: bool = False,
+    policy: Optional["LabelPolicy"] = None,
+) -> Iterator[BulkResult]:
+    """
+    Applies a sensitivity label to many Office Open XML documents, in parallel.
+
+    The files are labeled at package level by a ProcessPoolExecutor. At most max_pending chunks of chunk_size paths
+    are in flight, the iterable of paths is consumed lazily and the results are yielded as they complete (not in
+    the order of the paths). A failure on a file is reported in its result and does not stop the run. The files that
+    already carry the label are Skipped, without being rewritten.
+
+    When the instrumentation is enabled (see label_metrics), the metrics of the workers are merged into the metrics
+    of the calling process, and the files are counted by status and timed by share (the root directory walked).
+
+    Args:
+        paths (Union[str, Iterable[str]]): A root directory to walk, or an iterable of paths.
+        label (Optional[Union[MSIP_Label, CompiledLabel]]): The sensitivity label to apply. A CompiledLabel (see
+            label_registry) is sent to the workers with its custom properties already rendered. None repairs the
+            files instead (see bulk_repair). Ignored when a policy is given.
+        justification (Optional[str]): Justification for applying the label, if any.
+        max_workers (Optional[int]): Number of worker processes. Defaults to the number of CPUs.
+        max_pending (Optional[int]): Maximum number of chunks submitted and not completed. Defaults to 4 per worker.
+        chunk_size (int): Number of files sent at once to a worker. Defaults to DEFAULT_CHUNK_SIZE.
+        dry_run (bool): If True, only plan the run (see plan_bulk_label), no file is modified. A dry repair reads the
+            files, and reports the ones with properties to remove as Planned.
+        summary (Optional[BulkSummary]): Accumulates counts, throughput and failures while the results are yielded.
+        force (bool): Rewrites the files even if they already carry the label.
+        cache_database (Optional[str]): Path to a content hash cache of the labels, shared by the workers (see
+            label_cache.LabelCache).
+        append (bool): Appends the new custom properties to the files instead of rewriting them (see
+            ooxml_toolbox.zip_package.append_package), for very large files.
+        policy (Optional[LabelPolicy]): Labels each file with the label its path resolves to (see
+            label_policy.LabelPolicy), the files excluded by the policy are reported as Excluded.
+
+    Yields:
+        BulkResult: The result of each file.
+    """
+    summary = summary if summary is not None else BulkSummary()
+    share = ""
+    if isinstance(paths, str):
+        share = os.path.abspath(paths)
+        paths = iter_package_files(paths)
+    if dry_run and (label is not None or policy is not None):
+        for result in plan_bulk_label(paths):
+            if policy is not None and result.status == BulkStatus.Planned:
+                label_name = policy.resolve(result.path)
+                result = result._replace(
+                    status=BulkStatus.Planned if label_name else BulkStatus.Excluded,
+                    label=label_name,
+                )
+            yield summary.add(result)
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 4 * max_workers
+    metrics = get_metrics()
+    excluded: List[BulkResult] = []
+    if policy is None:
+        labels, label_chunk = None, _label_chunk
+        chunks: Iterator[list] = _iter_chunks(paths, chunk_size)
+    else:
+        label, labels, label_chunk = None, policy.compiled_labels(), _label_policy_chunk
+        chunks = _iter_policy_chunks(paths, policy, chunk_size, excluded)
+    with ProcessPoolExecutor(
+        max_workers,
+        initializer=_initialize_worker,
+        initargs=(
+            label,
+            justification,
+            force,
+            cache_database,
+            metrics is not None,
+            append,
+            labels,
+            dry_run,
+        ),
+    ) as executor:
+        pending: Set[Future] = set()
+        for chunk in chunks:
+            for result in _excluded_results(excluded, metrics, share):
+                yield summary.add(result)
+            if not chunk:
+                continue
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in _chunk_results(future, metrics, share):
+                        yield summary.add(result)
+            pending.add(executor.submit(label_chunk, chunk))
+        for result in _excluded_results(excluded, metrics, share):
+            yield summary.add(result)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for result in _chunk_results(future, metrics, share):
+                    yield summary.add(result)
+
+
+def bulk_repair(
+    paths: Union[str, Iterable[str]],
+    max_workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    summary: Optional[BulkSummary] = None,
+    dry_run: bool = False,
+) -> Iterator[BulkResult]:
+    """
+    Removes, in parallel, the duplicated and stale label properties of documents labeled by appending (see
+    ooxml_toolbox.sensitivity_manager.repair_package_label). Only the documents that need it are rewritten.
+
+    Args:
+        paths (Union[str, Iterable[str]]): A root directory to walk, or an iterable of paths.
+        max_workers (Optional[int]): Number of worker processes. Defaults to the number of CPUs.
+        max_pending (Optional[int]): Maximum number of chunks submitted and not completed. Defaults to 4 per worker.
+        chunk_size (int): Number of files sent at once to a worker. Defaults to DEFAULT_CHUNK_SIZE.
+        summary (Optional[BulkSummary]): Accumulates counts, throughput and failures while the results are yielded.
+        dry_run (bool): Only counts the properties to remove (BulkResult.removed), no file is rewritten: the files
+            that need a repair are Planned.
+
+    Yields:
+        BulkResult: The result of each file, Repaired (Planned in a dry run) or Unchanged when it succeeded.
+    """
+    return bulk_label(
+        paths,
+        None,
+        max_workers=max_workers,
+        max_pending=max_pending,
+        chunk_size=chunk_size,
+        summary=summary,
+        dry_run=dry_run,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the process exit code (1 if a file failed)."""
+    parser = argparse.ArgumentParser(
+        prog="python -m label_toolbox.bulk_label",
+        description="Applies a sensitivity label to all the Office documents of a directory tree.",
+    )
+    parser.add_argument("root", help="directory to walk")
+    parser.add_argument(
+        "label", nargs="?", help="label name, as defined in the configuration"
+    )
+    parser.add_argument(
+        "--config",
+        default=DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        help="sensitivity labels definition (json)",
+    )
+    parser.add_argument("--justification", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="list the files, do not label them"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rewrite the files that already carry the label",
+    )
+    parser.add_argument(
+        "--cache", default=None, help="content hash cache of the labels (sqlite)"
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="append the label to the files instead of rewriting them (very large files)",
+    )
+    parser.add_argument(
+        "--policy",
+        default=None,
+        help="label each file with the label of a location based policy (json), instead of a single label",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="remove duplicated and stale label properties instead of labeling",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="only print failures and the summary"
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="write the metrics of the run to this file (.prom for Prometheus, else JSON)",
+    )
+    parser.add_argument(
+        "--log",
+        default=None,
+        help="append the result of every file to this JSON Lines file",
+    )
+    args = parser.parse_args(argv)
+
+    if args.label is None and not args.repair and not args.policy:
+        parser.error("a label name is required, unless --repair or --policy is given")
+    metrics = enable_metrics() if args.metrics else None
+    summary = BulkSummary()
+    if args.repair:
+        results = bulk_repair(
+            args.root,
+            max_workers=args.workers,
+            max_pending=args.max_pending,
+            chunk_size=args.chunk_size,
+            summary=summary,
+            dry_run=args.dry_run,
+        )
+    else:
+        from .label_policy import LabelPolicy
+
+        policy = LabelPolicy.load(args.policy, args.config) if args.policy else None
+        results = bulk_label(
+            args.root,
+            get_label_registry(args.config)[args.label] if policy is None else None,
+            justification=args.justification,
+            max_workers=args.workers,
+            max_pending=args.max_pending,
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run,
+            summary=summary,
+            force=args.force,
+            cache_database=args.cache,
+            append=args.append,
+            policy=policy,
+        )
+    with JsonLinesWriter(args.log) if args.log else nullcontext() as log:
+        for result in results:
+            if log is not None:
+                log.write(result)
+            if not args.quiet or result.status == BulkStatus.Failed:
+                detail = result.error or (
+                    f"{result.removed} properties" if result.removed else ""
+                )
+                print(f"{result.status.value}\t{result.path}\t{detail}")
+    print(summary.report())
+    if metrics is not None:
+        metrics.write(args.metrics)
+    return 1 if summary.statuses[BulkStatus.Failed] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
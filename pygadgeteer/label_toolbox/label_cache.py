@@ -0,0 +1,170 @@
+"""
+Cheap checks of the label already set to a document, to skip the labeling of documents that already carry the
+target label.
+
+Rewriting a document that already has its label wastes I/O, changes its modification time and triggers backup and
+synchronization of the share. read_label_id reads the LabelId of an Office Open XML document from its custom
+properties (zip central directory and docProps/custom.xml only). A LabelCache remembers the LabelId by content hash,
+so that copies of the same (template) document spread across many folders are recognized, even when they must be
+labeled through COM (.xls, .doc, ...).
+
+Only the standard library is used: the checks run before any Office application or pydantic model is loaded.
+"""
+
+import hashlib
+import os
+import sqlite3
+import zipfile
+from typing import Optional
+
+from ooxml_toolbox.custom_properties import read_custom_properties
+from ooxml_toolbox.package_formats import is_package
+
+DEFAULT_LABEL_CACHE = "label_cache.sqlite"
+
+_LABEL_PROPERTY_PREFIX = "MSIP_Label_"
+_HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def read_label_id(filename: str) -> Optional[str]:
+    """
+    Reads the LabelId of the sensitivity label of an Office Open XML document, without validating the label.
+
+    A label whose Enabled property is "false" (label removed) is ignored. When the document has the properties of
+    several labels, the last one is returned.
+
+    Args:
+        filename (str): Path to the document (.docx, .xlsx, .pptx, ...).
+
+    Returns:
+        Optional[str]: The LabelId, None if the document is not labeled.
+
+    Raises:
+        zipfile.BadZipFile: If the file is not a zip archive.
+    """
+    label_ids = {}
+    for prop_name, prop_value in read_custom_properties(filename).items():
+        if prop_name.startswith(_LABEL_PROPERTY_PREFIX):
+            label_id, _, attribute = prop_name[
+                len(_LABEL_PROPERTY_PREFIX) :
+            ].rpartition("_")
+            label_ids.setdefault(label_id, True)
+            if attribute == "Enabled" and prop_value.lower() == "false":
+                label_ids[label_id] = False
+    enabled = [label_id for label_id, is_enabled in label_ids.items() if is_enabled]
+    return enabled[-1] if enabled else None
+
+
+def content_hash(filename: str) -> str:
+    """
+    Returns a hash identifying the content of a document.
+
+    For a zip archive (Office Open XML), only the central directory is hashed, with the file size: it holds the
+    name, sizes and CRC32 of every part, so it changes with the content of any part while the parts themselves are
+    not read. Other documents (.xls, .doc, ...) are hashed entirely.
+
+    Args:
+        filename (str): Path to the document.
+
+    Returns:
+        str: The hexadecimal blake2b digest.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filename, "rb") as fh_in:
+        size = os.fstat(fh_in.fileno()).st_size
+        digest.update(size.to_bytes(8, "little"))
+        try:
+            start = zipfile.ZipFile(fh_in).start_dir
+            digest.update(b"zip")
+        except zipfile.BadZipFile:
+            start = 0
+        fh_in.seek(start)
+        for block in iter(lambda: fh_in.read(_HASH_BUFFER_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LabelCache:
+    """
+    On disk (SQLite) cache of the LabelId of documents, by content hash.
+
+    Attributes:
+        database (str): Path to the SQLite database file.
+        connection (sqlite3.Connection): The database connection.
+    """
+
+    def __init__(self, database: str = DEFAULT_LABEL_CACHE):
+        self.database = database
+        # shared by the worker processes of a bulk run
+        self.connection = sqlite3.connect(database, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS labels (hash TEXT PRIMARY KEY, label_id TEXT)"
+        )
+
+    def __enter__(self) -> "LabelCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Commits and closes the database."""
+        self.connection.commit()
+        self.connection.close()
+
+    def get(self, digest: str) -> Optional[str]:
+        """Returns the LabelId known for a content hash ("" for a document without label), None if unknown."""
+        row = self.connection.execute(
+            "SELECT label_id FROM labels WHERE hash = ?", (digest,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, digest: str, label_id: Optional[str]) -> None:
+        """Records the LabelId (None for a document without label) of a content hash."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO labels (hash, label_id) VALUES (?, ?)",
+            (digest, label_id or ""),
+        )
+        self.connection.commit()
+
+
+def has_label(filename: str, label_id: str, cache: Optional[LabelCache] = None) -> bool:
+    """
+    Tells if a document already carries a label.
+
+    With a cache, the document is identified by its content hash and only read when the hash is unknown. Without a
+    cache, only Office Open XML documents can be checked: False is returned for the other formats.
+
+    Args:
+        filename (str): Path to the document.
+        label_id (str): The LabelId to look for.
+        cache (Optional[LabelCache]): The content hash cache to use and update.
+
+    Returns:
+        bool: True if the document label is label_id.
+    """
+    digest = None
+    if cache is not None:
+        digest = content_hash(filename)
+        known = cache.get(digest)
+        if known is not None:
+            return known == label_id
+    if not is_package(filename):
+        return False
+    try:
+        current = read_label_id(filename)
+    except (zipfile.BadZipFile, ValueError):
+        return False
+    if cache is not None:
+        cache.put(digest, current)
+    return current == label_id
+
+
+def remember_label(
+    filename: str, label_id: str, cache: Optional[LabelCache] = None
+) -> None:
+    """Records in the cache (if any) the label just set to a document."""
+    if cache is not None:
+        cache.put(content_hash(filename), label_id)
@@ -0,0 +1,586 @@
+"""
+Content based classification: suggests (or applies) the sensitivity label of a document from the text it contains.
+
+A classification file lists rules, from the most sensitive label to the least sensitive one. A rule fires when one
+of its detectors (built-in patterns such as IBAN or card numbers, checked by their validator), regular expressions
+or keywords is found in the document::
+
+    {
+        "rules": [
+            {"name": "bank", "label": "RestrictedConfidential", "detectors": ["iban", "card_number"]},
+            {"name": "hr", "label": "Confidential", "detectors": ["fr_nir"], "keywords": ["salaire", "payroll"]},
+            {"name": "project", "label": "InternalUseOnly", "patterns": ["PRJ-\\\\d{6}"]}
+        ]
+    }
+
+The suggested label is the one of the most sensitive rule that fired. The documents are streamed, never loaded:
+
+- workbooks row by row, with openpyxl in read_only mode (iter_rows),
+- Word and PowerPoint documents paragraph by paragraph, parsing the text parts from the zip stream (iterparse).
+
+The text is matched by chunks against a single regular expression combining the patterns and keywords of all the
+rules (the detectors validated by a checksum have their own), the scan stops as soon as a rule of the most sensitive
+label fires, and at most max_characters of text are scanned per document.
+
+Command line usage::
+
+    python -m label_toolbox.label_classifier <root> <rules.json> [--workers N] [--export classification.jsonl]
+    python -m label_toolbox.label_classifier <root> <rules.json> --apply
+"""
+
+import argparse
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import closing, nullcontext
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    Union,
+)
+
+from json_toolbox import JsonLinesWriter
+from openpyxl_toolbox.label_record import DEFAULT_SENSITIVITY_LABELS_DEFINITION
+from ooxml_toolbox.package_formats import PACKAGE_EXTENSIONS, check_package
+
+from .bulk_label import (
+    DEFAULT_CHUNK_SIZE,
+    BulkStatus,
+    _iter_chunks,
+    _label_file,
+    iter_package_files,
+)
+from .label_registry import CompiledLabel, LabelRegistry, get_label_registry
+
+DEFAULT_MAX_CHARACTERS = 4 * 1024 * 1024
+# text accumulated before running the matcher
+_CHUNK_CHARACTERS = 64 * 1024
+
+_WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DRAWING_NAMESPACE = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+# text parts of the documents, and their (paragraph, text) elements
+_WORD_PARTS = re.compile(
+    r"word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml"
+)
+_POWERPOINT_PARTS = re.compile(r"ppt/(slides/slide|notesSlides/notesSlide)\d+\.xml")
+_TEXT_ELEMENTS = {
+    "Word": (_WORD_PARTS, _WORD_NAMESPACE + "p", _WORD_NAMESPACE + "t"),
+    "PowerPoint": (
+        _POWERPOINT_PARTS,
+        _DRAWING_NAMESPACE + "p",
+        _DRAWING_NAMESPACE + "t",
+    ),
+}
+
+
+def _digits(text: str) -> str:
+    return "".join(character for character in text if character.isdigit())
+
+
+def luhn_checksum(text: str) -> bool:
+    """Validates the check digit of a card number (Luhn algorithm), separators are ignored."""
+    digits = _digits(text)
+    # 0000 0000 0000 0 passes the checksum
+    if not 13 <= len(digits) <= 19 or len(set(digits)) == 1:
+        return False
+    total = 0
+    for position, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if position % 2:
+            value = value * 2 - 9 if value > 4 else value * 2
+        total += value
+    return total % 10 == 0
+
+
+def iban_checksum(text: str) -> bool:
+    """Validates the check digits of an IBAN (ISO 13616, modulo 97), spaces are ignored."""
+    iban = text.replace(" ", "").upper()
+    if not 15 <= len(iban) <= 34:
+        return False
+    rearranged = iban[4:] + iban[:4]
+    return int("".join(str(int(character, 36)) for character in rearranged)) % 97 == 1
+
+
+def nir_checksum(text: str) -> bool:
+    """Validates the key of a French social security number (NIR), spaces are ignored."""
+    nir = text.replace(" ", "").upper()
+    # Corsica departments 2A and 2B
+    number = int(nir[:13].replace("2A", "19").replace("2B", "18"))
+    return 97 - number % 97 == int(nir[13:])
+
+
+VALIDATORS: Dict[str, Callable[[str], bool]] = {
+    "luhn": luhn_checksum,
+    "iban": iban_checksum,
+    "nir": nir_checksum,
+}
+
+# built-in detectors: (regular expression, validator name)
+DETECTORS: Dict[str, Tuple[str, Optional[str]]] = {
+    "iban": (r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b", "iban"),
+    "card_number": (r"\b\d(?:[ -]?\d){12,18}\b", "luhn"),
+    "fr_nir": (
+        r"\b[12] ?\d{2} ?(?:0[1-9]|1[0-2]|[2-9]\d) ?(?:\d{2}|2[AB]) ?\d{3} ?\d{3} ?\d{2}\b",
+        "nir",
+    ),
+    "us_ssn": (r"\b(?!000|666|9\d\d)\d{3}-(?!00)\d{2}-(?!0000)\d{4}\b", None),
+}
+
+
+class ClassificationRule(NamedTuple):
+    """A rule of a classifier, fires when one of its detectors, patterns or keywords is found.
+
+    Attributes:
+        name (str): Name of the rule.
+        label (str): Name of the label, as defined in the configuration.
+        detectors (Tuple[str, ...]): Names of built-in detectors (see DETECTORS).
+        patterns (Tuple[str, ...]): Regular expressions.
+        keywords (Tuple[str, ...]): Words, matched case insensitively.
+    """
+
+    name: str
+    label: str
+    detectors: Tuple[str, ...] = ()
+    patterns: Tuple[str, ...] = ()
+    keywords: Tuple[str, ...] = ()
+
+
+class Classification(NamedTuple):
+    """Result of the classification of one document.
+
+    Attributes:
+        path (str): Path to the document.
+        label (Optional[str]): Name of the suggested label, None if no rule fired.
+        rule (Optional[str]): Name of the rule that suggested the label.
+        scanned (int): Number of characters of text scanned.
+        truncated (bool): True if the scan stopped at max_characters, before the end of the document.
+        error (Optional[str]): Error type and message, when the document could not be read (or labeled).
+        status (Optional[BulkStatus]): Outcome of the labeling, when the suggested label is applied.
+    """
+
+    path: str
+    label: Optional[str] = None
+    rule: Optional[str] = None
+    scanned: int = 0
+    truncated: bool = False
+    error: Optional[str] = None
+    status: Optional[BulkStatus] = None
+
+
+def iter_workbook_text(filename: str) -> Iterator[str]:
+    """Streams the rows of the worksheets of a workbook as text (cells separated by tabs), with openpyxl read_only."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filename, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            for row in worksheet.iter_rows(values_only=True):
+                cells = [
+                    value if isinstance(value, str) else str(value)
+                    for value in row
+                    if value is not None
+                ]
+                if cells:
+                    yield "\t".join(cells)
+    finally:
+        workbook.close()
+
+
+def iter_package_text(filename: str) -> Iterator[str]:
+    """Streams the paragraphs of a Word or PowerPoint document, parsed from its text parts in the zip stream."""
+    parts, paragraph_tag, text_tag = _TEXT_ELEMENTS[
+        PACKAGE_EXTENSIONS[os.path.splitext(filename)[1].lower()]
+    ]
+    with zipfile.ZipFile(filename) as archive:
+        for name in archive.namelist():
+            if not parts.fullmatch(name):
+                continue
+            with archive.open(name) as stream:
+                texts: List[str] = []
+                for _, element in ET.iterparse(stream):
+                    if element.tag == text_tag:
+                        texts.append(element.text or "")
+                    elif element.tag == paragraph_tag:
+                        if texts:
+                            yield "".join(texts)
+                            texts = []
+                        element.clear()
+
+
+def iter_document_text(filename: str) -> Iterator[str]:
+    """
+    Streams the text of an Office Open XML document: rows of the workbooks, paragraphs of the other documents.
+
+    Raises:
+        NotImplementedError: If the file extension is not a supported package format.
+    """
+    check_package(filename)
+    if PACKAGE_EXTENSIONS[os.path.splitext(filename)[1].lower()] == "Excel":
+        return iter_workbook_text(filename)
+    return iter_package_text(filename)
+
+
+class Classifier:
+    """
+    Compiled classification rules.
+
+    The patterns and keywords of the rules are combined into a single regular expression, scanned once whatever the
+    number of rules: its alternatives are lookaheads ordered by the rank of their rule, so that a match does not hide
+    an overlapping match of a more sensitive rule. The detectors with a validator (checksum) have their own
+    expression, so that a rejected match does not hide an overlapping match of another detector.
+
+    Attributes:
+        rules (List[ClassificationRule]): The rules, from the most sensitive label to the least sensitive one.
+        max_characters (int): Maximum number of characters of text scanned per document.
+        registry (Optional[LabelRegistry]): The labels configuration the label names refer to, required to apply
+            the labels.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[ClassificationRule],
+        max_characters: int = DEFAULT_MAX_CHARACTERS,
+        registry: Optional[LabelRegistry] = None,
+    ):
+        self.rules = list(rules)
+        self.max_characters = max_characters
+        self.registry = registry
+        if registry is not None:
+            unknown = sorted(
+                {rule.label for rule in self.rules} - set(registry.definitions)
+            )
+            if unknown:
+                raise ValueError(
+                    f"Unknown labels in the classification rules : {', '.join(unknown)} "
+                    f"(not in {registry.sensitivity_configuration_file})"
+                )
+        # rank of a rule: position of its label, the most sensitive label first
+        labels: List[str] = []
+        for rule in self.rules:
+            if rule.label not in labels:
+                labels.append(rule.label)
+        self._ranks = [labels.index(rule.label) for rule in self.rules]
+        # alternative name -> rule index
+        self._alternatives: Dict[str, int] = {}
+        # (rule index, expression, validator), the most sensitive first
+        self._validated: List[Tuple[int, Pattern, Callable[[str], bool]]] = []
+        sources = []
+        for index in sorted(range(len(self.rules)), key=self._ranks.__getitem__):
+            for source, validator in self._rule_sources(self.rules[index]):
+                if validator:
+                    self._validated.append(
+                        (index, re.compile(source), VALIDATORS[validator])
+                    )
+                    continue
+                name = f"a{len(sources)}"
+                self._alternatives[name] = index
+                sources.append(f"(?P<{name}>{source})")
+        self._matcher = re.compile(f"(?=(?:{'|'.join(sources)}))") if sources else None
+
+    @staticmethod
+    def _rule_sources(rule: ClassificationRule) -> Iterator[Tuple[str, Optional[str]]]:
+        for detector in rule.detectors:
+            if detector not in DETECTORS:
+                raise ValueError(f"Unknown detector {detector} in rule {rule.name}")
+            yield DETECTORS[detector]
+        for pattern in rule.patterns:
+            yield f"(?:{pattern})", None
+        if rule.keywords:
+            keywords = "|".join(re.escape(keyword) for keyword in rule.keywords)
+            yield rf"(?i:\b(?:{keywords})\b)", None
+
+    @classmethod
+    def load(
+        cls,
+        rules_file: str,
+        sensitivity_configuration_file: Optional[
+            str
+        ] = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        max_characters: int = DEFAULT_MAX_CHARACTERS,
+    ) -> "Classifier":
+        """
+        Loads a classification file (see the module documentation), a JSON object or a JSON list of rules.
+
+        Args:
+            rules_file (str): Path to the JSON classification file.
+            sensitivity_configuration_file (Optional[str]): Path to the labels configuration, the label names of the
+                rules are checked against it. None does not check them.
+            max_characters (int): Maximum number of characters of text scanned per document.
+
+        Raises:
+            ValueError: If a rule has no label, or refers to an unknown label or detector.
+        """
+        with open(rules_file, "r", encoding="utf-8") as fh_in:
+            content: Any = json.load(fh_in)
+        if isinstance(content, list):
+            content = {"rules": content}
+        rules = []
+        for position, rule in enumerate(content.get("rules", [])):
+            if not rule.get("label"):
+                raise ValueError(f"Rule without label in {rules_file} : {rule}")
+            rules.append(
+                ClassificationRule(
+                    rule.get("name", f"rule{position}"),
+                    rule["label"],
+                    tuple(rule.get("detectors", ())),
+                    tuple(rule.get("patterns", ())),
+                    tuple(rule.get("keywords", ())),
+                )
+            )
+        registry = (
+            get_label_registry(sensitivity_configuration_file)
+            if sensitivity_configuration_file
+            else None
+        )
+        return cls(rules, content.get("max_characters", max_characters), registry)
+
+    def _best_match(self, text: str, best: int) -> int:
+        """Returns the index of the most sensitive rule firing in text, best if none is more sensitive."""
+        best_rank = self._ranks[best] if best >= 0 else len(self.rules)
+        if self._matcher is not None:
+            for found in self._matcher.finditer(text):
+                index = self._alternatives[found.lastgroup]
+                if self._ranks[index] < best_rank:
+                    best, best_rank = index, self._ranks[index]
+                    if best_rank == 0:
+                        return best
+        for index, matcher, validator in self._validated:
+            if self._ranks[index] >= best_rank:
+                break
+            if any(validator(found.group()) for found in matcher.finditer(text)):
+                best, best_rank = index, self._ranks[index]
+        return best
+
+    def classify_text(
+        self, texts: Iterable[str]
+    ) -> Tuple[Optional[ClassificationRule], int, bool]:
+        """
+        Classifies streamed text.
+
+        Args:
+            texts (Iterable[str]): Pieces of text (rows, paragraphs), consumed until a rule of the most sensitive
+                label fires or max_characters are scanned.
+
+        Returns:
+            Tuple[Optional[ClassificationRule], int, bool]: The most sensitive rule that fired (None if no rule
+            fired), the number of characters scanned and True if the scan stopped at max_characters.
+        """
+        best, scanned, truncated = -1, 0, False
+        if self._matcher is None and not self._validated:
+            return None, scanned, truncated
+        chunk: List[str] = []
+        chunk_length = 0
+        for text in texts:
+            if scanned + len(text) > self.max_characters:
+                text, truncated = text[: self.max_characters - scanned], True
+            chunk.append(text)
+            chunk_length += len(text) + 1
+            scanned += len(text)
+            if chunk_length >= _CHUNK_CHARACTERS or truncated:
+                best = self._best_match("\n".join(chunk), best)
+                chunk, chunk_length = [], 0
+                if truncated or (best >= 0 and self._ranks[best] == 0):
+                    break
+        if chunk:
+            best = self._best_match("\n".join(chunk), best)
+        return (self.rules[best] if best >= 0 else None), scanned, truncated
+
+    def classify_file(self, filename: str) -> Classification:
+        """
+        Classifies a document, a failure is reported in the result instead of being raised.
+
+        Args:
+            filename (str): Path to the document (.docx, .xlsx, .pptx, ...).
+
+        Returns:
+            Classification: The suggested label of the document.
+        """
+        try:
+            with closing(iter_document_text(filename)) as texts:
+                rule, scanned, truncated = self.classify_text(texts)
+        except Exception as error:
+            return Classification(filename, error=f"{type(error).__name__}: {error}")
+        if rule is None:
+            return Classification(filename, scanned=scanned, truncated=truncated)
+        return Classification(filename, rule.label, rule.name, scanned, truncated)
+
+
+# set once per process by _initialize_worker
+_worker_classifier: Optional[Classifier] = None
+_worker_labels: Optional[Dict[str, CompiledLabel]] = None
+_worker_justification: Optional[str] = None
+_worker_force = False
+
+
+def _initialize_worker(
+    classifier: Classifier,
+    labels: Optional[Dict[str, CompiledLabel]],
+    justification: Optional[str],
+    force: bool,
+) -> None:
+    global _worker_classifier, _worker_labels, _worker_justification, _worker_force
+    _worker_classifier, _worker_labels = classifier, labels
+    _worker_justification, _worker_force = justification, force
+
+
+def _classify_chunk(paths: List[str]) -> List[Classification]:
+    """Classifies (and labels) a chunk of files, in a worker process."""
+    results = []
+    for path in paths:
+        classification = _worker_classifier.classify_file(path)
+        if _worker_labels is not None and classification.label is not None:
+            result = _label_file(
+                path,
+                _worker_labels[classification.label],
+                _worker_justification,
+                _worker_force,
+            )
+            classification = classification._replace(
+                status=result.status, error=result.error
+            )
+        results.append(classification)
+    return results
+
+
+def classify_files(
+    paths: Union[str, Iterable[str]],
+    classifier: Classifier,
+    apply: bool = False,
+    justification: Optional[str] = None,
+    force: bool = False,
+    max_workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Classification]:
+    """
+    Classifies many documents in parallel, and optionally labels them with their suggested label.
+
+    As bulk_label.bulk_label, the paths are consumed lazily by chunks and the results are yielded as they complete.
+
+    Args:
+        paths (Union[str, Iterable[str]]): A root directory to walk, or an iterable of paths.
+        classifier (Classifier): The classification rules.
+        apply (bool): Labels the documents for which a rule fired (at package level, see
+            ooxml_toolbox.sensitivity_manager.set_label_to_package).
+        justification (Optional[str]): Justification for applying the labels, if any.
+        force (bool): Rewrites the documents even if they already carry the label.
+        max_workers (Optional[int]): Number of worker processes. Defaults to the number of CPUs.
+        max_pending (Optional[int]): Maximum number of chunks submitted and not completed. Defaults to 4 per worker.
+        chunk_size (int): Number of files sent at once to a worker. Defaults to DEFAULT_CHUNK_SIZE.
+
+    Yields:
+        Classification: The result of each document.
+
+    Raises:
+        ValueError: If apply is True and the classifier has no labels configuration.
+    """
+    labels = None
+    if apply:
+        if classifier.registry is None:
+            raise ValueError("The classifier has no labels configuration")
+        labels = {
+            rule.label: classifier.registry[rule.label] for rule in classifier.rules
+        }
+    if isinstance(paths, str):
+        paths = iter_package_files(paths)
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 4 * max_workers
+    with ProcessPoolExecutor(
+        max_workers,
+        initializer=_initialize_worker,
+        initargs=(classifier, labels, justification, force),
+    ) as executor:
+        pending: Set[Future] = set()
+        for chunk in _iter_chunks(paths, chunk_size):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(executor.submit(_classify_chunk, chunk))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the process exit code (1 if a document failed)."""
+    parser = argparse.ArgumentParser(
+        prog="python -m label_toolbox.label_classifier",
+        description="Suggests (or applies) the sensitivity label of the Office documents of a directory tree from their content.",
+    )
+    parser.add_argument("root", help="directory to walk")
+    parser.add_argument("rules", help="classification rules (json)")
+    parser.add_argument(
+        "--config",
+        default=DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        help="sensitivity labels definition (json)",
+    )
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="label the documents with their suggested label",
+    )
+    parser.add_argument("--justification", default=None)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rewrite the documents that already carry the label",
+    )
+    parser.add_argument(
+        "--max-characters",
+        type=int,
+        default=DEFAULT_MAX_CHARACTERS,
+        help="maximum number of characters of text scanned per document",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--export",
+        default=None,
+        help="write the classification of every document to this JSON Lines file",
+    )
+    args = parser.parse_args(argv)
+
+    classifier = Classifier.load(args.rules, args.config, args.max_characters)
+    labels: Counter = Counter()
+    failed = 0
+    with (
+        JsonLinesWriter(args.export, append=False) if args.export else nullcontext()
+    ) as export:
+        for result in classify_files(
+            args.root,
+            classifier,
+            apply=args.apply,
+            justification=args.justification,
+            force=args.force,
+            max_workers=args.workers,
+        ):
+            labels[result.label] += 1
+            failed += result.error is not None
+            if export is not None:
+                export.write(result)
+            status = result.status.value if result.status else ""
+            print(
+                f"{result.label or '-'}\t{result.rule or ''}\t{status}\t{result.path}\t{result.error or ''}"
+            )
+    print(f"{sum(labels.values())} documents, {failed} failed")
+    for label, count in labels.items():
+        print(f"  {label or '(no label suggested)'}: {count}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
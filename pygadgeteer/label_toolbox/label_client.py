@@ -0,0 +1,64 @@
+"""
+Client of the local labeling service (label_toolbox.label_service).
+
+It only depends on the standard library, so that a report generation job labels its output with one cheap round
+trip, without importing pydantic or openpyxl.
+"""
+
+import json
+import os
+import socket
+from typing import Any, Dict, List, Optional, Union
+
+DEFAULT_ADDRESS = ("127.0.0.1", 8765)
+
+
+def request_label_service(
+    payload: Union[Dict[str, Any], List[Dict[str, Any]]],
+    address: Union[str, tuple] = DEFAULT_ADDRESS,
+    timeout: Optional[float] = 60.0,
+) -> Any:
+    """
+    Sends a request (or a list of requests) to the labeling service and returns its response.
+
+    Args:
+        payload: A request, ex: {"op": "set", "path": ..., "label": "InternalUseOnly"}, or a list of requests.
+        address: (host, port) of the TCP service, or path of its Unix socket.
+        timeout (Optional[float]): Socket timeout, in seconds.
+
+    Returns:
+        The response (a dictionary), or the list of responses for a list of requests.
+    """
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(address)
+        connection.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with connection.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+def label_file(
+    path: str,
+    sensitivity_label: str,
+    justification: Optional[str] = None,
+    address: Union[str, tuple] = DEFAULT_ADDRESS,
+) -> Dict[str, Any]:
+    """Asks the labeling service to apply a sensitivity label (by name) to a file."""
+    # the service does not run in the working directory of the client
+    return request_label_service(
+        {
+            "op": "set",
+            "path": os.path.abspath(path),
+            "label": sensitivity_label,
+            "justification": justification,
+        },
+        address,
+    )
+
+
+def get_file_label(
+    path: str, address: Union[str, tuple] = DEFAULT_ADDRESS
+) -> Dict[str, Any]:
+    """Asks the labeling service for the sensitivity label of a file."""
+    return request_label_service({"op": "get", "path": os.path.abspath(path)}, address)
@@ -0,0 +1,407 @@
+"""
+Incremental, parallel build of a sensitivity labels definition file from a folder of labeled templates.
+
+Both create_sensitivity_label_definition functions (openpyxl_toolbox and office_toolbox) extract one label per
+template of a folder (InternalUseOnly.xlsx, Public.docx, ...) and write them to a JSON configuration file. The build
+implemented here:
+
+- only re-extracts the templates that are new or changed: the modification time, size and content hash of each
+  template are recorded in a state file next to the configuration (<configuration>.templates.json),
+- extracts the templates concurrently, each worker thread holding its own resources (ex: its own Office
+  application for the COM extraction),
+- merges the extracted labels into the existing configuration: labels that were not extracted from a template
+  (added by hand) are kept, labels whose last template was deleted are removed,
+- reports the labels added, removed and changed, and the labels whose templates disagree (Public.docx and
+  Public.xlsx both define the label Public).
+
+Only the standard library is used, the extraction itself is given by the caller.
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+from contextlib import nullcontext
+from glob import glob
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from json_toolbox import DateTimeEncoder
+
+from .label_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+STATE_SUFFIX = ".templates.json"
+DEFAULT_MAX_WORKERS = 4
+_STATE_VERSION = 1
+
+# extracts the label definition of a template (JSON serializable), None if the template has no label
+Extractor = Callable[[str], Optional[Dict[str, Any]]]
+
+# attributes that change every time a template is labeled again, ignored to tell if a label changed
+_VOLATILE_ATTRIBUTES = {"SetDate"}
+
+
+class DefinitionReport(NamedTuple):
+    """Outcome of a build of a labels definition file.
+
+    Attributes:
+        added (List[str]): Names of the labels added to the configuration.
+        removed (List[str]): Names of the labels removed from the configuration (template deleted or unlabeled).
+        changed (List[str]): Names of the labels whose definition changed (SetDate excluded).
+        unchanged (List[str]): Names of the labels whose template did not change, or whose definition did not.
+        extracted (List[str]): Paths to the templates that were (re)read.
+        errors (Dict[str, str]): Error type and message, by template path. The previous definition of the label,
+            if any, is kept.
+        conflicts (Dict[str, List[str]]): Paths to the templates of a label, by label name, when they define it
+            differently. The previous definition of the label, if any, is kept.
+    """
+
+    added: List[str]
+    removed: List[str]
+    changed: List[str]
+    unchanged: List[str]
+    extracted: List[str]
+    errors: Dict[str, str]
+    conflicts: Dict[str, List[str]]
+
+    def report(self) -> str:
+        """Returns a human readable summary of the build."""
+        lines = [
+            f"{len(self.extracted)} templates read, {len(self.added)} labels added, {len(self.removed)} removed, "
+            f"{len(self.changed)} changed, {len(self.unchanged)} unchanged"
+        ]
+        lines.extend(f"  added: {name}" for name in self.added)
+        lines.extend(f"  removed: {name}" for name in self.removed)
+        lines.extend(f"  changed: {name}" for name in self.changed)
+        lines.extend(
+            f"  failed: {path} ({error})" for path, error in self.errors.items()
+        )
+        lines.extend(
+            f"  conflict: {name} ({', '.join(paths)})"
+            for name, paths in self.conflicts.items()
+        )
+        return "\n".join(lines)
+
+
+def _normalize(definition: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the definition as it is read back from the JSON file (dates as text, ...)."""
+    return json.loads(json.dumps(definition, cls=DateTimeEncoder))
+
+
+def _stable(definition: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if definition is None:
+        return None
+    return {
+        name: value
+        for name, value in definition.items()
+        if name not in _VOLATILE_ATTRIBUTES
+    }
+
+
+def _read_json(filename: str) -> Dict[str, Any]:
+    try:
+        with open(filename, "r", encoding="utf8") as fh_in:
+            return json.load(fh_in)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_json(filename: str, content: Dict[str, Any]) -> None:
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf8") as fh_out:
+        json.dump(content, fh_out, indent=4, cls=DateTimeEncoder)
+    os.replace(temporary, filename)
+
+
+def extract_templates(
+    paths: Iterable[str],
+    worker: Callable[[], ContextManager[Extractor]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Dict[str, Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Extracts the label definition of templates, concurrently.
+
+    Each worker thread enters worker() once, uses the extractor it returns for all the templates it reads, then
+    exits it: resources that cannot be shared between threads (ex: a COM application) are created, used and
+    released by the same thread.
+
+    Args:
+        paths (Iterable[str]): Paths to the templates.
+        worker (Callable[[], ContextManager[Extractor]]): Returns, for a worker thread, a context manager giving
+            the extractor of the thread.
+        max_workers (int): Number of worker threads.
+
+    Returns:
+        Dict[str, Tuple[Optional[Dict[str, Any]], Optional[str]]]: The definition (None if the template has no
+        label) and the error (None if the extraction succeeded) of each template, by path.
+    """
+    pending: "queue.Queue[str]" = queue.Queue()
+    paths = list(paths)
+    for path in paths:
+        pending.put(path)
+    results: Dict[str, Tuple[Optional[Dict[str, Any]], Optional[str]]] = {}
+    lock = threading.Lock()
+
+    def run() -> None:
+        try:
+            with worker() as extract:
+                while True:
+                    try:
+                        path = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        result = (extract(path), None)
+                    except Exception as error:
+                        logger.error(f"Error extracting the label of {path}: {error}")
+                        result = (None, f"{type(error).__name__}: {error}")
+                    with lock:
+                        results[path] = result
+        except Exception as error:
+            # the worker resources could not be created: the remaining templates are left to the other threads
+            logger.error(f"Error starting a label extraction worker: {error}")
+
+    threads = [
+        threading.Thread(target=run, name=f"label-definition-{index}")
+        for index in range(max(1, min(max_workers, len(paths))))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for path in paths:
+        results.setdefault(path, (None, "RuntimeError: no extraction worker"))
+    return results
+
+
+def build_label_definition(
+    extract_from: str,
+    sensitivity_configuration_file: str,
+    extractor: Optional[Extractor] = None,
+    is_template: Callable[[str], bool] = lambda filename: True,
+    worker: Optional[Callable[[], ContextManager[Extractor]]] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    full: bool = False,
+) -> DefinitionReport:
+    """
+    Builds (or updates) a labels definition file from the templates of a folder, incrementally.
+
+    The label name is the template file name without extension, so several templates can define the same label
+    (Public.docx and Public.xlsx): a label is removed when none of its templates remains, and reported as a conflict
+    when its templates define it differently. A template is read again only when its modification time or size
+    changed and its content hash changed too (or when full is True). The configuration file is only rewritten when
+    a label was added, removed or changed.
+
+    Args:
+        extract_from (str): The folder of the templates.
+        sensitivity_configuration_file (str): The JSON configuration file to update (created if needed).
+        extractor (Optional[Extractor]): Extracts the label definition of a template, shared by all the worker
+            threads. Ignored when worker is given.
+        is_template (Callable[[str], bool]): Tells if a file of the folder is a template (ex: by extension).
+        worker (Optional[Callable[[], ContextManager[Extractor]]]): Gives the extractor of each worker thread (see
+            extract_templates), for extractors holding per thread resources.
+        max_workers (int): Number of templates read concurrently.
+        full (bool): Reads all the templates again, even the unchanged ones.
+
+    Returns:
+        DefinitionReport: The labels added, removed, changed and unchanged, the templates that failed and the
+        conflicting ones.
+    """
+    if worker is None:
+        worker = lambda: nullcontext(extractor)  # noqa: E731
+    state_file = sensitivity_configuration_file + STATE_SUFFIX
+    state = _read_json(state_file)
+    known: Dict[str, Dict[str, Any]] = (
+        state.get("templates", {}) if state.get("version") == _STATE_VERSION else {}
+    )
+    configuration = _read_json(sensitivity_configuration_file)
+
+    templates: Dict[str, Tuple[str, os.stat_result]] = {}
+    for path in sorted(glob(os.path.join(extract_from, "*"))):
+        # ~$ files are the lock files of the templates open in Office
+        if (
+            os.path.isfile(path)
+            and not os.path.basename(path).startswith("~$")
+            and is_template(path)
+        ):
+            templates[os.path.basename(path)] = (path, os.stat(path))
+
+    to_extract: Dict[str, str] = {}
+    hashes: Dict[str, str] = {}
+    new_state: Dict[str, Dict[str, Any]] = {}
+    for name, (path, stat) in templates.items():
+        entry = known.get(name)
+        if (
+            not full
+            and entry
+            and (entry["mtime_ns"], entry["size"])
+            == (
+                stat.st_mtime_ns,
+                stat.st_size,
+            )
+        ):
+            new_state[name] = entry
+            continue
+        digest = content_hash(path)
+        hashes[name] = digest
+        if not full and entry and entry["hash"] == digest:
+            # touched, not modified
+            new_state[name] = dict(entry, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            continue
+        to_extract[name] = path
+
+    extracted = extract_templates(to_extract.values(), worker, max_workers)
+
+    added, removed, changed, unchanged = [], [], [], []
+    errors: Dict[str, str] = {}
+    conflicts: Dict[str, List[str]] = {}
+    # definitions read now, by label name
+    definitions: Dict[str, List[Dict[str, Any]]] = {}
+    read: Set[str] = set()
+    for name, path in to_extract.items():
+        definition, error = extracted[path]
+        stat = templates[name][1]
+        label_name = os.path.splitext(name)[0]
+        if error:
+            errors[path] = error
+            if name in known:
+                # keeps the previous definition, the template is read again on the next build
+                new_state[name] = dict(known[name], mtime_ns=-1)
+            continue
+        read.add(name)
+        new_state[name] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": hashes[name],
+            "label": label_name if definition is not None else None,
+        }
+        if definition is not None:
+            definitions.setdefault(label_name, []).append(_normalize(definition))
+
+    for label_name, candidates in definitions.items():
+        previous = configuration.get(label_name)
+        # the templates of the label that were not read now hold its previous definition
+        others = [
+            name
+            for name, entry in new_state.items()
+            if name not in read and entry.get("label") == label_name
+        ]
+        versions = [_stable(definition) for definition in candidates]
+        if others and previous is not None:
+            versions.append(_stable(previous))
+        if any(version != versions[0] for version in versions[1:]):
+            conflicts[label_name] = [
+                path
+                for name, (path, _) in templates.items()
+                if os.path.splitext(name)[0] == label_name
+            ]
+            logger.warning(
+                f"The templates of the label {label_name} define it differently:"
+                f" {', '.join(conflicts[label_name])}"
+            )
+            if previous is not None:
+                continue
+        definition = candidates[0]
+        configuration[label_name] = definition
+        if previous is None:
+            added.append(label_name)
+        elif _stable(previous) != _stable(definition):
+            changed.append(label_name)
+        else:
+            unchanged.append(label_name)
+
+    # labels of the templates of the folder, read now or before
+    labels = {entry["label"] for entry in new_state.values() if entry.get("label")}
+    for label_name in sorted(
+        {entry["label"] for entry in known.values() if entry.get("label")} - labels
+    ):
+        # last template of the label deleted, or unlabeled
+        if configuration.pop(label_name, None) is not None:
+            removed.append(label_name)
+    unchanged.extend(
+        sorted(
+            label_name
+            for label_name in labels
+            if label_name not in definitions and label_name in configuration
+        )
+    )
+
+    if (
+        added
+        or removed
+        or changed
+        or not os.path.exists(sensitivity_configuration_file)
+    ):
+        _write_json(sensitivity_configuration_file, configuration)
+    _write_json(state_file, {"version": _STATE_VERSION, "templates": new_state})
+    return DefinitionReport(
+        added, removed, changed, unchanged, list(to_extract.values()), errors, conflicts
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m label_toolbox.label_definition",
+        description="Builds (incrementally) a sensitivity labels definition file from a folder of labeled templates.",
+    )
+    parser.add_argument("extract_from", help="folder of the labeled templates")
+    parser.add_argument("configuration", help="JSON definition file to update")
+    parser.add_argument(
+        "--com",
+        action="store_true",
+        help="read the templates with Excel and Word (office_toolbox) instead of at zip level",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of templates read concurrently",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="re-read the unchanged templates too"
+    )
+    args = parser.parse_args(argv)
+
+    if args.com:
+        from office_toolbox.set_sensitivity_label import (
+            DEFAULT_TEMPLATE_READERS,
+            create_sensitivity_label_definition,
+        )
+
+        report = create_sensitivity_label_definition(
+            args.extract_from,
+            args.configuration,
+            max_workers=args.workers or DEFAULT_TEMPLATE_READERS,
+            full=args.full,
+        )
+    else:
+        from openpyxl_toolbox.sensitivity_manager import (
+            update_sensitivity_label_definition,
+        )
+
+        report = update_sensitivity_label_definition(
+            args.extract_from,
+            args.configuration,
+            max_workers=args.workers or DEFAULT_MAX_WORKERS,
+            full=args.full,
+        )
+    print(report.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+"""
+One interface to read, write and verify the sensitivity label of a document, whatever the code path.
+
+pygadgeteer has three code paths to the labels of a document:
+
+- "zip" (ooxml_toolbox): edits the custom properties of the Office Open XML package, on any platform, without
+  loading the document,
+- "openpyxl" (openpyxl_toolbox): loads and saves the workbook with openpyxl, the whole workbook is rewritten,
+- "com" (office_toolbox): drives Excel or Word, on Windows only. The only path for the documents that are not zip
+  packages, ex: the encrypted documents, stored as OLE compound files.
+
+Each one is wrapped as a LabelEngine. The labels are written from the CompiledLabel of a label registry (either
+configuration file, see label_toolbox.label_registry) and read back as LabelRecord. A LabelDispatcher picks, for each
+document and operation, the cheapest engine available on this platform that supports the document, unless the
+caller names one::
+
+    with LabelDispatcher("sensitivity_labels_definition.json") as dispatcher:
+        dispatcher.write("report.xlsx", "Confidential")  # zip
+        dispatcher.write("encrypted.docx", "Confidential")  # com, on Windows
+        dispatcher.read("report.xlsx", engine="openpyxl")
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from enum import Enum
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Type,
+    Union,
+)
+
+from openpyxl_toolbox.label_record import (
+    DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+    LabelRecord,
+)
+from ooxml_toolbox.package_formats import is_package
+from ooxml_toolbox.sensitivity_manager import (
+    get_label_record_from_package,
+    set_label_to_package,
+)
+
+from .label_cache import LabelCache, has_label, remember_label
+from .label_registry import CompiledLabel, get_label_registry
+
+if TYPE_CHECKING:
+    from office_toolbox.abstract_document_manager import AbstractDocumentManager
+    from office_toolbox.application_pool import ApplicationPool
+
+logger = logging.getLogger(__name__)
+
+# local file header signature: an Office Open XML package is a zip file, an encrypted document is not
+_ZIP_SIGNATURE = b"PK\x03\x04"
+# workbook formats openpyxl loads, the macro-enabled ones keep their VBA project
+_OPENPYXL_EXTENSIONS = (".xlsx", ".xlsm", ".xltx", ".xltm")
+_MACRO_EXTENSIONS = (".xlsm", ".xltm")
+
+
+class LabelOperation(str, Enum):
+    """An operation on the label of a document."""
+
+    Read = "read"
+    Write = "write"
+    Verify = "verify"
+
+
+def _is_zip(filename: str) -> bool:
+    with open(filename, "rb") as fh_in:
+        return fh_in.read(len(_ZIP_SIGNATURE)) == _ZIP_SIGNATURE
+
+
+class LabelEngine(ABC):
+    """
+    Reads, writes and verifies the sensitivity label of documents through one code path.
+
+    Attributes:
+        name (str): Name of the engine, to ask the dispatcher for it.
+        cost (int): Relative cost of an operation, the dispatcher picks the cheapest engine that supports the
+            document.
+    """
+
+    name: str = ""
+    cost: int = 0
+
+    def available(self) -> bool:
+        """Tells if the engine runs on this platform, with the installed packages."""
+        return True
+
+    @abstractmethod
+    def supports(self, filename: str, operation: LabelOperation) -> bool:
+        """
+        Tells if the engine can run an operation on a document, from its format and its content.
+
+        Raises:
+            OSError: If the document cannot be read.
+        """
+
+    @abstractmethod
+    def read(self, filename: str) -> Optional[LabelRecord]:
+        """
+        Reads the sensitivity label of a document.
+
+        Returns:
+            Optional[LabelRecord]: The label of the document, None if the document is not labeled.
+        """
+
+    @abstractmethod
+    def write(
+        self, filename: str, label: CompiledLabel, justification: Optional[str] = None
+    ) -> None:
+        """
+        Applies a sensitivity label to a document, in place, whatever its current label.
+
+        Args:
+            filename (str): Path to the document.
+            label (CompiledLabel): The label to apply.
+            justification (Optional[str]): Justification for applying the label, if any.
+        """
+
+    def verify(self, filename: str, label: CompiledLabel) -> bool:
+        """Tells if a document carries a label (LabelIds are compared case insensitively)."""
+        record = self.read(filename)
+        return record is not None and record.LabelId.lower() == label.label_id.lower()
+
+    def close(self) -> None:
+        """Releases the resources of the engine."""
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+
+class ZipLabelEngine(LabelEngine):
+    """
+    Edits the custom properties of Office Open XML packages (ooxml_toolbox.sensitivity_manager).
+
+    Runs on any platform, and only reads and rewrites docProps/custom.xml: the cost does not depend on the size of
+    the document.
+
+    Args:
+        append (bool): Appends the new custom properties to the package instead of rewriting it (see
+            set_label_to_package).
+    """
+
+    name = "zip"
+    cost = 1
+
+    def __init__(self, append: bool = False):
+        self.append = append
+
+    def supports(self, filename: str, operation: LabelOperation) -> bool:
+        return is_package(filename) and _is_zip(filename)
+
+    def read(self, filename: str) -> Optional[LabelRecord]:
+        return get_label_record_from_package(filename)
+
+    def write(
+        self, filename: str, label: CompiledLabel, justification: Optional[str] = None
+    ) -> None:
+        set_label_to_package(
+            filename, label, justification, force=True, append=self.append
+        )
+
+
+class OpenpyxlLabelEngine(LabelEngine):
+    """
+    Loads the workbook with openpyxl and sets its label with an MSIP_Manager (openpyxl_toolbox.sensitivity_manager).
+
+    The whole workbook is parsed then saved, and the features openpyxl does not support (charts, pivot tables, ...)
+    are lost on write: the zip engine is cheaper for the same workbooks, this engine is there to be asked for.
+    """
+
+    name = "openpyxl"
+    cost = 50
+
+    def available(self) -> bool:
+        return importlib.util.find_spec("openpyxl") is not None
+
+    def supports(self, filename: str, operation: LabelOperation) -> bool:
+        extension = os.path.splitext(filename)[1].lower()
+        return extension in _OPENPYXL_EXTENSIONS and _is_zip(filename)
+
+    def read(self, filename: str) -> Optional[LabelRecord]:
+        from openpyxl import load_workbook
+        from openpyxl_toolbox.sensitivity_manager import MSIP_Manager
+
+        workbook = load_workbook(filename, read_only=True)
+        try:
+            return MSIP_Manager(workbook).getlabel_record()
+        finally:
+            workbook.close()
+
+    def write(
+        self, filename: str, label: CompiledLabel, justification: Optional[str] = None
+    ) -> None:
+        from openpyxl import load_workbook
+        from openpyxl_toolbox.sensitivity_manager import MSIP_Manager
+
+        extension = os.path.splitext(filename)[1].lower()
+        workbook = load_workbook(filename, keep_vba=extension in _MACRO_EXTENSIONS)
+        MSIP_Manager(workbook).setlabel(label.msip_label(), justification)
+        workbook.save(filename)
+
+
+class ComLabelEngine(LabelEngine):
+    """
+    Drives Excel or Word through COM (office_toolbox), on Windows with pywin32 and Office installed.
+
+    The only engine for the documents that are not zip packages. The applications stay alive between documents,
+    in an ApplicationPool, until the engine is closed.
+
+    Args:
+        pool (Optional[ApplicationPool]): The application pool to use. Defaults to a pool of one instance per
+            application, owned (and closed) by the engine.
+    """
+
+    name = "com"
+    cost = 100
+
+    def __init__(self, pool: Optional["ApplicationPool"] = None):
+        self._pool = pool
+        self._own_pool = pool is None
+
+    @property
+    def pool(self) -> "ApplicationPool":
+        """The application pool, created on first use."""
+        if self._pool is None:
+            from office_toolbox.application_pool import ApplicationPool
+
+            self._pool = ApplicationPool(max_size=1)
+        return self._pool
+
+    def available(self) -> bool:
+        return (
+            sys.platform == "win32" and importlib.util.find_spec("win32com") is not None
+        )
+
+    def supports(self, filename: str, operation: LabelOperation) -> bool:
+        from office_toolbox.document_manager_factory import DOCUMENT_FACTORY
+
+        return os.path.splitext(filename)[1].lower() in DOCUMENT_FACTORY
+
+    @contextmanager
+    def _document(self, filename: str) -> Iterator["AbstractDocumentManager"]:
+        from office_toolbox.document_manager_factory import document_manager_factory
+
+        document_manager = document_manager_factory(
+            os.path.abspath(filename), self.pool
+        )
+        try:
+            if not document_manager.document:
+                raise OSError(f"{filename} could not be opened")
+            yield document_manager
+        finally:
+            # closes the document (without saving if it is still open) and gives the application back to the pool
+            document_manager.quit()
+
+    def read(self, filename: str) -> Optional[LabelRecord]:
+        from office_toolbox.sensitivity_manager import LabelInfoManager
+
+        with self._document(filename) as document_manager:
+            label_info = document_manager.sensitivity_label_manager.getlabel()
+            values = LabelInfoManager(label_info).read(LabelRecord._fields)
+        if not values["LabelId"]:
+            return None
+        # the text values of the properties, as a LabelRecord read from the package
+        return LabelRecord(
+            **{
+                name: None if value is None or value == "" else str(value)
+                for name, value in values.items()
+            }
+        )
+
+    def write(
+        self, filename: str, label: CompiledLabel, justification: Optional[str] = None
+    ) -> None:
+        from office_toolbox.set_sensitivity_label import apply_sensitivity_label
+
+        with self._document(filename) as document_manager:
+            apply_sensitivity_label(
+                document_manager,
+                label.name,
+                {label.name: label.definition},
+                justification,
+            )
+            document_manager.close_document(save=True)
+
+    def close(self) -> None:
+        if self._own_pool and self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+
+# the engines of a LabelDispatcher, by name
+ENGINES: Dict[str, Type[LabelEngine]] = {
+    engine.name: engine
+    for engine in (ZipLabelEngine, OpenpyxlLabelEngine, ComLabelEngine)
+}
+
+
+class LabelDispatcher:
+    """
+    Runs each label operation with the cheapest engine that supports the document, or with the engine asked for.
+
+    Use it as a context manager, the engines are closed at exit (the COM engine quits Office).
+
+    Args:
+        sensitivity_configuration_file (str): Path to the labels configuration, the openpyxl or the COM one.
+        engines (Optional[Iterable[LabelEngine]]): The engines to choose from, used as given. Defaults to an
+            instance of each engine of ENGINES available on this platform.
+        engine (Optional[str]): Name of the engine to use for every operation, instead of the cheapest one.
+        cache (Optional[LabelCache]): Content hash cache of the document labels, see label_toolbox.label_cache.
+
+    Raises:
+        ValueError: If the engine asked for is not one of the engines.
+    """
+
+    def __init__(
+        self,
+        sensitivity_configuration_file: str = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        engines: Optional[Iterable[LabelEngine]] = None,
+        engine: Optional[str] = None,
+        cache: Optional[LabelCache] = None,
+    ):
+        if engines is None:
+            engines = [factory() for factory in ENGINES.values()]
+            engines = [candidate for candidate in engines if candidate.available()]
+        self.engines: List[LabelEngine] = sorted(
+            engines, key=lambda candidate: candidate.cost
+        )
+        self._by_name = {candidate.name: candidate for candidate in self.engines}
+        if engine is not None:
+            self._named(engine)
+        self.engine = engine
+        self.registry = get_label_registry(sensitivity_configuration_file)
+        self.cache = cache
+
+    def __enter__(self) -> "LabelDispatcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the engines."""
+        for candidate in self.engines:
+            candidate.close()
+
+    def _named(self, name: str) -> LabelEngine:
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError(
+                f"Unknown or unavailable label engine {name}, available: {', '.join(self._by_name)}"
+            ) from None
+
+    def select(
+        self,
+        filename: str,
+        operation: Union[LabelOperation, str],
+        engine: Optional[str] = None,
+    ) -> LabelEngine:
+        """
+        Returns the engine that runs an operation on a document.
+
+        Args:
+            filename (str): Path to the document.
+            operation (Union[LabelOperation, str]): The operation.
+            engine (Optional[str]): Name of the engine to use, defaults to the engine of the dispatcher if any, else
+                to the cheapest engine that supports the document.
+
+        Returns:
+            LabelEngine: The engine.
+
+        Raises:
+            ValueError: If the engine asked for is not one of the engines.
+            NotImplementedError: If no engine (or not the engine asked for) supports the document.
+            OSError: If the document cannot be read.
+        """
+        operation = LabelOperation(operation)
+        name = engine or self.engine
+        if name is not None:
+            selected = self._named(name)
+            if not selected.supports(filename, operation):
+                raise NotImplementedError(
+                    f"The {name} label engine does not support the {operation.value} of {filename}"
+                )
+            return selected
+        for candidate in self.engines:
+            if candidate.supports(filename, operation):
+                return candidate
+        raise NotImplementedError(
+            f"No label engine supports the {operation.value} of {filename}"
+        )
+
+    def read(
+        self, filename: str, engine: Optional[str] = None
+    ) -> Optional[LabelRecord]:
+        """
+        Reads the sensitivity label of a document.
+
+        Args:
+            filename (str): Path to the document.
+            engine (Optional[str]): Name of the engine to use (see select).
+
+        Returns:
+            Optional[LabelRecord]: The label of the document, None if the document is not labeled.
+        """
+        return self.select(filename, LabelOperation.Read, engine).read(filename)
+
+    def write(
+        self,
+        filename: str,
+        label_name: str,
+        justification: Optional[str] = None,
+        force: bool = False,
+        engine: Optional[str] = None,
+    ) -> bool:
+        """
+        Applies a sensitivity label to a document, in place.
+
+        A document that already carries the label is not rewritten: Office Open XML documents are checked at zip
+        level, the other formats through the content hash cache, if any.
+
+        Args:
+            filename (str): Path to the document.
+            label_name (str): Name of the label in the configuration.
+            justification (Optional[str]): Justification for applying the label, if any.
+            force (bool): Rewrites the document even if it already carries the label.
+            engine (Optional[str]): Name of the engine to use (see select).
+
+        Returns:
+            bool: True if the document was written, False if it already carried the label.
+
+        Raises:
+            KeyError: If the label is not in the configuration.
+        """
+        label = self.registry[label_name]
+        selected = self.select(filename, LabelOperation.Write, engine)
+        if not force and has_label(filename, label.label_id, self.cache):
+            return False
+        logger.debug(f"Labeling {filename} with the {selected.name} engine")
+        selected.write(filename, label, justification)
+        remember_label(filename, label.label_id, self.cache)
+        return True
+
+    def verify(
+        self, filename: str, label_name: str, engine: Optional[str] = None
+    ) -> bool:
+        """
+        Tells if a document carries a sensitivity label.
+
+        Args:
+            filename (str): Path to the document.
+            label_name (str): Name of the label in the configuration.
+            engine (Optional[str]): Name of the engine to use (see select).
+
+        Raises:
+            KeyError: If the label is not in the configuration.
+        """
+        label = self.registry[label_name]
+        return self.select(filename, LabelOperation.Verify, engine).verify(
+            filename, label
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m label_toolbox.label_engine",
+        description="Reads, writes or verifies the sensitivity label of documents with the cheapest capable engine.",
+    )
+    parser.add_argument("files", nargs="+", help="documents")
+    parser.add_argument(
+        "--label", help="label to write (or to verify), the labels are read otherwise"
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check that the documents carry the label instead of writing it",
+    )
+    parser.add_argument("--justification", default=None)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rewrite the documents that already carry the label",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=list(ENGINES),
+        default=None,
+        help="engine to use, default to the cheapest capable one for each document",
+    )
+    parser.add_argument("--config", default=DEFAULT_SENSITIVITY_LABELS_DEFINITION)
+    args = parser.parse_args(argv)
+    if args.verify and args.label is None:
+        parser.error("--verify requires a --label")
+
+    if args.label is None:
+        operation = LabelOperation.Read
+    elif args.verify:
+        operation = LabelOperation.Verify
+    else:
+        operation = LabelOperation.Write
+    failed = 0
+    with LabelDispatcher(args.config, engine=args.engine) as dispatcher:
+        for filename in args.files:
+            try:
+                name = dispatcher.select(filename, operation).name
+                if operation is LabelOperation.Read:
+                    record = dispatcher.read(filename, name)
+                    outcome = record.LabelName if record else "(no label)"
+                elif operation is LabelOperation.Verify:
+                    verified = dispatcher.verify(filename, args.label, name)
+                    failed += not verified
+                    outcome = "verified" if verified else "not labeled"
+                else:
+                    written = dispatcher.write(
+                        filename, args.label, args.justification, args.force, name
+                    )
+                    outcome = "labeled" if written else "skipped"
+            except (NotImplementedError, OSError, ValueError, KeyError) as error:
+                failed += 1
+                name, outcome = "", f"{type(error).__name__}: {error}"
+            print(f"{filename}\t{name}\t{outcome}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,377 @@
+"""
+Persistent, incremental inventory of the sensitivity labels of the Office Open XML documents of file shares.
+
+The inventory is a local SQLite database recording, for each document, its size, modification time, format and
+label. A scan walks the tree with os.scandir and only re-reads the label of the documents whose size or
+modification time changed since the previous scan: re-scanning an unchanged share costs the directory walk
+(plus one indexed query per directory), not the opening of every document.
+
+Command line usage::
+
+    python -m label_toolbox.label_inventory <root> [--database inventory.sqlite] [--list] [--metrics inventory.prom]
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from json_toolbox import JsonLinesWriter
+from ooxml_toolbox.package_formats import PACKAGE_EXTENSIONS
+from ooxml_toolbox.sensitivity_manager import get_label_record_from_package
+
+from .bulk_label import iter_package_entries
+from .label_metrics import enable_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE = "label_inventory.sqlite"
+DEFAULT_COMMIT_INTERVAL = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    label_id TEXT,
+    label_name TEXT,
+    set_date TEXT,
+    error TEXT,
+    PRIMARY KEY (directory, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_label_id ON files (label_id);
+"""
+
+_COLUMNS = (
+    "directory, name, size, mtime_ns, format, label_id, label_name, set_date, error"
+)
+
+
+class InventoryEntry(NamedTuple):
+    """A document of the inventory.
+
+    Attributes:
+        path (str): Path to the document.
+        size (int): Size of the document, in bytes.
+        mtime_ns (int): Modification time of the document, in nanoseconds.
+        format (str): File extension of the document (ex: ".xlsx").
+        label_id (Optional[str]): LabelId of the document label, None if the document is not labeled.
+        label_name (Optional[str]): LabelName of the document label.
+        set_date (Optional[str]): SetDate of the document label.
+        error (Optional[str]): Error type and message, when the label could not be read.
+        changed (bool): True if the label was (re)read by the scan, False if it comes from the inventory.
+    """
+
+    path: str
+    size: int
+    mtime_ns: int
+    format: str
+    label_id: Optional[str] = None
+    label_name: Optional[str] = None
+    set_date: Optional[str] = None
+    error: Optional[str] = None
+    changed: bool = False
+
+
+def _entry_from_row(row: Tuple, changed: bool = False) -> InventoryEntry:
+    directory, name, *values = row
+    return InventoryEntry(os.path.join(directory, name), *values, changed)
+
+
+def _read_entry(path: str, size: int, mtime_ns: int) -> InventoryEntry:
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        label_record = get_label_record_from_package(path)
+    except Exception as error:
+        return InventoryEntry(
+            path,
+            size,
+            mtime_ns,
+            extension,
+            error=f"{type(error).__name__}: {error}",
+            changed=True,
+        )
+    if label_record is None:
+        return InventoryEntry(path, size, mtime_ns, extension, changed=True)
+    return InventoryEntry(
+        path,
+        size,
+        mtime_ns,
+        extension,
+        label_record.LabelId,
+        label_record.LabelName,
+        label_record.SetDate,
+        changed=True,
+    )
+
+
+def _in_trees(directory: str, roots: Set[str]) -> bool:
+    """Tells if a directory is one of the roots or one of their subdirectories."""
+    return any(
+        directory == root or directory.startswith(os.path.join(root, ""))
+        for root in roots
+    )
+
+
+class LabelInventory:
+    """
+    SQLite backed inventory of document labels.
+
+    Use it as a context manager, the database is closed at exit::
+
+        with LabelInventory("inventory.sqlite") as inventory:
+            for entry in inventory.scan("//fileserver/reports"):
+                if entry.changed:
+                    print(entry.path, entry.label_name)
+
+    Attributes:
+        database (str): Path to the SQLite database file.
+        connection (sqlite3.Connection): The database connection.
+        commit_interval (int): Number of changed documents between two commits of a scan.
+    """
+
+    def __init__(
+        self,
+        database: str = DEFAULT_DATABASE,
+        commit_interval: int = DEFAULT_COMMIT_INTERVAL,
+    ):
+        self.database = database
+        self.commit_interval = commit_interval
+        self.connection = sqlite3.connect(database)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self) -> "LabelInventory":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Commits and closes the database."""
+        self.connection.commit()
+        self.connection.close()
+
+    @staticmethod
+    def _tree_condition(root: str) -> Tuple[str, Tuple[str, ...]]:
+        """SQL condition selecting the directories of a tree, by range on the primary key."""
+        root = os.path.abspath(root)
+        prefix = os.path.join(root, "")
+        # all the strings starting with prefix are between prefix and prefix with its last character incremented
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return "(directory = ? OR (directory >= ? AND directory < ?))", (
+            root,
+            prefix,
+            upper,
+        )
+
+    def _directory_rows(self, directory: str) -> Dict[str, Tuple]:
+        return {
+            row[1]: row
+            for row in self.connection.execute(
+                f"SELECT {_COLUMNS} FROM files WHERE directory = ?", (directory,)
+            )
+        }
+
+    def _scan_directory(
+        self,
+        directory: str,
+        entries: List[os.DirEntry],
+        full: bool,
+        purge: bool = True,
+    ) -> Iterator[InventoryEntry]:
+        known = self._directory_rows(directory)
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError as error:
+                logger.warning(f"Error reading {entry.path} : {error}")
+                continue
+            row = known.pop(entry.name, None)
+            if not full and row and row[2:4] == (stat.st_size, stat.st_mtime_ns):
+                yield _entry_from_row(row)
+                continue
+            inventory_entry = _read_entry(entry.path, stat.st_size, stat.st_mtime_ns)
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO files ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (directory, entry.name, *inventory_entry[1:-1]),
+            )
+            yield inventory_entry
+        if not purge:
+            return
+        # documents deleted (or renamed) since the previous scan
+        self.connection.executemany(
+            "DELETE FROM files WHERE directory = ? AND name = ?",
+            ((directory, name) for name in known),
+        )
+
+    def scan(
+        self,
+        root: str,
+        extensions: Iterable[str] = PACKAGE_EXTENSIONS,
+        full: bool = False,
+    ) -> Iterator[InventoryEntry]:
+        """
+        Scans a directory tree and updates the inventory, yielding each document as it is scanned.
+
+        Only the documents that are new, or whose size or modification time changed, are opened (changed=True).
+        The documents of the tree that disappeared are removed from the inventory at the end of the scan, except in
+        the directories that could not be read (and their subdirectories), which are logged and keep their
+        documents. The database is committed every commit_interval changed documents, and at the end of the scan.
+
+        Args:
+            root (str): The directory to scan.
+            extensions (Iterable[str]): The file extensions to inventory. Defaults to all the package formats.
+            full (bool): Re-reads every document, even the unchanged ones.
+
+        Yields:
+            InventoryEntry: Each document of the tree.
+        """
+        root = os.path.abspath(root)
+        visited: Set[str] = set()
+        # directories that could not be read, their documents (and subdirectories) may not have been walked
+        failed: Set[str] = set()
+        changed = 0
+        directory, entries = None, []
+
+        def on_error(failed_directory: str, error: OSError) -> None:
+            logger.warning(
+                f"Error reading the directory {failed_directory}, its documents are kept : {error}"
+            )
+            failed.add(failed_directory)
+
+        def flush() -> Iterator[InventoryEntry]:
+            nonlocal changed
+            visited.add(directory)
+            # the error of a directory is reported before its entries are flushed
+            purge = directory not in failed
+            for inventory_entry in self._scan_directory(
+                directory, entries, full, purge
+            ):
+                if inventory_entry.changed:
+                    changed += 1
+                    if changed % self.commit_interval == 0:
+                        self.connection.commit()
+                yield inventory_entry
+
+        # iter_package_entries yields all the entries of a directory before moving to the next one
+        for entry in iter_package_entries(root, extensions, on_error):
+            entry_directory = os.path.dirname(entry.path)
+            if entry_directory != directory:
+                if directory is not None:
+                    yield from flush()
+                directory, entries = entry_directory, []
+            entries.append(entry)
+        if directory is not None:
+            yield from flush()
+
+        condition, parameters = self._tree_condition(root)
+        removed = [
+            directory
+            for (directory,) in self.connection.execute(
+                f"SELECT DISTINCT directory FROM files WHERE {condition}", parameters
+            )
+            if directory not in visited and not _in_trees(directory, failed)
+        ]
+        self.connection.executemany(
+            "DELETE FROM files WHERE directory = ?",
+            ((directory,) for directory in removed),
+        )
+        self.connection.commit()
+
+    def entries(
+        self, root: Optional[str] = None, label_id: Optional[str] = None
+    ) -> Iterator[InventoryEntry]:
+        """
+        Streams documents from the inventory, without scanning.
+
+        Args:
+            root (Optional[str]): Only the documents of this directory tree. Defaults to all the documents.
+            label_id (Optional[str]): Only the documents with this LabelId.
+
+        Yields:
+            InventoryEntry: Each matching document.
+        """
+        conditions, parameters = [], []
+        if root is not None:
+            condition, tree_parameters = self._tree_condition(root)
+            conditions.append(condition)
+            parameters.extend(tree_parameters)
+        if label_id is not None:
+            conditions.append("label_id = ?")
+            parameters.append(label_id)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.connection.execute(
+            f"SELECT {_COLUMNS} FROM files{where}", parameters
+        )
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                yield _entry_from_row(row)
+
+    def label_counts(self, root: Optional[str] = None) -> Dict[Optional[str], int]:
+        """Returns the number of documents by label name (None for the documents without label)."""
+        where, parameters = "", ()
+        if root is not None:
+            condition, parameters = self._tree_condition(root)
+            where = f" WHERE {condition}"
+        return dict(
+            self.connection.execute(
+                f"SELECT label_name, COUNT(*) FROM files{where} GROUP BY label_name",
+                parameters,
+            )
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m label_toolbox.label_inventory",
+        description="Inventories the sensitivity labels of the Office documents of a directory tree.",
+    )
+    parser.add_argument("root", help="directory to scan")
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    parser.add_argument(
+        "--full", action="store_true", help="re-read the unchanged documents too"
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="print every document and its label"
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="write the metrics of the scan to this file (.prom for Prometheus, else JSON)",
+    )
+    parser.add_argument(
+        "--export",
+        default=None,
+        help="write the documents of the tree and their label to this JSON Lines file",
+    )
+    args = parser.parse_args(argv)
+    metrics = enable_metrics() if args.metrics else None
+
+    scanned = changed = 0
+    with LabelInventory(args.database) as inventory:
+        for entry in inventory.scan(args.root, full=args.full):
+            scanned += 1
+            changed += entry.changed
+            if args.list:
+                print(f"{entry.path}\t{entry.label_name or ''}\t{entry.error or ''}")
+        print(f"{scanned} documents, {changed} read")
+        for label_name, count in inventory.label_counts(args.root).items():
+            print(f"  {label_name or '(no label)'}: {count}")
+        if args.export:
+            with JsonLinesWriter(args.export, append=False) as writer:
+                writer.write_many(inventory.entries(args.root))
+    if metrics is not None:
+        metrics.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
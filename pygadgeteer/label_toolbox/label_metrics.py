@@ -0,0 +1,326 @@
+"""
+Optional instrumentation of the labeling operations: counters and latency histograms per phase.
+
+Metrics are off by default: until enable_metrics() is called, the instrumented code paths only pay a global lookup
+per phase. Once enabled, the following metrics are recorded:
+
+- pygadgeteer_label_phase_seconds (histogram, by phase): open (zip central directory), read_properties, validate
+  (pydantic), write (package rewrite), save (openpyxl / COM save), com_open, com_label, com_close,
+- pygadgeteer_label_errors_total (by phase and error type),
+- pygadgeteer_label_bytes_total (by direction, read or written),
+- pygadgeteer_label_files_total (by status and share) and pygadgeteer_label_file_seconds (by share), for the bulk
+  runs, the share being the root directory of the run.
+
+They are exported as a Prometheus text file (for the node exporter textfile collector) or as a JSON snapshot. The
+bulk labeling and the labeling service merge the metrics of their worker processes into the metrics of the main
+process.
+
+The instrumented code records through the hooks of ooxml_toolbox.instrumentation (timed, record_error,
+add_bytes, re-exported here): enabling the metrics installs them there. Only the standard library is used.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ooxml_toolbox import instrumentation
+from ooxml_toolbox.instrumentation import get_recorder, set_recorder
+
+METRICS_PREFIX = "pygadgeteer_label"
+
+# upper bounds (seconds) of the latency buckets, from a cached zip read to a COM save of a large workbook
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+_HELP = {
+    "phase_seconds": "Latency of the labeling phases, in seconds.",
+    "errors_total": "Number of errors, by phase and error type.",
+    "bytes_total": "Number of bytes read from and written to documents.",
+    "files_total": "Number of files processed by the bulk runs, by status.",
+    "file_seconds": "Time spent per file by the bulk runs, in seconds.",
+}
+
+# sorted (name, value) pairs of the labels of a series
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels_key(labels: Dict[str, Any]) -> _Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: _Labels, extra: str = "") -> str:
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    if extra:
+        text = f"{text},{extra}" if text else extra
+    return f"{{{text}}}" if text else ""
+
+
+class Histogram:
+    """
+    Distribution of observed values in fixed buckets.
+
+    Attributes:
+        buckets (Tuple[float, ...]): Upper bounds of the buckets, sorted. Values above the last bound are only
+            counted in count and sum.
+        counts (List[int]): Number of observations per bucket (not cumulative).
+        count (int): Number of observations.
+        sum (float): Sum of the observed values.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Records a value."""
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, counts: List[int], count: int, total: float) -> None:
+        """Adds the observations of another histogram with the same buckets."""
+        for index, bucket_count in enumerate(counts):
+            self.counts[index] += bucket_count
+        self.count += count
+        self.sum += total
+
+
+class LabelMetrics:
+    """
+    Thread safe collection of counters and histograms, identified by name and labels.
+
+    Attributes:
+        buckets (Tuple[float, ...]): Buckets of the histograms.
+        counters (Dict[Tuple[str, tuple], float]): Counter values, by (name, labels).
+        histograms (Dict[Tuple[str, tuple], Histogram]): Histograms, by (name, labels).
+        started (datetime): Creation (or last reset) of the metrics.
+        pid (int): The process recording the metrics.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counters: Dict[Tuple[str, _Labels], float] = {}
+        self.histograms: Dict[Tuple[str, _Labels], Histogram] = {}
+        self.started = datetime.now()
+        self.pid = os.getpid()
+        self._lock = threading.RLock()
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Adds value to a counter."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Records a value in a histogram."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def record_error(self, phase: str, error: BaseException) -> None:
+        """Counts an error of a phase, by error type."""
+        self.increment("errors_total", phase=phase, type=type(error).__name__)
+
+    def add_bytes(self, read: int = 0, written: int = 0) -> None:
+        """Counts bytes read from or written to documents."""
+        if read:
+            self.increment("bytes_total", read, direction="read")
+        if written:
+            self.increment("bytes_total", written, direction="written")
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        """Times a phase; an exception raised by the phase is counted, then re-raised."""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as error:
+            self.record_error(phase, error)
+            raise
+        finally:
+            self.observe("phase_seconds", time.perf_counter() - started, phase=phase)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the metrics as a JSON serializable dictionary (see merge)."""
+        with self._lock:
+            return {
+                "started": self.started.isoformat(),
+                "created": datetime.now().isoformat(),
+                "buckets": list(self.buckets),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "counts": list(histogram.counts),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                    }
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def reset(self) -> None:
+        """Forgets all the recorded values."""
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = datetime.now()
+
+    def collect(self) -> Dict[str, Any]:
+        """Returns the snapshot of the metrics and resets them (used by the worker processes)."""
+        with self._lock:
+            snapshot = self.snapshot()
+            self.reset()
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Adds the values of a snapshot (ex: the metrics of a worker process) to these metrics.
+
+        Raises:
+            ValueError: If the histograms of the snapshot do not have the same buckets.
+        """
+        if tuple(snapshot["buckets"]) != self.buckets:
+            raise ValueError("Cannot merge metrics with different histogram buckets")
+        with self._lock:
+            for counter in snapshot["counters"]:
+                key = (counter["name"], _labels_key(counter["labels"]))
+                self.counters[key] = self.counters.get(key, 0) + counter["value"]
+            for entry in snapshot["histograms"]:
+                key = (entry["name"], _labels_key(entry["labels"]))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(self.buckets)
+                histogram.merge(entry["counts"], entry["count"], entry["sum"])
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, (list(histogram.counts), histogram.count, histogram.sum))
+                for key, histogram in self.histograms.items()
+            )
+        described = set()
+        for (name, labels), value in counters:
+            metric = f"{METRICS_PREFIX}_{name}"
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+        for (name, labels), (counts, count, total) in histograms:
+            metric = f"{METRICS_PREFIX}_{name}"
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(labels, 'le="%g"' % bound)
+                lines.append(f"{metric}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(labels, 'le="+Inf"')
+            lines.append(f"{metric}_bucket{bucket_labels} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename: str) -> None:
+        """
+        Writes the metrics to a file, atomically (the file is replaced, never partially written).
+
+        A .prom (or .txt) file gets the Prometheus text format, any other extension a JSON snapshot.
+        """
+        if os.path.splitext(filename)[1].lower() in (".prom", ".txt"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=4)
+        temporary = f"{filename}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as fh_out:
+            fh_out.write(content)
+        os.replace(temporary, filename)
+
+
+def enable_metrics(metrics: Optional[LabelMetrics] = None) -> LabelMetrics:
+    """
+    Turns the instrumentation on for the process.
+
+    Args:
+        metrics (Optional[LabelMetrics]): The metrics to record into. Defaults to the already enabled metrics, or
+            new metrics.
+
+    Returns:
+        LabelMetrics: The enabled metrics.
+    """
+    if metrics is None:
+        metrics = get_metrics() or LabelMetrics()
+    set_recorder(metrics)
+    return metrics
+
+
+def enable_worker_metrics() -> LabelMetrics:
+    """
+    Turns the instrumentation on in a worker process, whose metrics are sent back to the main process with
+    LabelMetrics.collect. Metrics inherited from the main process (fork) are replaced by empty ones.
+    """
+    metrics = get_metrics()
+    if metrics is None or metrics.pid != os.getpid():
+        metrics = LabelMetrics()
+        set_recorder(metrics)
+    return metrics
+
+
+def disable_metrics() -> None:
+    """Turns the instrumentation off, the recorded metrics are dropped."""
+    set_recorder(None)
+
+
+def get_metrics() -> Optional[LabelMetrics]:
+    """Returns the enabled metrics, None when the instrumentation is off."""
+    return get_recorder()
+
+
+# the hooks live in ooxml_toolbox, the lowest instrumented layer
+timed = instrumentation.timed
+record_error = instrumentation.record_error
+add_bytes = instrumentation.add_bytes
@@ -0,0 +1,499 @@
+"""
+Location based labeling policy: the label a document should carry is decided by its path.
+
+A policy is an ordered list of rules, each mapping a path pattern to a label name of the configuration file, the
+first matching rule wins::
+
+    {
+        "root": "//fileserver/share",
+        "default": "InternalUseOnly",
+        "rules": [
+            {"pattern": "/finance/**", "label": "RestrictedConfidential"},
+            {"pattern": "/public/drafts/**", "label": null},
+            {"pattern": "/public", "label": "Public"},
+            {"pattern": "*.xlsm", "label": "Confidential"}
+        ]
+    }
+
+Patterns are "/" separated, with the glob syntax of fnmatch (*, ?, [...]) within a path component and ** for any
+number of directories:
+
+- a pattern starting with "/" is anchored at the root of the policy, other patterns match at any depth,
+- a pattern without wildcard is a prefix: it matches the path and everything below it,
+- a null label excludes the matching documents, the default label applies to the documents matching no rule.
+
+The rules are compiled into a trie of their literal leading path components, each node holding the rules anchored
+there, and the glob part of the rules of a node is combined into a single regular expression (one alternative per
+rule, in order). Resolving a path walks the trie once, so that the cost depends on the depth of the path and not on
+the number of rules.
+
+The policy is enforced by the bulk workflow (see bulk_label.bulk_label, policy argument) and checked against the
+label inventory (see verify_policy).
+
+Command line usage::
+
+    python -m label_toolbox.label_policy <root> <policy.json> [--database inventory.sqlite] [--list]
+    python -m label_toolbox.label_policy <root> <policy.json> --fix [--workers N]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import nullcontext
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from json_toolbox import JsonLinesWriter
+from openpyxl_toolbox.label_record import DEFAULT_SENSITIVITY_LABELS_DEFINITION
+
+from .bulk_label import BulkStatus, BulkSummary, bulk_label
+from .label_inventory import DEFAULT_DATABASE, InventoryEntry, LabelInventory
+from .label_registry import CompiledLabel, LabelRegistry, get_label_registry
+
+# index of "no rule", greater than any rule index
+_NO_RULE = sys.maxsize
+_GLOB_CHARACTERS = re.compile(r"[*?\[]")
+_CLASS_CHARACTERS = re.compile(r"[*?\[\]]")
+
+
+class PolicyRule(NamedTuple):
+    """A rule of a labeling policy.
+
+    Attributes:
+        pattern (str): The path pattern (see the module documentation).
+        label (Optional[str]): Name of the label, as defined in the configuration. None excludes the documents.
+        index (int): Position of the rule in the policy, the first matching rule wins.
+    """
+
+    pattern: str
+    label: Optional[str]
+    index: int = 0
+
+
+class PolicyStatus(str, Enum):
+    """Compliance of one document with a labeling policy."""
+
+    Compliant = "compliant"
+    Mismatch = "mismatch"
+    Unlabeled = "unlabeled"
+    Excluded = "excluded"
+    Failed = "failed"
+
+
+class PolicyResult(NamedTuple):
+    """Compliance of one document with a labeling policy.
+
+    Attributes:
+        path (str): Path to the document.
+        status (PolicyStatus): Compliance of the document.
+        expected (Optional[str]): Name of the label required by the policy, None if the document is excluded.
+        actual (Optional[str]): Name of the label of the document (its LabelName if the label is not in the
+            configuration), None if the document is not labeled.
+        error (Optional[str]): Error type and message, when the label of the document could not be read.
+    """
+
+    path: str
+    status: PolicyStatus
+    expected: Optional[str] = None
+    actual: Optional[str] = None
+    error: Optional[str] = None
+
+
+class _Node:
+    """Node of the rules trie: the rules whose literal leading components end here."""
+
+    __slots__ = ("children", "subtree", "exact", "first", "patterns", "matchers")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # lowest index of the prefix rules, matching any path below the node (subtree) or the node itself (exact)
+        self.subtree = _NO_RULE
+        self.exact = _NO_RULE
+        # glob rules by the literal extension of their last component (None if it has none), each group matched by
+        # a combined regular expression: only the rules that can match the extension of a path are tried
+        self.first = _NO_RULE
+        self.patterns: Dict[Optional[str], List[Tuple[int, str]]] = {}
+        self.matchers: Dict[Optional[str], Tuple[int, re.Pattern]] = {}
+
+    def compile(self) -> None:
+        for extension, patterns in self.patterns.items():
+            patterns.sort()
+            # alternatives are tried in order: the first rule that matches the whole path wins
+            self.matchers[extension] = (
+                patterns[0][0],
+                re.compile(
+                    "|".join(f"(?P<r{index}>{source})" for index, source in patterns)
+                ),
+            )
+            self.first = min(self.first, patterns[0][0])
+        for child in self.children.values():
+            child.compile()
+
+
+def _extension(name: str) -> Optional[str]:
+    position = name.rfind(".")
+    return name[position:] if position >= 0 else None
+
+
+def _translate_component(component: str) -> str:
+    """Translates the glob syntax of a path component, wildcards do not match "/"."""
+    parts, i = [], 0
+    while i < len(component):
+        character = component[i]
+        i += 1
+        if character == "*":
+            parts.append("[^/]*")
+        elif character == "?":
+            parts.append("[^/]")
+        elif character == "[":
+            end = component.find(
+                "]", i + 1 if component[i : i + 1] in ("!", "]") else i
+            )
+            if end < 0:
+                parts.append(re.escape(character))
+                continue
+            content = component[i:end].replace("\\", "\\\\")
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            parts.append(f"[{content}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(character))
+    return "".join(parts)
+
+
+def _translate(components: List[str]) -> str:
+    """Translates the glob part of a pattern (path components) to a regular expression matching a relative path."""
+    parts = []
+    for position, component in enumerate(components):
+        last = position == len(components) - 1
+        if component == "**":
+            parts.append(".+" if last else "(?:[^/]+/)*")
+        else:
+            parts.append(_translate_component(component) + ("" if last else "/"))
+    return "".join(parts)
+
+
+class LabelPolicy:
+    """
+    Compiled labeling policy, resolves the label a document should carry from its path.
+
+    Attributes:
+        rules (List[PolicyRule]): The rules, in order.
+        root (Optional[str]): The paths inside this directory are matched relative to it. Defaults to None: the
+            anchored patterns match absolute paths.
+        default (Optional[str]): The label of the documents matching no rule, None to exclude them.
+        case_sensitive (bool): Matches the paths case sensitively. Defaults to False on Windows.
+        registry (Optional[LabelRegistry]): The labels configuration the label names refer to, required to label
+            or verify documents.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[Tuple[str, Optional[str]]],
+        root: Optional[str] = None,
+        default: Optional[str] = None,
+        case_sensitive: Optional[bool] = None,
+        registry: Optional[LabelRegistry] = None,
+    ):
+        self.rules = [
+            PolicyRule(pattern, label, index)
+            for index, (pattern, label, *_) in enumerate(rules)
+        ]
+        self.default = default
+        self.case_sensitive = (
+            os.name != "nt" if case_sensitive is None else case_sensitive
+        )
+        self.root = root
+        self._root_components = self._components(root) if root else []
+        self.registry = registry
+        if registry is not None:
+            unknown = sorted(
+                label for label in self.labels if label not in registry.definitions
+            )
+            if unknown:
+                raise ValueError(
+                    f"Unknown labels in the policy : {', '.join(unknown)} "
+                    f"(not in {registry.sensitivity_configuration_file})"
+                )
+        self._trie = _Node()
+        for rule in self.rules:
+            self._add(rule)
+        self._trie.compile()
+
+    @classmethod
+    def load(
+        cls,
+        policy_file: str,
+        sensitivity_configuration_file: Optional[
+            str
+        ] = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+    ) -> "LabelPolicy":
+        """
+        Loads a policy file (see the module documentation), a JSON object or a JSON list of rules.
+
+        Args:
+            policy_file (str): Path to the JSON policy file.
+            sensitivity_configuration_file (Optional[str]): Path to the labels configuration, the label names of the
+                policy are checked against it. None does not check them.
+
+        Raises:
+            ValueError: If a rule has no pattern, or a label is not in the configuration.
+        """
+        with open(policy_file, "r", encoding="utf-8") as fh_in:
+            policy: Any = json.load(fh_in)
+        if isinstance(policy, list):
+            policy = {"rules": policy}
+        rules = []
+        for rule in policy.get("rules", []):
+            if not rule.get("pattern"):
+                raise ValueError(f"Rule without pattern in {policy_file} : {rule}")
+            rules.append((rule["pattern"], rule.get("label")))
+        registry = (
+            get_label_registry(sensitivity_configuration_file)
+            if sensitivity_configuration_file
+            else None
+        )
+        return cls(
+            rules,
+            root=policy.get("root"),
+            default=policy.get("default"),
+            case_sensitive=policy.get("case_sensitive"),
+            registry=registry,
+        )
+
+    @property
+    def labels(self) -> List[str]:
+        """The names of the labels used by the policy."""
+        labels = {rule.label for rule in self.rules}
+        labels.add(self.default)
+        labels.discard(None)
+        return sorted(labels)
+
+    def compiled_labels(self) -> Dict[str, CompiledLabel]:
+        """
+        Returns the compiled labels used by the policy, by name.
+
+        Raises:
+            ValueError: If the policy has no labels configuration.
+        """
+        if self.registry is None:
+            raise ValueError("The policy has no labels configuration")
+        return {label: self.registry[label] for label in self.labels}
+
+    def _components(self, path: str) -> List[str]:
+        path = path.replace("\\", "/")
+        if not self.case_sensitive:
+            path = path.lower()
+        return [component for component in path.split("/") if component]
+
+    def _add(self, rule: PolicyRule) -> None:
+        pattern = rule.pattern.replace("\\", "/")
+        components = self._components(pattern)
+        # no wildcard: the path itself and everything below it
+        prefix = not _GLOB_CHARACTERS.search(pattern)
+        if pattern.endswith("/"):
+            components.append("**")
+        if not pattern.startswith("/"):
+            components.insert(0, "**")
+        node, position = self._trie, 0
+        while position < len(components) and not _GLOB_CHARACTERS.search(
+            components[position]
+        ):
+            node = node.children.setdefault(components[position], _Node())
+            position += 1
+        rest = components[position:]
+        if not rest:
+            node.exact = min(node.exact, rule.index)
+            node.subtree = min(node.subtree, rule.index)
+        elif rest == ["**"]:
+            node.subtree = min(node.subtree, rule.index)
+        else:
+            source = _translate(rest)
+            extension = None
+            if prefix:
+                source += "(?:/.+)?"
+            elif rest[-1] != "**":
+                extension = _extension(rest[-1])
+                if extension is not None and _CLASS_CHARACTERS.search(extension):
+                    extension = None
+            node.patterns.setdefault(extension, []).append((rule.index, source))
+
+    def match(self, path: str) -> Optional[PolicyRule]:
+        """
+        Returns the first rule matching a path.
+
+        Args:
+            path (str): Path to a document, "/" or "\\" separated.
+
+        Returns:
+            Optional[PolicyRule]: The first matching rule, None if no rule matches.
+        """
+        components = self._components(path)
+        root = self._root_components
+        if root and components[: len(root)] == root:
+            components = components[len(root) :]
+        extension = _extension(components[-1]) if components else None
+        extensions = (None,) if extension is None else (extension, None)
+        best, node, depth = _NO_RULE, self._trie, 0
+        while True:
+            if depth < len(components):
+                best = min(best, node.subtree)
+                if node.first < best:
+                    relative = "/".join(components[depth:])
+                    for key in extensions:
+                        first, matcher = node.matchers.get(key, (_NO_RULE, None))
+                        if first < best:
+                            found = matcher.fullmatch(relative)
+                            if found is not None:
+                                # the bucket can hold rules after a subtree rule found meanwhile
+                                best = min(best, int(found.lastgroup[1:]))
+            else:
+                best = min(best, node.exact)
+                break
+            node = node.children.get(components[depth])
+            if node is None:
+                break
+            depth += 1
+        return self.rules[best] if best != _NO_RULE else None
+
+    def resolve(self, path: str) -> Optional[str]:
+        """
+        Resolves the label a document should carry.
+
+        Args:
+            path (str): Path to a document.
+
+        Returns:
+            Optional[str]: The name of the label, None if the document is excluded from the policy.
+        """
+        rule = self.match(path)
+        return rule.label if rule is not None else self.default
+
+
+def verify_policy(
+    entries: Iterable[InventoryEntry], policy: LabelPolicy
+) -> Iterator[PolicyResult]:
+    """
+    Checks the labels of documents against a policy.
+
+    The labels are compared by LabelId. The documents come from the label inventory (see
+    label_inventory.LabelInventory.scan or entries), so that verifying a share only reads the documents that changed
+    since its previous scan.
+
+    Args:
+        entries (Iterable[InventoryEntry]): The documents and their labels.
+        policy (LabelPolicy): The policy, with its labels configuration.
+
+    Yields:
+        PolicyResult: The compliance of each document.
+
+    Raises:
+        ValueError: If the policy has no labels configuration.
+    """
+    labels = policy.compiled_labels()
+    label_ids = {name: label.label_id.lower() for name, label in labels.items()}
+    names_by_id = {
+        label.label_id.lower(): name for name, label in policy.registry.labels.items()
+    }
+    for entry in entries:
+        expected = policy.resolve(entry.path)
+        actual = None
+        if entry.label_id:
+            actual = names_by_id.get(entry.label_id.lower(), entry.label_name)
+        if entry.error:
+            status = PolicyStatus.Failed
+        elif expected is None:
+            status = PolicyStatus.Excluded
+        elif not entry.label_id:
+            status = PolicyStatus.Unlabeled
+        elif entry.label_id.lower() == label_ids[expected]:
+            status = PolicyStatus.Compliant
+        else:
+            status = PolicyStatus.Mismatch
+        yield PolicyResult(entry.path, status, expected, actual, entry.error)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the process exit code (1 if a document is not compliant)."""
+    parser = argparse.ArgumentParser(
+        prog="python -m label_toolbox.label_policy",
+        description="Checks (and fixes) the sensitivity labels of a directory tree against a location based policy.",
+    )
+    parser.add_argument("root", help="directory to check")
+    parser.add_argument("policy", help="labeling policy (json)")
+    parser.add_argument(
+        "--config",
+        default=DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        help="sensitivity labels definition (json)",
+    )
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="label inventory")
+    parser.add_argument(
+        "--full", action="store_true", help="re-read the unchanged documents too"
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="print every document, compliant or not"
+    )
+    parser.add_argument(
+        "--export",
+        default=None,
+        help="write the documents that are not compliant to this JSON Lines file",
+    )
+    parser.add_argument(
+        "--fix",
+        action="store_true",
+        help="label the documents that are not compliant with the label of the policy",
+    )
+    parser.add_argument("--justification", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    policy = LabelPolicy.load(args.policy, args.config)
+    statuses: Counter = Counter()
+    to_fix = []
+    with LabelInventory(args.database) as inventory:
+        with (
+            JsonLinesWriter(args.export, append=False) if args.export else nullcontext()
+        ) as export:
+            for result in verify_policy(
+                inventory.scan(args.root, full=args.full), policy
+            ):
+                statuses[result.status] += 1
+                if result.status in (PolicyStatus.Compliant, PolicyStatus.Excluded):
+                    if args.list:
+                        print(f"{result.status.value}\t{result.path}")
+                    continue
+                if result.status != PolicyStatus.Failed:
+                    to_fix.append(result.path)
+                if export is not None:
+                    export.write(result)
+                print(
+                    f"{result.status.value}\t{result.path}\t{result.expected or ''}\t"
+                    f"{result.actual or result.error or ''}"
+                )
+    print(f"{sum(statuses.values())} documents")
+    for status, count in statuses.items():
+        print(f"  {status.value}: {count}")
+    failed = statuses[PolicyStatus.Failed] > 0
+    if not args.fix:
+        return 1 if to_fix or failed else 0
+
+    summary = BulkSummary()
+    for result in bulk_label(
+        to_fix,
+        None,
+        justification=args.justification,
+        max_workers=args.workers,
+        summary=summary,
+        policy=policy,
+    ):
+        print(f"{result.status.value}\t{result.path}\t{result.error or ''}")
+    print(summary.report())
+    return 1 if failed or summary.statuses[BulkStatus.Failed] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
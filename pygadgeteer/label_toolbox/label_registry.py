@@ -0,0 +1,275 @@
+"""
+Process wide registry of the sensitivity labels of a configuration file, shared by the COM (office_toolbox) and
+the package level / openpyxl (ooxml_toolbox, openpyxl_toolbox) code paths.
+
+Both configuration files (sensitivity_labels_definition.json and sensitivity_labels_definition_with_openpyxl.json)
+map a label name to its LabelId, LabelName, ... The registry:
+
+- is memoized per process and per file, and reloaded when the file modification time (or size) changes,
+- validates each label (MSIP_Label) only once, on first use,
+- pre-renders the MSIP_Label_* custom properties of each label, so that labeling a file only renders its SetDate,
+- can persist a JSON cache of the compiled labels next to the configuration file, for a fast start of short lived
+  processes. The cache is plain data (no pickle), so reading a cache from a shared folder cannot run code.
+
+The pydantic model is only imported when a label is compiled: reading the raw definitions (COM path) does not
+import pydantic nor openpyxl.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from ooxml_toolbox.custom_properties import CustomProperty, string_property
+
+from .label_metrics import timed
+
+CACHE_SUFFIX = ".cache"
+_CACHE_VERSION = 2
+
+# (st_mtime_ns, st_size) of a configuration file
+_Signature = Tuple[int, int]
+
+
+def _signature(filename: str) -> _Signature:
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CompiledLabel:
+    """
+    A sensitivity label of the registry, with its custom properties pre-rendered.
+
+    Attributes:
+        name (str): Name of the label in the configuration (ex: "InternalUseOnly").
+        definition (Dict[str, Any]): The raw definition of the label, as read from the configuration file.
+        label_id (str): The LabelId of the label.
+        label_name (str): The LabelName of the label.
+    """
+
+    def __init__(self, name: str, definition: Dict[str, Any]):
+        self.name = name
+        self.definition = definition
+        self.label_id: str = definition["LabelId"]
+        self.label_name: str = definition["LabelName"]
+        self._label = None
+        self._payload: Optional[Dict[str, CustomProperty]] = None
+
+    @property
+    def label(self):
+        """The validated MSIP_Label. Shared, use msip_label() for a copy that can be modified."""
+        if self._label is None:
+            from openpyxl_toolbox.sensitivity_manager import MSIP_Label
+
+            with timed("validate"):
+                self._label = MSIP_Label.model_validate(self.definition)
+        return self._label
+
+    def msip_label(self):
+        """Returns a copy of the MSIP_Label (label_to_properties and setlabel modify the label they apply)."""
+        return self.label.model_copy()
+
+    @property
+    def payload(self) -> Dict[str, CustomProperty]:
+        """The pre-rendered MSIP_Label_* custom properties of the label (SetDate excluded)."""
+        if self._payload is None:
+            from openpyxl_toolbox.label_record import label_to_properties
+
+            self._payload = {
+                name: string_property(name, value)
+                for name, value in label_to_properties(self.msip_label()).items()
+                if name != self._property_name("SetDate")
+            }
+        return self._payload
+
+    def _property_name(self, attribute: str) -> str:
+        return f"MSIP_Label_{self.label_id}_{attribute}"
+
+    def properties(
+        self, justification: Optional[str] = None, set_date: Optional[datetime] = None
+    ) -> Dict[str, CustomProperty]:
+        """
+        Returns the custom properties to write to a document, only SetDate (and the justification) are rendered.
+
+        Args:
+            justification (Optional[str]): Justification for applying the label, if any.
+            set_date (Optional[datetime]): Date of the labeling. Defaults to now.
+
+        Returns:
+            Dict[str, CustomProperty]: The MSIP_Label_* custom properties, by name.
+        """
+        properties = dict(self.payload)
+        set_date_name = self._property_name("SetDate")
+        properties[set_date_name] = string_property(
+            set_date_name, str(set_date or datetime.now())
+        )
+        if justification:
+            justification_name = self._property_name("Justification")
+            properties[justification_name] = string_property(
+                justification_name, justification
+            )
+        return properties
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # labels are sent to worker processes: ship the validated label and the payload along
+        self.payload
+        return self.__dict__
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.name!r}, {self.label_name!r})"
+
+
+class LabelRegistry:
+    """
+    The compiled labels of a configuration file.
+
+    Attributes:
+        sensitivity_configuration_file (str): Path to the JSON configuration file.
+        signature (Tuple[int, int]): Modification time (ns) and size of the file when it was loaded.
+        definitions (Dict[str, Dict[str, Any]]): The raw definitions, by label name.
+        labels (Dict[str, CompiledLabel]): The compiled labels, by label name.
+    """
+
+    def __init__(
+        self,
+        sensitivity_configuration_file: str,
+        definitions: Dict[str, Dict[str, Any]],
+        signature: _Signature,
+    ):
+        self.sensitivity_configuration_file = sensitivity_configuration_file
+        self.signature = signature
+        self.definitions = definitions
+        self.labels: Dict[str, CompiledLabel] = {
+            name: CompiledLabel(name, definition)
+            for name, definition in definitions.items()
+        }
+
+    @classmethod
+    def load(
+        cls, sensitivity_configuration_file: str, use_cache: bool = False
+    ) -> "LabelRegistry":
+        """
+        Loads the labels of a configuration file.
+
+        Args:
+            sensitivity_configuration_file (str): Path to the JSON configuration file.
+            use_cache (bool): Reads (and writes) the JSON cache <configuration file>.cache. The cache is ignored
+                when it does not match the modification time and size of the configuration file.
+
+        Raises:
+            FileNotFoundError: If the configuration file does not exist.
+        """
+        signature = _signature(sensitivity_configuration_file)
+        cache_file = sensitivity_configuration_file + CACHE_SUFFIX
+        if use_cache:
+            registry = cls._load_cache(sensitivity_configuration_file, signature)
+            if registry is not None:
+                return registry
+        with open(sensitivity_configuration_file, "r") as fh_in:
+            registry = cls(sensitivity_configuration_file, json.load(fh_in), signature)
+        if use_cache:
+            registry.save_cache(cache_file)
+        return registry
+
+    @classmethod
+    def _load_cache(
+        cls, sensitivity_configuration_file: str, signature: _Signature
+    ) -> Optional["LabelRegistry"]:
+        try:
+            with open(
+                sensitivity_configuration_file + CACHE_SUFFIX, "r", encoding="utf-8"
+            ) as fh_in:
+                version, cached_signature, definitions, compiled = json.load(fh_in)
+            if version != _CACHE_VERSION or tuple(cached_signature) != signature:
+                return None
+            registry = cls(sensitivity_configuration_file, definitions, signature)
+            from openpyxl_toolbox.sensitivity_manager import MSIP_Label
+
+            for name, (fields, payload) in compiled.items():
+                compiled_label = registry.labels[name]
+                if fields.get("SetDate") is not None:
+                    fields["SetDate"] = datetime.fromisoformat(fields["SetDate"])
+                # already validated when the cache was written
+                compiled_label._label = MSIP_Label.model_construct(**fields)
+                compiled_label._payload = {
+                    prop_name: CustomProperty(*prop)
+                    for prop_name, prop in payload.items()
+                }
+        except (OSError, ValueError, TypeError, KeyError):
+            # unreadable, or not a cache of this version (older caches were pickled)
+            return None
+        return registry
+
+    def save_cache(self, cache_file: Optional[str] = None) -> None:
+        """Writes the JSON cache of the registry (all the labels are compiled)."""
+        compiled = {
+            name: (
+                compiled_label.label.model_dump(),
+                {name: tuple(prop) for name, prop in compiled_label.payload.items()},
+            )
+            for name, compiled_label in self.labels.items()
+        }
+        cache_file = cache_file or self.sensitivity_configuration_file + CACHE_SUFFIX
+        temporary = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as fh_out:
+            # SetDate is the only value of a label that is not JSON
+            json.dump(
+                (_CACHE_VERSION, self.signature, self.definitions, compiled),
+                fh_out,
+                default=datetime.isoformat,
+            )
+        os.replace(temporary, cache_file)
+
+    def __getitem__(self, label_name: str) -> CompiledLabel:
+        """Retrieves a compiled label by name. Raises KeyError for an unknown label."""
+        return self.labels[label_name]
+
+    def __contains__(self, label_name: str) -> bool:
+        return label_name in self.labels
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.labels)
+
+    def find_by_id(self, label_id: str) -> Optional[CompiledLabel]:
+        """Retrieves a compiled label by LabelId."""
+        for compiled_label in self.labels.values():
+            if compiled_label.label_id == label_id:
+                return compiled_label
+        return None
+
+
+_registries: Dict[str, LabelRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_label_registry(
+    sensitivity_configuration_file: str, use_cache: bool = False
+) -> LabelRegistry:
+    """
+    Returns the registry of a configuration file, memoized for the process.
+
+    The registry is reloaded when the modification time or the size of the file changed since it was loaded.
+    Checking costs a stat call.
+
+    Args:
+        sensitivity_configuration_file (str): Path to the JSON configuration file.
+        use_cache (bool): Uses the JSON cache file when the registry is (re)loaded, see LabelRegistry.load.
+
+    Raises:
+        FileNotFoundError: If the configuration file does not exist.
+    """
+    key = os.path.abspath(sensitivity_configuration_file)
+    registry = _registries.get(key)
+    if registry is not None and registry.signature == _signature(key):
+        return registry
+    with _registries_lock:
+        registry = LabelRegistry.load(key, use_cache)
+        _registries[key] = registry
+    return registry
+
+
+def clear_label_registries() -> None:
+    """Forgets all the memoized registries."""
+    with _registries_lock:
+        _registries.clear()
@@ -0,0 +1,364 @@
+"""
+Long running local labeling service.
+
+Labeling a single file from a short lived Python process pays the interpreter start, the imports (pydantic,
+openpyxl, ...) and the parsing of the labels configuration every time. This asyncio daemon keeps the
+labels configuration compiled (see label_toolbox.label_registry) and labels files at package level (ooxml_toolbox) for its clients.
+
+Requests are JSON objects, or JSON lists of objects for a batch::
+
+    {"op": "set", "path": "/reports/out.xlsx", "label": "InternalUseOnly", "justification": "..."}
+    {"op": "get", "path": "/reports/out.xlsx"}
+    {"op": "reload"}
+    {"op": "metrics"}
+
+They are accepted on a Unix socket (one JSON request per line, one JSON response per line) or on a localhost TCP
+port, which speaks the same JSON lines protocol and also answers HTTP POST requests (JSON body). Requests arriving
+in a burst, from one or many clients, are coalesced into batches handed to a pool of worker processes.
+
+With --metrics, the service records the metrics of its workers (see label_toolbox.label_metrics), returned by the
+"metrics" request and served in the Prometheus text format on GET /metrics.
+
+Command line usage::
+
+    python -m label_toolbox.label_service --port 8765
+    python -m label_toolbox.label_service --unix /run/label.sock
+    python -m label_toolbox.label_service --port 8765 --metrics
+
+see label_toolbox.label_client for a client with no dependency.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from json_toolbox import dumpb, loads
+from openpyxl_toolbox.label_record import DEFAULT_SENSITIVITY_LABELS_DEFINITION
+from ooxml_toolbox.sensitivity_manager import (
+    get_label_from_package,
+    set_label_to_package,
+)
+
+from .label_metrics import enable_metrics, enable_worker_metrics, get_metrics
+from .label_registry import CompiledLabel, LabelRegistry, get_label_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_BATCH_DELAY = 0.005
+
+# (operation, path, label, justification) as sent to the worker processes
+_BatchItem = Tuple[str, str, Optional[CompiledLabel], Optional[str]]
+
+
+def _run_item(operation: str, path: str, label, justification) -> Dict[str, Any]:
+    try:
+        if operation == "set":
+            if set_label_to_package(path, label, justification):
+                return {"path": path, "status": "labeled"}
+            return {"path": path, "status": "skipped"}
+        current_label = get_label_from_package(path)
+        return {
+            "path": path,
+            "status": "ok",
+            "label": current_label.model_dump(mode="json") if current_label else None,
+        }
+    except Exception as error:
+        return {
+            "path": path,
+            "status": "failed",
+            "error": f"{type(error).__name__}: {error}",
+        }
+
+
+def _run_batch(items: List[_BatchItem]) -> List[Dict[str, Any]]:
+    """Runs a batch of label requests, in a worker process."""
+    return [_run_item(*item) for item in items]
+
+
+def _run_batch_with_metrics(
+    items: List[_BatchItem], service_pid: int
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Runs a batch of label requests, in a worker process, and returns the metrics recorded by the worker."""
+    if os.getpid() == service_pid:
+        # the executor runs in the service process, the metrics are already recorded in place
+        return _run_batch(items), None
+    metrics = enable_worker_metrics()
+    results = _run_batch(items)
+    return results, metrics.collect()
+
+
+class LabelService:
+    """
+    Asyncio labeling service: keeps the labels configuration loaded and batches the requests of its clients.
+
+    Attributes:
+        sensitivity_configuration_file (str): Path to the JSON file containing sensitivity label definitions.
+        registry (LabelRegistry): The compiled labels configuration, reloaded when the file changes.
+        max_batch_size (int): Maximum number of requests in a batch.
+        batch_delay (float): Time (seconds) to wait for more requests once a request is queued.
+        executor (Executor): The pool running the batches. A process pool created by the service is replaced when
+            a worker process dies (the batch it was running fails).
+        max_workers (Optional[int]): Number of worker processes of the pool created by the service.
+    """
+
+    def __init__(
+        self,
+        sensitivity_configuration_file: str = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        batch_delay: float = DEFAULT_BATCH_DELAY,
+        executor: Optional[Executor] = None,
+        max_workers: Optional[int] = None,
+    ):
+        self.sensitivity_configuration_file = sensitivity_configuration_file
+        self.registry: LabelRegistry = get_label_registry(
+            sensitivity_configuration_file
+        )
+        self.max_batch_size = max_batch_size
+        self.batch_delay = batch_delay
+        self.max_workers = max_workers
+        self._own_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor(max_workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def reload(self) -> None:
+        """Reloads the labels configuration file, if it changed since it was loaded."""
+        self.registry = get_label_registry(self.sensitivity_configuration_file)
+
+    async def start(self) -> None:
+        """Starts the batching task. Called by the serve_* methods."""
+        if self._batcher is None:
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.create_task(self._batch_requests())
+
+    async def _batch_requests(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # several batches may run at the same time, on different workers
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[_BatchItem, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        metrics = get_metrics()
+        executor = self.executor
+        try:
+            if metrics is None:
+                results = await loop.run_in_executor(executor, _run_batch, items)
+            else:
+                results, snapshot = await loop.run_in_executor(
+                    executor, _run_batch_with_metrics, items, os.getpid()
+                )
+                if snapshot:
+                    metrics.merge(snapshot)
+        except Exception as error:
+            if isinstance(error, BrokenExecutor):
+                self._replace_executor(executor)
+            results = [
+                {
+                    "path": item[1],
+                    "status": "failed",
+                    "error": f"{type(error).__name__}: {error}",
+                }
+                for item, _ in batch
+            ]
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _replace_executor(self, broken: Executor) -> None:
+        # the batches running on the broken pool fail, the next ones run on a new pool
+        if not self._own_executor or self.executor is not broken:
+            return
+        logger.error("A worker process died, restarting the worker processes")
+        broken.shutdown(wait=False)
+        self.executor = ProcessPoolExecutor(self.max_workers)
+
+    async def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Handles one request and returns its response."""
+        operation = request.get("op", "set")
+        if operation == "reload":
+            self.reload()
+            return {"status": "ok", "labels": list(self.registry)}
+        if operation == "metrics":
+            metrics = get_metrics()
+            if metrics is None:
+                return {"status": "failed", "error": "metrics are not enabled"}
+            return {"status": "ok", "metrics": metrics.snapshot()}
+        path = request.get("path")
+        if operation not in ("set", "get") or not path:
+            return {
+                "path": path,
+                "status": "failed",
+                "error": "ValueError: bad request",
+            }
+        label = None
+        if operation == "set":
+            try:
+                self.reload()
+                label = self.registry[request["label"]]
+            except KeyError as error:
+                return {
+                    "path": path,
+                    "status": "failed",
+                    "error": f"KeyError: unknown label {error}",
+                }
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(
+            ((operation, path, label, request.get("justification")), future)
+        )
+        return await future
+
+    async def handle_payload(self, payload: Any) -> Any:
+        """Handles a request, or a list (batch) of requests."""
+        if isinstance(payload, list):
+            return list(await asyncio.gather(*(self.handle(item) for item in payload)))
+        if isinstance(payload, dict):
+            return await self.handle(payload)
+        return {"status": "failed", "error": "ValueError: bad request"}
+
+    async def _handle_line(self, line: bytes) -> bytes:
+        try:
+            response = await self.handle_payload(loads(line))
+        except json.JSONDecodeError as error:
+            response = {"status": "failed", "error": f"JSONDecodeError: {error}"}
+        return dumpb(response) + b"\n"
+
+    async def _handle_http(
+        self,
+        request_line: bytes,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        content_length: Optional[int] = 0
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                try:
+                    content_length = int(value.strip())
+                except ValueError:
+                    content_length = None
+                if content_length is not None and content_length < 0:
+                    content_length = None
+        body = await reader.readexactly(content_length) if content_length else b""
+        content_type = "application/json"
+        metrics = get_metrics()
+        if content_length is None:
+            status = "400 Bad Request"
+            response = dumpb(
+                {"status": "failed", "error": "ValueError: bad Content-Length"}
+            )
+        elif request_line.startswith(b"GET /metrics") and metrics is not None:
+            status, response = "200 OK", metrics.to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        elif not request_line.startswith(b"POST "):
+            status, response = "405 Method Not Allowed", b""
+        else:
+            status, response = "200 OK", await self._handle_line(body)
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(response)}\r\nConnection: close\r\n\r\n".encode(
+                "latin-1"
+            )
+            + response
+        )
+        await writer.drain()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            line = await reader.readline()
+            if line.split(b" ", 1)[0] in (b"POST", b"GET", b"PUT", b"HEAD"):
+                await self._handle_http(line, reader, writer)
+                return
+            while line:
+                if line.strip():
+                    writer.write(await self._handle_line(line))
+                    await writer.drain()
+                line = await reader.readline()
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            logger.warning(f"Connection error : {error}")
+        finally:
+            writer.close()
+
+    async def serve_tcp(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        """Serves the JSON lines and HTTP POST protocols on a TCP port, until cancelled."""
+        await self.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_unix(self, path: str) -> None:
+        """Serves the JSON lines protocol on a Unix socket, until cancelled."""
+        await self.start()
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self._handle_connection, path)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m label_toolbox.label_service",
+        description="Local sensitivity labeling service.",
+    )
+    parser.add_argument(
+        "--config",
+        default=DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        help="sensitivity labels definition (json)",
+    )
+    parser.add_argument("--unix", default=None, help="Unix socket path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--batch-delay", type=float, default=DEFAULT_BATCH_DELAY)
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="record metrics, served on GET /metrics (Prometheus text format)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        enable_metrics()
+
+    service = LabelService(
+        args.config,
+        max_batch_size=args.max_batch_size,
+        batch_delay=args.batch_delay,
+        max_workers=args.workers,
+    )
+    if args.unix:
+        asyncio.run(service.serve_unix(args.unix))
+    else:
+        asyncio.run(service.serve_tcp(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Columnar collection of the sensitivity labels of many files, for inventories and reports.
+
+Holding millions of labels as MSIP_Label (pydantic) objects, or even as LabelRecord tuples, costs an object per
+file and per field. A LabelTable stores one column per field instead. The fields shared by most files (LabelId,
+LabelName, SiteId, ...) are dictionary encoded: each row only holds a small integer code into the distinct values.
+"""
+
+import logging
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from openpyxl_toolbox.label_record import LabelRecord
+from ooxml_toolbox.sensitivity_manager import get_label_record_from_package
+
+logger = logging.getLogger(__name__)
+
+# fields with few distinct values, dictionary encoded
+ENCODED_FIELDS = (
+    "LabelId",
+    "LabelName",
+    "AssignmentMethod",
+    "ContentBits",
+    "IsEnabled",
+    "SiteId",
+)
+
+
+class _EncodedColumn:
+    """Column of codes (array of int) into the list of its distinct values."""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.values: List[Optional[str]] = []
+        self._index: Dict[Optional[str], int] = {}
+
+    def append(self, value: Optional[str]) -> None:
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        return self.values[self.codes[row]]
+
+    def to_list(self) -> List[Optional[str]]:
+        values = self.values
+        return [values[code] for code in self.codes]
+
+    def counts(self) -> Counter:
+        return Counter(
+            {self.values[code]: count for code, count in Counter(self.codes).items()}
+        )
+
+
+class LabelTable:
+    """
+    Columnar, append only, collection of (path, label) rows.
+
+    Rows are read back as LabelRecord tuples (None for a file without label), validated as MSIP_Label only on
+    demand (LabelRecord.to_msip_label).
+
+    Attributes:
+        paths (List[str]): The path column.
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self._labeled = array("b")
+        self._columns = {
+            field: _EncodedColumn() if field in ENCODED_FIELDS else []
+            for field in LabelRecord._fields
+        }
+
+    def append(self, path: str, label_record: Optional[LabelRecord]) -> None:
+        """Adds the label of a file (None if the file has no label)."""
+        self.paths.append(path)
+        self._labeled.append(label_record is not None)
+        values = label_record or (None,) * len(LabelRecord._fields)
+        for column, value in zip(self._columns.values(), values):
+            column.append(value)
+
+    def extend(self, rows: Iterable[Tuple[str, Optional[LabelRecord]]]) -> None:
+        """Adds many (path, label) rows."""
+        for path, label_record in rows:
+            self.append(path, label_record)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def row(self, index: int) -> Tuple[str, Optional[LabelRecord]]:
+        """Returns the path and the label (None if the file has no label) of a row."""
+        if not self._labeled[index]:
+            return self.paths[index], None
+        return self.paths[index], LabelRecord(
+            *(column[index] for column in self._columns.values())
+        )
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[LabelRecord]]]:
+        for index in range(len(self.paths)):
+            yield self.row(index)
+
+    def column(self, field: str) -> List[Optional[str]]:
+        """Returns a column (a LabelRecord field) as a list."""
+        column = self._columns[field]
+        return column.to_list() if isinstance(column, _EncodedColumn) else column
+
+    def to_columns(self) -> Dict[str, List[Optional[str]]]:
+        """Returns all the columns, path included, by name (ex: to build a pandas DataFrame)."""
+        columns = {"path": self.paths}
+        columns.update((field, self.column(field)) for field in LabelRecord._fields)
+        return columns
+
+    def counts(self, field: str = "LabelName") -> Counter:
+        """Counts the rows by value of a field, without decoding the rows when the field is encoded."""
+        column = self._columns[field]
+        if isinstance(column, _EncodedColumn):
+            return column.counts()
+        return Counter(column)
+
+
+def read_label_table(paths: Iterable[str]) -> LabelTable:
+    """
+    Reads the labels of many Office Open XML documents at package level, without validating them.
+
+    A file that cannot be read (unsupported format, not a zip archive, ...) is logged and stored without label.
+
+    Args:
+        paths (Iterable[str]): Paths to the documents.
+
+    Returns:
+        LabelTable: The label of each document.
+    """
+    table = LabelTable()
+    for path in paths:
+        try:
+            label_record = get_label_record_from_package(path)
+        except Exception as error:
+            logger.warning(f"Error reading the label of {path} : {error}")
+            label_record = None
+        table.append(path, label_record)
+    return table
@@ -0,0 +1,588 @@
+"""
+Watch-folder daemon: labels the Office Open XML documents dropped into output folders, as they land.
+
+The folders are watched with inotify where it is available (Linux), else polled: only the directories whose
+modification time changed are listed again (os.scandir), so that an idle tree costs a stat call per directory and
+per poll. A document is labeled once it has settled: its size and modification time did not change for a few
+seconds, so that the files still being written by a report generator are left alone. The events of a file are
+deduplicated while it settles, and the files it labeled itself are not labeled again.
+
+The settled documents are labeled at package level, by chunks, by the worker processes of bulk_label (with a label,
+or with the label resolved by a policy, see label_policy). At most max_pending chunks are in flight: a burst of files
+waits in the queue of the watcher, not in the pool.
+
+Command line usage::
+
+    python -m label_toolbox.label_watcher <folder> [<folder> ...] --label InternalUseOnly
+    python -m label_toolbox.label_watcher <folder> --policy policy.json --initial-scan --log labeled.jsonl
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import heapq
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import (
+    TYPE_CHECKING,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from json_toolbox import JsonLinesWriter
+from openpyxl_toolbox.label_record import DEFAULT_SENSITIVITY_LABELS_DEFINITION
+from ooxml_toolbox.package_formats import PACKAGE_EXTENSIONS
+
+from .bulk_label import (
+    DEFAULT_CHUNK_SIZE,
+    BulkResult,
+    BulkStatus,
+    BulkSummary,
+    _chunk_results,
+    _excluded_results,
+    _initialize_worker,
+    _iter_policy_chunks,
+    _label_chunk,
+    _label_policy_chunk,
+    iter_package_files,
+)
+from .label_metrics import enable_metrics, get_metrics
+from .label_registry import CompiledLabel, get_label_registry
+
+if TYPE_CHECKING:
+    from openpyxl_toolbox.sensitivity_manager import MSIP_Label
+
+    from .label_policy import LabelPolicy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTLE = 2.0
+DEFAULT_POLL_INTERVAL = 1.0
+# files labeled by the watcher remembered to ignore the events of their own rewrite
+DEFAULT_MAX_REMEMBERED = 100000
+
+# (st_mtime_ns, st_size) of a file
+_Signature = Tuple[int, int]
+
+# inotify(7) events
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _signature(path: str) -> Optional[_Signature]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _FileFilter:
+    """Tells the documents to label: package formats, Office lock files (~$name.docx) and temporary files excluded."""
+
+    def __init__(self, extensions: Iterable[str]):
+        self.extensions = {extension.lower() for extension in extensions}
+
+    def __call__(self, name: str) -> bool:
+        extension = os.path.splitext(name)[1].lower()
+        return extension in self.extensions and not name.startswith("~")
+
+
+class PollingSource:
+    """
+    Change source polling the directory trees: only the directories whose modification time changed are listed.
+
+    A file rewritten in place does not change the modification time of its directory and is not seen, the files
+    written to a temporary name and renamed (or created) are.
+
+    Attributes:
+        roots (List[str]): The watched directories.
+    """
+
+    def __init__(
+        self, roots: Iterable[str], extensions: Iterable[str] = PACKAGE_EXTENSIONS
+    ):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self._accept = _FileFilter(extensions)
+        # directory -> (st_mtime_ns, {file name: signature})
+        self._directories: Dict[str, Tuple[int, Dict[str, _Signature]]] = {}
+        for root in self.roots:
+            list(self._scan_tree(root))
+
+    def _scan_directory(self, directory: str) -> Tuple[List[str], List[str]]:
+        """Lists a directory again, returns its changed (or new) files and its new subdirectories."""
+        _, known = self._directories.get(directory, (0, {}))
+        files: Dict[str, _Signature] = {}
+        changed, directories = [], []
+        mtime_ns = os.stat(directory).st_mtime_ns
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in self._directories:
+                        directories.append(entry.path)
+                elif self._accept(entry.name):
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                    if known.get(entry.name) != files[entry.name]:
+                        changed.append(entry.path)
+        self._directories[directory] = (mtime_ns, files)
+        return changed, directories
+
+    def _scan_tree(self, root: str) -> Iterator[str]:
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            try:
+                changed, new_directories = self._scan_directory(directory)
+            except OSError:
+                self._directories.pop(directory, None)
+                continue
+            directories.extend(new_directories)
+            yield from changed
+
+    def poll(self, timeout: float) -> List[str]:
+        """Waits timeout seconds, then returns the files created or changed in the changed directories."""
+        time.sleep(timeout)
+        changed = []
+        for directory, (mtime_ns, _) in list(self._directories.items()):
+            try:
+                if os.stat(directory).st_mtime_ns == mtime_ns:
+                    continue
+            except OSError:
+                # removed
+                del self._directories[directory]
+                continue
+            changed.extend(self._scan_tree(directory))
+        return changed
+
+    def close(self) -> None:
+        self._directories.clear()
+
+
+class InotifySource:
+    """
+    Change source using inotify (Linux), through ctypes: a watch per directory, added as directories are created.
+
+    When the kernel event queue overflows, the trees are listed again.
+
+    Attributes:
+        roots (List[str]): The watched directories.
+
+    Raises:
+        OSError: If inotify is not available, or the watch limit (fs.inotify.max_user_watches) is reached.
+    """
+
+    def __init__(
+        self, roots: Iterable[str], extensions: Iterable[str] = PACKAGE_EXTENSIONS
+    ):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self._accept = _FileFilter(extensions)
+        self._extensions = tuple(extensions)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: Dict[int, str] = {}
+        try:
+            for root in self.roots:
+                self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), directory)
+        self._watches[wd] = directory
+
+    def _watch_tree(self, root: str) -> List[str]:
+        """Watches a new directory tree, returns the files it already contains."""
+        files, directories = [], [root]
+        while directories:
+            directory = directories.pop()
+            try:
+                self._watch(directory)
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                        elif self._accept(entry.name):
+                            files.append(entry.path)
+            except FileNotFoundError:
+                continue
+        return files
+
+    def poll(self, timeout: float) -> List[str]:
+        """Waits up to timeout seconds for events, returns the files written, moved in or found in new directories."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        changed = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            position = 0
+            while position < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, position)
+                position += _EVENT_HEADER.size
+                name = os.fsdecode(data[position : position + length].rstrip(b"\0"))
+                position += length
+                if mask & _IN_Q_OVERFLOW:
+                    logger.warning("inotify queue overflow, listing the trees again")
+                    for root in self.roots:
+                        changed.extend(iter_package_files(root, self._extensions))
+                    continue
+                if mask & _IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO):
+                        changed.extend(self._watch_tree(path))
+                elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO) and self._accept(name):
+                    changed.append(path)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._watches.clear()
+
+
+class LabelWatcher:
+    """
+    Labels the documents landing in watched folders (see the module documentation).
+
+    Use run() as a generator of results, stop() ends it (from another thread)::
+
+        watcher = LabelWatcher(["/reports/out"], label=get_label_registry(configuration)["InternalUseOnly"])
+        for result in watcher.run():
+            print(result.status.value, result.path)
+
+    Attributes:
+        roots (List[str]): The watched directories.
+        label (Optional[Union[MSIP_Label, CompiledLabel]]): The label applied, ignored when a policy is given.
+        policy (Optional[LabelPolicy]): Labels each document with the label its path resolves to.
+        settle (float): Time (seconds) a file must stay unchanged before it is labeled.
+        poll_interval (float): Maximum time (seconds) between two checks of the pending files (and, when polling,
+            between two polls of the directories).
+        summary (BulkSummary): Counts, throughput and failures of the documents labeled.
+    """
+
+    def __init__(
+        self,
+        roots: Union[str, Iterable[str]],
+        label: Optional[Union["MSIP_Label", CompiledLabel]] = None,
+        justification: Optional[str] = None,
+        policy: Optional["LabelPolicy"] = None,
+        settle: float = DEFAULT_SETTLE,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        use_inotify: Optional[bool] = None,
+        initial_scan: bool = False,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        force: bool = False,
+        cache_database: Optional[str] = None,
+        append: bool = False,
+        extensions: Iterable[str] = PACKAGE_EXTENSIONS,
+    ):
+        self.roots = [roots] if isinstance(roots, str) else list(roots)
+        if label is None and policy is None:
+            raise ValueError("A label or a policy is required")
+        self.label = label
+        self.justification = justification
+        self.policy = policy
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.initial_scan = initial_scan
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+        self.chunk_size = chunk_size
+        self.force = force
+        self.cache_database = cache_database
+        self.append = append
+        self.extensions = tuple(extensions)
+        self.summary = BulkSummary()
+        self._stopped = threading.Event()
+        # settling files: path -> (deadline, signature), and the heap of their deadlines
+        self._settling: Dict[str, Tuple[float, Optional[_Signature]]] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+        # settled files waiting for a worker, and the files in flight
+        self._queue: Deque[str] = deque()
+        self._queued: Set[str] = set()
+        # signatures of the files labeled by the watcher
+        self._labeled: "OrderedDict[str, Optional[_Signature]]" = OrderedDict()
+
+    def _open_source(self) -> Union[InotifySource, PollingSource]:
+        if self.use_inotify is not False:
+            try:
+                return InotifySource(self.roots, self.extensions)
+            except (OSError, AttributeError, TypeError) as error:
+                if self.use_inotify:
+                    raise
+                logger.info(f"inotify is not available ({error}), polling")
+        return PollingSource(self.roots, self.extensions)
+
+    def stop(self) -> None:
+        """Stops run() after its current iteration."""
+        self._stopped.set()
+
+    def notify(self, path: str, now: Optional[float] = None) -> None:
+        """Reports a created or written file: it is labeled once it has settled. Repeated notifications are merged."""
+        now = time.monotonic() if now is None else now
+        if path in self._queued:
+            return
+        deadline = now + self.settle
+        self._settling[path] = (deadline, _signature(path))
+        heapq.heappush(self._deadlines, (deadline, path))
+
+    def _settled(self, now: float) -> Iterator[str]:
+        """Yields the files whose signature did not change since their deadline was set."""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, path = heapq.heappop(self._deadlines)
+            entry = self._settling.get(path)
+            if entry is None or entry[0] != deadline:
+                # notified again since, a later deadline is in the heap
+                continue
+            signature = _signature(path)
+            if signature is None:
+                # removed (or renamed) before it settled
+                del self._settling[path]
+                continue
+            if signature != entry[1]:
+                self._settling[path] = (now + self.settle, signature)
+                heapq.heappush(self._deadlines, (now + self.settle, path))
+                continue
+            del self._settling[path]
+            if self._labeled.get(path) == signature:
+                # event of the rewrite of a file labeled by the watcher
+                continue
+            yield path
+
+    def _remember(self, result: BulkResult) -> None:
+        self._queued.discard(result.path)
+        self._labeled[result.path] = _signature(result.path)
+        self._labeled.move_to_end(result.path)
+        if len(self._labeled) > DEFAULT_MAX_REMEMBERED:
+            self._labeled.popitem(last=False)
+
+    def run(self, duration: Optional[float] = None) -> Iterator[BulkResult]:
+        """
+        Watches the folders and labels the documents landing in them, until stop() is called.
+
+        Args:
+            duration (Optional[float]): Stops after this time (seconds). Defaults to None (until stopped).
+
+        Yields:
+            BulkResult: The result of each document labeled, as they complete.
+        """
+        self._stopped.clear()
+        source = self._open_source()
+        started = time.monotonic()
+        metrics = get_metrics()
+        share = ",".join(source.roots)
+        if self.policy is None:
+            labels, label_chunk = None, _label_chunk
+        else:
+            labels, label_chunk = self.policy.compiled_labels(), _label_policy_chunk
+        if self.initial_scan:
+            for root in self.roots:
+                for path in iter_package_files(root, self.extensions):
+                    self.notify(path, started - self.settle)
+        excluded: List[BulkResult] = []
+        futures: Set[Future] = set()
+        try:
+            with ProcessPoolExecutor(
+                self.max_workers,
+                initializer=_initialize_worker,
+                initargs=(
+                    self.label if self.policy is None else None,
+                    self.justification,
+                    self.force,
+                    self.cache_database,
+                    metrics is not None,
+                    self.append,
+                    labels,
+                ),
+            ) as executor:
+                while not self._stopped.is_set():
+                    now = time.monotonic()
+                    if duration is not None and now - started >= duration:
+                        break
+                    timeout = self.poll_interval
+                    if self._deadlines:
+                        timeout = min(timeout, max(0.0, self._deadlines[0][0] - now))
+                    if futures:
+                        # results are collected at least every 100ms
+                        timeout = min(timeout, 0.1)
+                    for path in source.poll(timeout):
+                        self.notify(path)
+                    for path in self._settled(time.monotonic()):
+                        self._queue.append(path)
+                        self._queued.add(path)
+                    while self._queue and len(futures) < self.max_pending:
+                        chunk = [
+                            self._queue.popleft()
+                            for _ in range(min(self.chunk_size, len(self._queue)))
+                        ]
+                        if self.policy is None:
+                            futures.add(executor.submit(label_chunk, chunk))
+                            continue
+                        for items in _iter_policy_chunks(
+                            chunk, self.policy, self.chunk_size, excluded
+                        ):
+                            if items:
+                                futures.add(executor.submit(label_chunk, items))
+                        for result in _excluded_results(excluded, metrics, share):
+                            self._queued.discard(result.path)
+                            yield self.summary.add(result)
+                    done = {future for future in futures if future.done()}
+                    futures -= done
+                    for future in done:
+                        for result in _chunk_results(future, metrics, share):
+                            self._remember(result)
+                            yield self.summary.add(result)
+                # documents in flight when stopped
+                for future in futures:
+                    for result in _chunk_results(future, metrics, share):
+                        self._remember(result)
+                        yield self.summary.add(result)
+        finally:
+            source.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point, runs until interrupted (Ctrl+C)."""
+    parser = argparse.ArgumentParser(
+        prog="python -m label_toolbox.label_watcher",
+        description="Labels the Office documents landing in folders, as they land.",
+    )
+    parser.add_argument("roots", nargs="+", help="directories to watch")
+    parser.add_argument(
+        "--label", default=None, help="label name, as defined in the configuration"
+    )
+    parser.add_argument(
+        "--policy",
+        default=None,
+        help="label each file with the label of a location based policy (json)",
+    )
+    parser.add_argument(
+        "--config",
+        default=DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        help="sensitivity labels definition (json)",
+    )
+    parser.add_argument("--justification", default=None)
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE,
+        help="seconds a file must stay unchanged before it is labeled",
+    )
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="poll the directories, even if inotify is available",
+    )
+    parser.add_argument(
+        "--initial-scan",
+        action="store_true",
+        help="label the documents already in the folders too",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="append the label to the files instead of rewriting them (very large files)",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="only print failures and the summary"
+    )
+    parser.add_argument(
+        "--log",
+        default=None,
+        help="append the result of every file to this JSON Lines file",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="write the metrics to this file when stopped (.prom for Prometheus, else JSON)",
+    )
+    args = parser.parse_args(argv)
+
+    if (args.label is None) == (args.policy is None):
+        parser.error("either a label name (--label) or a policy (--policy) is required")
+    logging.basicConfig(level=logging.INFO)
+    metrics = enable_metrics() if args.metrics else None
+    policy = None
+    if args.policy:
+        from .label_policy import LabelPolicy
+
+        policy = LabelPolicy.load(args.policy, args.config)
+    watcher = LabelWatcher(
+        args.roots,
+        label=get_label_registry(args.config)[args.label] if policy is None else None,
+        justification=args.justification,
+        policy=policy,
+        settle=args.settle,
+        poll_interval=args.poll_interval,
+        use_inotify=False if args.polling else None,
+        initial_scan=args.initial_scan,
+        max_workers=args.workers,
+        max_pending=args.max_pending,
+        chunk_size=args.chunk_size,
+        append=args.append,
+    )
+    with JsonLinesWriter(args.log) if args.log else nullcontext() as log:
+        try:
+            for result in watcher.run():
+                if log is not None:
+                    log.write(result)
+                    log.flush()
+                if not args.quiet or result.status == BulkStatus.Failed:
+                    print(
+                        f"{result.status.value}\t{result.path}\t{result.error or ''}",
+                        flush=True,
+                    )
+        except KeyboardInterrupt:
+            pass
+    print(watcher.summary.report())
+    if metrics is not None:
+        metrics.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+pywin32, imported on first use.
+
+pythoncom and win32com.client take a while to import, and are not available out of Windows: the office_toolbox
+modules import them through the proxies below, so that importing office_toolbox is quick, and also works on Linux
+(a COM call then raises ModuleNotFoundError).
+
+com_error is resolved at import instead: an except clause is evaluated while another exception is being handled, and
+importing pywin32 there would replace that exception with a ModuleNotFoundError out of Windows.
+"""
+
+import importlib
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from win32com.client import CDispatch
+else:
+    CDispatch = Any
+
+
+class LazyModule:
+    """Stands for a module, imported on the first access to one of its attributes.
+
+    Args:
+        name (str): The absolute name of the module.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, attribute: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self) -> str:
+        state = "imported" if self._module is not None else "not imported"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+try:
+    # pythoncom.com_error is pywintypes.com_error, and pywintypes is imported without the COM runtime
+    from pywintypes import com_error
+except ImportError:
+
+    class _MissingComError(Exception):
+        """Stands for pythoncom.com_error where pywin32 is not installed: never raised by a COM call."""
+
+    com_error = _MissingComError
+
+pythoncom: Any = LazyModule("pythoncom")
+win32com_client: Any = LazyModule("win32com.client")
+
+
+def Dispatch(*args: Any, **kwargs: Any) -> CDispatch:
+    """Creates a COM object, see win32com.client.Dispatch."""
+    return win32com_client.Dispatch(*args, **kwargs)
@@ -2,8 +2,11 @@ from abc import ABC, abstractmethod
 import logging
 from typing import Optional
 
-import pythoncom
-from win32com.client import CDispatch
+from label_toolbox.label_metrics import timed
+
+from ._com import CDispatch, Dispatch, com_error, pythoncom
+from .application_pool import ApplicationPool
+from .sensitivity_manager import SensitivityLabelManager
 
 logger = logging.getLogger(__name__)
 
@@ -15,19 +18,37 @@ class AbstractDocumentManager(ABC):
 
     Attributes:
         filename (str): Path to the document file being managed.
+        pool (Optional[ApplicationPool]): The pool the application is leased from, if any.
     """
 
-    def __init__(self, filename: str):
+    # COM ProgID of the application, ex: "Excel.Application"
+    prog_id: str = ""
+
+    def __init__(self, filename: str, pool: Optional[ApplicationPool] = None):
         """
         Initializes the DocumentManager with a specific document file.
 
         Args:
             filename (str): Path to the document file.
+            pool (Optional[ApplicationPool]): Leases the application from this pool instead of starting a new one.
         """
         self.filename = filename
+        self.pool = pool
         self.app = None
         self._document = None
         self._new_document = None
+        self._sensitivity_label_manager: Optional[SensitivityLabelManager] = None
+
+    def start_application(self) -> CDispatch:
+        """
+        Starts the application, or leases it from the pool.
+
+        Returns:
+            The application COM object.
+        """
+        if self.pool:
+            return self.pool.acquire(self.prog_id)
+        return Dispatch(self.prog_id, pythoncom.CoInitialize())
 
     @abstractmethod
     def open_document(self, visible: bool = True) -> Optional[CDispatch]:
@@ -67,13 +88,14 @@ class AbstractDocumentManager(ABC):
         """
         try:
             if self._document:
-                if self._new_document:
-                    self.save_as_document(
-                        self.filename
-                    )  # or self._document.SaveAs2(self.filename)
-                else:
-                    self._document.Save()
-        except pythoncom.com_error as error:
+                with timed("save"):
+                    if self._new_document:
+                        self.save_as_document(
+                            self.filename
+                        )  # or self._document.SaveAs2(self.filename)
+                    else:
+                        self._document.Save()
+        except com_error as error:
             logger.error(f"Error saving document: {error}")
 
     def close_document(self, save: bool = True) -> None:
@@ -87,18 +109,24 @@ class AbstractDocumentManager(ABC):
             if self._document:
                 if save:
                     self.save_document()
-                self._document.Close()
+                with timed("com_close"):
+                    self._document.Close()
                 self._document = None
-        except pythoncom.com_error as error:
+                self._sensitivity_label_manager = None
+        except com_error as error:
             logger.error(f"Error closing document: {error}")
 
     def quit(self) -> None:
         """
-        Quits the application, closing the document if open.
+        Quits the application, closing the document if open. An application leased from a pool is given back to
+        the pool instead.
         """
         self.close_document(save=False)
         if self.app:
-            self.app.Quit()
+            if self.pool:
+                self.pool.release(self.app)
+            else:
+                self.app.Quit()
             self.app = None
 
     @property
@@ -112,3 +140,17 @@ class AbstractDocumentManager(ABC):
         if not self._document:
             self.open_document()
         return self._document
+
+    @property
+    def sensitivity_label_manager(self) -> SensitivityLabelManager:
+        """
+        Returns the sensitivity label manager of the document (opened if needed), kept until the document is
+        closed so that its SensitivityLabel object is fetched once.
+        """
+        document = self.document
+        manager = self._sensitivity_label_manager
+        if manager is None or manager.document is not document:
+            manager = self._sensitivity_label_manager = SensitivityLabelManager(
+                document
+            )
+        return manager
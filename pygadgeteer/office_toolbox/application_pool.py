@@ -0,0 +1,257 @@
+"""
+Pool of reusable Office application instances (Excel.Application, Word.Application, ...) for the COM document
+managers.
+
+Starting and quitting Office costs seconds per document. With a pool, a document manager leases an application
+instance, closes its document when done and gives the instance back instead of quitting it.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from ._com import CDispatch, Dispatch, com_error, pythoncom
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 2
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_MAX_LEASE_TIME = 600.0
+
+
+def dispatch_application(prog_id: str) -> CDispatch:
+    """Starts an Office application through COM, ex: dispatch_application("Excel.Application")."""
+    return Dispatch(prog_id, pythoncom.CoInitialize())
+
+
+class _Reservation:
+    """Holds the slot of an application instance while it starts."""
+
+
+class ApplicationPool:
+    """
+    Pool of Office application COM objects, keyed by application type (ProgID).
+
+    An instance is leased with acquire() (or the lease() context manager) and given back with release(). Idle
+    instances are quit after idle_timeout seconds: they are checked at every acquire() and release(), a pool that is
+    not used anymore keeps its instances until evict_idle() or close() is called. An idle instance that does not
+    answer anymore (crashed Office) is replaced when it is leased. A lease older than max_lease_time is considered
+    hung: when the pool is full, the instance is dropped (and quit if possible) to free its slot.
+
+    The COM calls on the instances (health checks, Quit) are made without holding the pool lock, so that a hung
+    instance cannot block the other threads.
+
+    Attributes:
+        dispatch (Callable[[str], CDispatch]): Creates an application from its ProgID. A fake can be given for tests.
+        max_size (int): Maximum number of instances (leased and idle) per application type.
+        idle_timeout (float): Idle time, in seconds, after which an instance is quit.
+        max_lease_time (Optional[float]): Lease time, in seconds, after which an instance is considered hung.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[str], CDispatch] = dispatch_application,
+        max_size: int = DEFAULT_MAX_SIZE,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        max_lease_time: Optional[float] = DEFAULT_MAX_LEASE_TIME,
+    ):
+        self.dispatch = dispatch
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lease_time = max_lease_time
+        self._idle: Dict[str, List[Tuple[CDispatch, float]]] = {}
+        self._leased: Dict[int, Tuple[str, CDispatch, float]] = {}
+        # leases dropped as hung, their instances are already quit when they are released
+        self._dropped: Set[int] = set()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    @staticmethod
+    def is_healthy(app: CDispatch) -> bool:
+        """Tells if an application instance still answers COM calls."""
+        try:
+            app.Visible
+            return True
+        except Exception as error:
+            logger.warning(f"Office application is not responding : {error}")
+            return False
+
+    @staticmethod
+    def _quit(app: CDispatch) -> None:
+        try:
+            app.Quit()
+        except Exception as error:
+            logger.warning(f"Error quitting Office application : {error}")
+
+    def _size(self, prog_id: str) -> int:
+        leased = sum(1 for key, _, _ in self._leased.values() if key == prog_id)
+        return leased + len(self._idle.get(prog_id, []))
+
+    def _drop_hung_lease(self, prog_id: str) -> Optional[CDispatch]:
+        # called with the lock held, the caller quits the returned instance after releasing it
+        if self.max_lease_time is None:
+            return None
+        now = time.monotonic()
+        for lease_id, (key, app, leased_at) in list(self._leased.items()):
+            if key == prog_id and now - leased_at > self.max_lease_time:
+                logger.warning(
+                    f"{prog_id} leased for {now - leased_at:.0f}s, considered hung"
+                )
+                del self._leased[lease_id]
+                if isinstance(app, _Reservation):
+                    # the instance is still starting, there is nothing to quit
+                    return None
+                self._dropped.add(lease_id)
+                return app
+        return None
+
+    def _reserve(
+        self, prog_id: str, deadline: Optional[float]
+    ) -> Tuple[CDispatch, bool, Optional[CDispatch]]:
+        # leases an idle instance, or reserves a slot for a new one
+        # returns the instance or reservation, True if it is an idle instance, and the hung instance to quit
+        with self._condition:
+            while True:
+                idle = self._idle.get(prog_id)
+                if idle:
+                    app, _ = idle.pop()
+                    self._leased[id(app)] = (prog_id, app, time.monotonic())
+                    return app, True, None
+                hung = None
+                if self._size(prog_id) >= self.max_size:
+                    hung = self._drop_hung_lease(prog_id)
+                if self._size(prog_id) < self.max_size:
+                    reservation = _Reservation()
+                    self._leased[id(reservation)] = (
+                        prog_id,
+                        reservation,
+                        time.monotonic(),
+                    )
+                    return reservation, False, hung
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No {prog_id} instance available")
+                if self.max_lease_time is not None:
+                    # wake up to check for hung leases
+                    remaining = min(
+                        remaining or self.max_lease_time, self.max_lease_time
+                    )
+                self._condition.wait(remaining)
+
+    def _cancel(self, app: object) -> bool:
+        # gives up a lease, returns False if it was dropped as hung meanwhile (and its instance quit)
+        with self._condition:
+            lease = self._leased.pop(id(app), None)
+            self._dropped.discard(id(app))
+            self._condition.notify_all()
+        return lease is not None
+
+    def evict_idle(self) -> int:
+        """Quits the instances idle for more than idle_timeout seconds. Returns the number of evicted instances."""
+        now = time.monotonic()
+        evicted = []
+        with self._condition:
+            for prog_id, idle in self._idle.items():
+                keep = [
+                    (app, since)
+                    for app, since in idle
+                    if now - since <= self.idle_timeout
+                ]
+                evicted.extend(
+                    app for app, since in idle if now - since > self.idle_timeout
+                )
+                self._idle[prog_id] = keep
+            if evicted:
+                self._condition.notify_all()
+        for app in evicted:
+            self._quit(app)
+        return len(evicted)
+
+    def acquire(self, prog_id: str, timeout: Optional[float] = None) -> CDispatch:
+        """
+        Leases an application instance, reusing an idle one when available.
+
+        Args:
+            prog_id (str): The application type, ex: "Excel.Application".
+            timeout (Optional[float]): Maximum time to wait for a free slot when the pool is full. None waits forever.
+
+        Returns:
+            CDispatch: The application COM object.
+
+        Raises:
+            TimeoutError: If no instance became available within timeout.
+        """
+        if self._closed:
+            raise RuntimeError("The application pool is closed")
+        self.evict_idle()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            app, reused, hung = self._reserve(prog_id, deadline)
+            if hung is not None:
+                self._quit(hung)
+            if not reused:
+                break
+            if self.is_healthy(app):
+                return app
+            if self._cancel(app):
+                self._quit(app)
+        reservation = app
+        try:
+            app = self.dispatch(prog_id)
+        except BaseException:
+            self._cancel(reservation)
+            raise
+        with self._condition:
+            # may have been dropped as hung while the application started
+            self._leased.pop(id(reservation), None)
+            self._leased[id(app)] = (prog_id, app, time.monotonic())
+        return app
+
+    def release(self, app: CDispatch, healthy: bool = True) -> None:
+        """
+        Gives a leased instance back to the pool. Its documents should be closed.
+
+        Args:
+            app (CDispatch): The application COM object, as returned by acquire().
+            healthy (bool): False to quit the instance instead of keeping it.
+        """
+        with self._condition:
+            lease = self._leased.pop(id(app), None)
+            dropped = lease is None and id(app) in self._dropped
+            self._dropped.discard(id(app))
+            healthy = healthy and not self._closed
+            if lease is not None and healthy:
+                self._idle.setdefault(lease[0], []).append((app, time.monotonic()))
+            self._condition.notify_all()
+        if not dropped and (lease is None or not healthy):
+            # unknown or broken instance, the instances dropped as hung are already quit
+            self._quit(app)
+        # the other instances released during a burst, idle since
+        self.evict_idle()
+
+    @contextmanager
+    def lease(
+        self, prog_id: str, timeout: Optional[float] = None
+    ) -> Iterator[CDispatch]:
+        """Context manager leasing an application instance, released at exit."""
+        app = self.acquire(prog_id, timeout)
+        healthy = True
+        try:
+            yield app
+        except com_error:
+            healthy = False
+            raise
+        finally:
+            self.release(app, healthy and self.is_healthy(app))
+
+    def close(self) -> None:
+        """Quits all the idle instances. Leased instances are quit when they are released."""
+        with self._condition:
+            idle = [app for instances in self._idle.values() for app, _ in instances]
+            self._idle.clear()
+            self._closed = True
+            self._condition.notify_all()
+        for app in idle:
+            self._quit(app)
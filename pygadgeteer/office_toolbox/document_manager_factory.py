@@ -1,18 +1,48 @@
+from functools import lru_cache
+import importlib
 import os
-from typing import Type
+from typing import TYPE_CHECKING, Dict, Optional, Type, Union
 
-from .abstract_document_manager import AbstractDocumentManager
-from .excel_document_manager import ExcelDocumentManager
-from .word_document_manager import WordDocumentManager
+if TYPE_CHECKING:
+    from .abstract_document_manager import AbstractDocumentManager
+    from .application_pool import ApplicationPool
 
-# Type annotation for the document manager class dictionary
-DOCUMENT_FACTORY: dict[str, Type[AbstractDocumentManager]] = {
-    ".docx": WordDocumentManager,
-    ".xlsx": ExcelDocumentManager,
+# document manager class of each file extension. A class can also be given as "<module>.<class>" in office_toolbox:
+# the module is then imported the first time a document with this extension is opened
+DOCUMENT_FACTORY: Dict[str, Union[str, Type["AbstractDocumentManager"]]] = {
+    ".docx": "word_document_manager.WordDocumentManager",
+    ".xlsx": "excel_document_manager.ExcelDocumentManager",
 }
 
 
-def document_manager_factory(fullpath: str) -> AbstractDocumentManager:
+@lru_cache(maxsize=None)
+def _import_document_manager(qualified_name: str) -> Type["AbstractDocumentManager"]:
+    module_name, class_name = qualified_name.rsplit(".", 1)
+    module = importlib.import_module(f".{module_name}", __package__)
+    return getattr(module, class_name)
+
+
+def get_document_manager_class(
+    extension: str,
+) -> Optional[Type["AbstractDocumentManager"]]:
+    """
+    Returns the document manager class of a file extension, importing its module on first use.
+
+    Args:
+        extension (str): The file extension, with its leading dot (".docx"), in any case.
+
+    Returns:
+        Optional[Type[AbstractDocumentManager]]: The document manager class, None if the extension is not supported.
+    """
+    document_manager_class = DOCUMENT_FACTORY.get(extension.lower())
+    if document_manager_class is None or isinstance(document_manager_class, type):
+        return document_manager_class
+    return _import_document_manager(document_manager_class)
+
+
+def document_manager_factory(
+    fullpath: str, pool: Optional["ApplicationPool"] = None
+) -> "AbstractDocumentManager":
     """
     Factory function to create an appropriate document manager instance based on the file extension.
 
@@ -21,6 +51,8 @@ def document_manager_factory(fullpath: str) -> AbstractDocumentManager:
 
     Args:
         fullpath (str): The full path to the document file, including its name and extension.
+        pool (Optional[ApplicationPool]): Leases the Office application from this pool instead of starting one.
+            The application goes back to the pool when the document manager quits.
 
     Returns:
         AbstractDocumentManager: An instance of a subclass of AbstractDocumentManager appropriate
@@ -30,10 +62,10 @@ def document_manager_factory(fullpath: str) -> AbstractDocumentManager:
         NotImplementedError: If a document manager for the specified file extension is not implemented.
     """
     _, extension = os.path.splitext(fullpath)
-    document_manager_class = DOCUMENT_FACTORY.get(extension)
+    document_manager_class = get_document_manager_class(extension)
 
     if document_manager_class:
-        return document_manager_class(fullpath)
+        return document_manager_class(fullpath, pool)
     else:
         raise NotImplementedError(
             f"Office Document Manager for {extension} is not implemented."
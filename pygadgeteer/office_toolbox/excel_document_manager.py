@@ -2,10 +2,11 @@ import logging
 import os
 from typing import Optional
 
-import pythoncom
-from win32com.client import Dispatch, CDispatch
+from label_toolbox.label_metrics import timed
 
+from ._com import CDispatch, com_error
 from .abstract_document_manager import AbstractDocumentManager
+from .application_pool import ApplicationPool
 
 logger = logging.getLogger(__name__)
 
@@ -20,15 +21,18 @@ class ExcelDocumentManager(AbstractDocumentManager):
         filename (str): Path to the Excel workbook file being managed.
     """
 
-    def __init__(self, filename: str):
+    prog_id = "Excel.Application"
+
+    def __init__(self, filename: str, pool: Optional[ApplicationPool] = None):
         """
         Initializes the ExcelDocumentManager with a specific workbook file.
 
         Args:
             filename (str): Path to the Excel workbook file.
+            pool (Optional[ApplicationPool]): Leases Excel from this pool instead of starting a new instance.
         """
-        super().__init__(filename)
-        self.app = Dispatch("Excel.Application", pythoncom.CoInitialize())
+        super().__init__(filename, pool)
+        self.app = self.start_application()
 
     def open_document(self, visible: bool = True) -> Optional[CDispatch]:
         """
@@ -51,9 +55,10 @@ class ExcelDocumentManager(AbstractDocumentManager):
                 )
 
             try:
-                self._document = self.app.Workbooks.Open(self.filename)
+                with timed("com_open"):
+                    self._document = self.app.Workbooks.Open(self.filename)
                 self._new_document = False
-            except pythoncom.com_error as error:
+            except com_error as error:
                 logger.error(f"Error opening Excel document: {error}")
                 self._document = None  # Ensure _document is None if open fails
         return self._document
@@ -111,7 +116,7 @@ class ExcelDocumentManager(AbstractDocumentManager):
             try:
                 self._document = self.app.Workbooks.Add()
                 self._new_document = True
-            except pythoncom.com_error as error:
+            except com_error as error:
                 logger.error(f"Error creating new document: {error}")
                 self._document = None  # Ensure _document is None if open fails
 
@@ -0,0 +1,155 @@
+"""
+Batch labeling of Office documents through COM.
+
+set_sensitivity_label_to_file re-reads the labels configuration and starts then quits Excel or Word for every
+file. A LabelingSession reads the configuration once and keeps one Excel and one Word application alive (through an
+ApplicationPool) for all the files of the batch.
+"""
+
+import logging
+import os
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional
+
+from label_toolbox.label_cache import LabelCache, has_label, remember_label
+from label_toolbox.label_registry import get_label_registry
+
+from ._com import com_error
+from .application_pool import ApplicationPool
+from .document_manager_factory import document_manager_factory
+from .set_sensitivity_label import (
+    DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+    apply_sensitivity_label,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LabelOutcome(NamedTuple):
+    """Outcome of the labeling of one file.
+
+    Attributes:
+        path (str): Absolute path to the file.
+        sensitivity_label (str): The label applied to the file.
+        success (bool): True if the label was set and the document saved.
+        error (Optional[str]): Error type and message, when the labeling failed.
+        skipped (bool): True if the document already carried the label and was not opened.
+    """
+
+    path: str
+    sensitivity_label: str
+    success: bool
+    error: Optional[str] = None
+    skipped: bool = False
+
+
+class LabelingSession:
+    """
+    Labels many Office documents with a single Excel and a single Word application.
+
+    Use it as a context manager, the applications are quit at exit::
+
+        with LabelingSession() as session:
+            for outcome in session.label_files(paths, "InternalUseOnly"):
+                print(outcome)
+
+    Attributes:
+        sensitivity_labels (Dict[str, Any]): The labels configuration, read once.
+        pool (ApplicationPool): The pool keeping the applications alive between documents.
+        cache (Optional[LabelCache]): Content hash cache of the document labels, see label_toolbox.label_cache.
+    """
+
+    def __init__(
+        self,
+        sensitivity_configuration_file: str = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+        pool: Optional[ApplicationPool] = None,
+        cache: Optional[LabelCache] = None,
+    ):
+        """
+        Initializes the session, reading the labels configuration.
+
+        Args:
+            sensitivity_configuration_file (str): Path to the JSON file containing sensitivity labels configuration.
+            pool (Optional[ApplicationPool]): The application pool to use. Defaults to a pool of one instance per
+                application, owned (and closed) by the session.
+            cache (Optional[LabelCache]): Content hash cache used to skip the documents that already carry their
+                label. Office Open XML documents are checked at zip level even without cache.
+        """
+        self.sensitivity_labels: Dict[str, Any] = get_label_registry(
+            sensitivity_configuration_file
+        ).definitions
+        self._own_pool = pool is None
+        self.pool = pool or ApplicationPool(max_size=1)
+        self.cache = cache
+
+    def __enter__(self) -> "LabelingSession":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Quits the applications of the session (if the session owns its pool)."""
+        if self._own_pool:
+            self.pool.close()
+
+    def label_file(
+        self, path: str, sensitivity_label: str, force: bool = False
+    ) -> LabelOutcome:
+        """
+        Sets a sensitivity label to a document, then saves and closes it. The application stays alive.
+
+        A document that already carries the label is skipped without being opened. A COM error, an unsupported file
+        type or an unknown label is reported in the outcome instead of being raised.
+
+        Args:
+            path (str): Path to the document.
+            sensitivity_label (str): The key representing the sensitivity label to apply.
+            force (bool): Labels the document even if it already carries the label.
+
+        Returns:
+            LabelOutcome: The outcome of the labeling.
+        """
+        fullpath = os.path.abspath(path)
+        document_manager = None
+        try:
+            label_id = self.sensitivity_labels[sensitivity_label]["LabelId"]
+            if not force and has_label(fullpath, label_id, self.cache):
+                return LabelOutcome(fullpath, sensitivity_label, True, skipped=True)
+            document_manager = document_manager_factory(fullpath, self.pool)
+            if not apply_sensitivity_label(
+                document_manager, sensitivity_label, self.sensitivity_labels
+            ):
+                return LabelOutcome(
+                    fullpath, sensitivity_label, False, "Document could not be opened"
+                )
+            document_manager.close_document(save=True)
+            remember_label(fullpath, label_id, self.cache)
+            return LabelOutcome(fullpath, sensitivity_label, True)
+        except (com_error, NotImplementedError, KeyError, OSError) as error:
+            logger.error(f"Error labeling {fullpath}: {error}")
+            return LabelOutcome(
+                fullpath, sensitivity_label, False, f"{type(error).__name__}: {error}"
+            )
+        finally:
+            if document_manager:
+                # closes the document (without saving if it failed) and gives the application back to the pool
+                document_manager.quit()
+
+    def label_files(
+        self, paths: Iterable[str], sensitivity_label: str, force: bool = False
+    ) -> Iterator[LabelOutcome]:
+        """
+        Sets a sensitivity label to many documents (Excel and Word documents can be mixed).
+
+        A failure on a document does not stop the batch.
+
+        Args:
+            paths (Iterable[str]): Paths to the documents.
+            sensitivity_label (str): The key representing the sensitivity label to apply.
+            force (bool): Labels the documents even if they already carry the label.
+
+        Yields:
+            LabelOutcome: The outcome of each document, in the order of the paths.
+        """
+        for path in paths:
+            yield self.label_file(path, sensitivity_label, force)
@@ -4,14 +4,36 @@ It provides functionality to set and retrieve sensitivity labels of Office Docum
 a sensitivity label definition from a set of Office Document documents.
 """
 
-from typing import Dict, Any
-from win32com.client import Dispatch, CDispatch
+from typing import Dict, Any, Iterable, Optional
+
+from ._com import CDispatch
+
+# properties of a LabelInfo object: https://learn.microsoft.com/en-us/office/vba/api/office.labelinfo
+# (Application, Creator and Parent are objects, not label information)
+LABEL_INFO_PROPERTIES = (
+    "ActionId",
+    "AssignmentMethod",
+    "ContentBits",
+    "IsEnabled",
+    "Justification",
+    "LabelId",
+    "LabelName",
+    "SetDate",
+    "SiteId",
+)
+# properties with a basic value (str, int, bool), SetDate is a COM date
+LABEL_INFO_BASIC_PROPERTIES = tuple(
+    attr for attr in LABEL_INFO_PROPERTIES if attr != "SetDate"
+)
 
 
 class SensitivityLabelManager:
     """
     Manages sensitivity labels for an Office Document document using the COM object model.
 
+    The SensitivityLabel object of the document is fetched once (each access to document.SensitivityLabel is a
+    cross-process COM call), use one manager per opened document (see AbstractDocumentManager.sensitivity_label_manager).
+
     Attributes:
         document (CDispatch): The Office Document document object this manager operates on.
     """
@@ -26,16 +48,19 @@ class SensitivityLabelManager:
             document (CDispatch): The Office Document document object.
         """
         self.document = document
+        self._sensitivitylabel: Optional[CDispatch] = None
 
     @property
     def sensitivitylabel(self) -> CDispatch:
         """
-        Retrieves the SensitivityLabel object from the document.
+        Retrieves the SensitivityLabel object from the document, fetched on first access.
 
         Returns:
             CDispatch: The SensitivityLabel COM object associated with the document.
         """
-        return self.document.SensitivityLabel
+        if self._sensitivitylabel is None:
+            self._sensitivitylabel = self.document.SensitivityLabel
+        return self._sensitivitylabel
 
     def createlabelinfo(self) -> CDispatch:
         """
@@ -81,18 +106,35 @@ class LabelInfoManager:
         """
         self.labelinfo = labelinfo
 
-    def dump_info(self) -> Dict[str, Any]:
+    def read(self, attributes: Iterable[str] = LABEL_INFO_PROPERTIES) -> Dict[str, Any]:
+        """
+        Reads properties of the LabelInfo object, one COM call per property.
+
+        Args:
+            attributes (Iterable[str]): The properties to read. Defaults to all the LabelInfo properties.
+
+        Returns:
+            Dict[str, Any]: The value of each property, None if the object does not have it.
         """
-        Extracts and returns all available information from the LabelInfo object.
+        return {attr: getattr(self.labelinfo, attr, None) for attr in attributes}
+
+    def dump_info(
+        self, attributes: Iterable[str] = LABEL_INFO_BASIC_PROPERTIES
+    ) -> Dict[str, Any]:
+        """
+        Extracts and returns the information of the LabelInfo object with a basic value (str, int, bool, float).
+
+        Only the known LabelInfo properties are read (see LABEL_INFO_PROPERTIES), not every name of
+        dir(labelinfo): each read is a cross-process COM call.
+
+        Args:
+            attributes (Iterable[str]): The properties to read. Defaults to LABEL_INFO_BASIC_PROPERTIES.
 
         Returns:
             Dict[str, Any]: A dictionary containing attributes and their values from the LabelInfo object.
         """
-        dump = {}
-        for attr in dir(self.labelinfo):
-            if attr.startswith("_"):  # Skip private or protected attributes
-                continue
-            value = getattr(self.labelinfo, attr)
-            if isinstance(value, (str, int, bool, float)):  # Check for basic data types
-                dump[attr] = value
-        return dump
+        return {
+            attr: value
+            for attr, value in self.read(attributes).items()
+            if isinstance(value, (str, int, bool, float))  # Check for basic data types
+        }
@@ -1,28 +1,46 @@
-import json
-from glob import glob
+from contextlib import contextmanager
 import os
-from typing import Dict, Any, Type
+from typing import Callable, Dict, Any, Iterator, Optional, Type
+
+from label_toolbox.label_cache import LabelCache, has_label, remember_label
+from label_toolbox.label_definition import DefinitionReport, build_label_definition
+from label_toolbox.label_metrics import timed
+from label_toolbox.label_registry import get_label_registry
 
 from .abstract_document_manager import AbstractDocumentManager
-from .sensitivity_manager import SensitivityLabelManager, LabelInfoManager
-from .document_manager_factory import document_manager_factory
+from .application_pool import ApplicationPool, dispatch_application
+from .sensitivity_manager import LabelInfoManager
+from .document_manager_factory import DOCUMENT_FACTORY, document_manager_factory
 
 DEFAULT_SENSITIVITY_LABELS_DEFINITION = (
     "sensitivity_model/sensitivity_labels_definition.json"
 )
 DEFAULT_SENSITIVITY_TEMPLATES = "sensitivity_model"
+# each template reader starts its own Excel and Word
+DEFAULT_TEMPLATE_READERS = 2
+# LabelInfo properties written to the sensitivity label definition file
+_DEFINITION_PROPERTIES = (
+    "LabelId",
+    "LabelName",
+    "IsEnabled",
+    "SetDate",
+    "AssignmentMethod",
+    "SiteId",
+    "ActionId",
+    "ContentBits",
+)
 
 
 def set_sensitivity_label_to_document(
     document_manager: AbstractDocumentManager,
     sensitivity_label: str,
     sensitivity_configuration_file: str = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
-) -> None:
+) -> bool:
     """
     Sets a sensitivity label to a document managed by the provided document manager instance,
     based on the predefined labels configuration.
 
-    This function reads the sensitivity labels configuration file, creates a new label info object,
+    This function reads the sensitivity labels configuration (memoized, see label_toolbox.label_registry), creates a new label info object,
     sets the label properties based on the specified sensitivity label, and assigns it to the document.
 
     Args:
@@ -30,66 +48,157 @@ def set_sensitivity_label_to_document(
         sensitivity_label (str): The key representing the sensitivity label to apply, as defined in the sensitivity labels configuration file.
         sensitivity_configuration_file (str): Path to the JSON file containing sensitivity labels configuration. Defaults to DEFAULT_SENSITIVITY_LABELS_DEFINITION.
 
+    Returns:
+        bool: True if the label was set, False if the document could not be opened.
+
     Raises:
         FileNotFoundError: If the specified sensitivity configuration file does not exist.
         KeyError: If the specified sensitivity label is not found in the configuration file.
     """
-    with open(sensitivity_configuration_file, "r") as fh_in:
-        sensitivity_labels = json.load(fh_in)
+    sensitivity_labels = get_label_registry(sensitivity_configuration_file).definitions
+    return apply_sensitivity_label(
+        document_manager, sensitivity_label, sensitivity_labels
+    )
+
+
+def apply_sensitivity_label(
+    document_manager: AbstractDocumentManager,
+    sensitivity_label: str,
+    sensitivity_labels: Dict[str, Any],
+    justification: Optional[str] = None,
+) -> bool:
+    """
+    Sets a sensitivity label to a document, from an already loaded labels configuration.
 
+    Args:
+        document_manager (AbstractDocumentManager): The document manager responsible for the document to label.
+        sensitivity_label (str): The key representing the sensitivity label to apply.
+        sensitivity_labels (Dict[str, Any]): The content of the sensitivity labels configuration file.
+        justification (Optional[str]): Justification for applying the label. Defaults to an automated assignment
+            justification naming the label.
+
+    Returns:
+        bool: True if the label was set, False if the document could not be opened.
+
+    Raises:
+        KeyError: If the specified sensitivity label is not found in the configuration.
+    """
     if not document_manager.document:
-        return
-    sensitivity_label_manager = SensitivityLabelManager(document_manager.document)
-    new_label_info = sensitivity_label_manager.createlabelinfo()
-    new_label_info.AssignmentMethod = 2  # Manual assignment
-    new_label_info.Justification = (
-        f"Automated assignment based on configuration.({sensitivity_label})"
-    )
-    new_label_info.LabelId = sensitivity_labels[sensitivity_label]["LabelId"]
-    new_label_info.LabelName = sensitivity_labels[sensitivity_label]["LabelName"]
-    sensitivity_label_manager.setlabel(new_label_info)
+        return False
+    with timed("com_label"):
+        sensitivity_label_manager = document_manager.sensitivity_label_manager
+        new_label_info = sensitivity_label_manager.createlabelinfo()
+        new_label_info.AssignmentMethod = 2  # Manual assignment
+        new_label_info.Justification = (
+            justification
+            or f"Automated assignment based on configuration.({sensitivity_label})"
+        )
+        new_label_info.LabelId = sensitivity_labels[sensitivity_label]["LabelId"]
+        new_label_info.LabelName = sensitivity_labels[sensitivity_label]["LabelName"]
+        sensitivity_label_manager.setlabel(new_label_info)
+    return True
 
 
 def set_sensitivity_label_to_file(
     absolute_path_to_filename: str,
     sensitivity_label: str,
     sensitivity_configuration_file: str = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
-) -> None:
+    pool: Optional[ApplicationPool] = None,
+    force: bool = False,
+    cache: Optional[LabelCache] = None,
+) -> bool:
     """
     Sets the sensitivity label for a document file located at the specified path, using the provided sensitivity label.
 
     This function creates a document manager for the specified file, applies the specified sensitivity label using the configuration file, and then saves and closes the document. It supports documents that can be managed by the implemented document managers (e.g., Word, Excel).
+    A document that already carries the label is not opened: Office Open XML documents are checked at zip level, the other formats through the content hash cache, if any.
 
     Args:
         absolute_path_to_filename (str): The full path to the document file. The file type should be supported by the available document managers.
         sensitivity_label (str): The sensitivity label to apply to the document. This should match a key in the sensitivity labels configuration file.
         sensitivity_configuration_file (str, optional): Path to the sensitivity labels configuration file. This file contains the mapping of sensitivity label keys to their respective label IDs and names. Defaults to DEFAULT_SENSITIVITY_LABELS_DEFINITION.
+        pool (ApplicationPool, optional): Leases Excel or Word from this pool, the application is given back to the pool instead of being quit. Defaults to None (a new application is started, then quit).
+        force (bool, optional): Labels the document even if it already carries the label. Defaults to False.
+        cache (LabelCache, optional): Content hash cache of the document labels (see label_toolbox.label_cache). Defaults to None.
+
+    Returns:
+        bool: True if the document was labeled, False if it already carried the label.
 
     Raises:
         NotImplementedError: If the document manager for the specified file type is not implemented.
         FileNotFoundError: If the specified sensitivity configuration file does not exist.
         KeyError: If the specified sensitivity label is not found in the configuration file.
+        OSError: If the document could not be opened.
     """
-    document_manager = document_manager_factory(absolute_path_to_filename)
-    set_sensitivity_label_to_document(
-        document_manager,
-        sensitivity_label,
-        sensitivity_configuration_file,
-    )
-    document_manager.close_document(save=True)
-    document_manager.quit()
+    label_id = get_label_registry(sensitivity_configuration_file).definitions[
+        sensitivity_label
+    ]["LabelId"]
+    if not force and has_label(absolute_path_to_filename, label_id, cache):
+        return False
+    document_manager = document_manager_factory(absolute_path_to_filename, pool)
+    try:
+        if not set_sensitivity_label_to_document(
+            document_manager,
+            sensitivity_label,
+            sensitivity_configuration_file,
+        ):
+            raise OSError(f"Cannot open {absolute_path_to_filename}")
+        document_manager.close_document(save=True)
+    finally:
+        # closes the document (without saving if it failed) and gives the application back to the pool
+        document_manager.quit()
+    remember_label(absolute_path_to_filename, label_id, cache)
+    return True
+
+
+def _label_definition(filename: str, pool: ApplicationPool) -> Optional[Dict[str, Any]]:
+    document_manager = document_manager_factory(os.path.abspath(filename), pool)
+    try:
+        if not document_manager.document:
+            raise OSError(f"Cannot open {filename}")
+        current_label_info = document_manager.sensitivity_label_manager.getlabel()
+        definition = LabelInfoManager(current_label_info).read(_DEFINITION_PROPERTIES)
+        return definition if definition["LabelId"] else None
+    finally:
+        document_manager.quit()
+
+
+@contextmanager
+def _template_reader(
+    dispatch: Optional[Callable[[str], Any]],
+) -> Iterator[Callable[[str], Optional[Dict[str, Any]]]]:
+    # one application per type and per thread: COM objects are created, used and quit by the same thread
+    pool = ApplicationPool(dispatch or dispatch_application, max_size=1)
+    try:
+        yield lambda filename: _label_definition(filename, pool)
+    finally:
+        pool.close()
 
 
 def create_sensitivity_label_definition(
     extract_from: str = DEFAULT_SENSITIVITY_TEMPLATES,
     sensitivity_configuration_file: str = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
-) -> None:
+    max_workers: int = DEFAULT_TEMPLATE_READERS,
+    full: bool = False,
+    dispatch: Optional[Callable[[str], Any]] = None,
+) -> DefinitionReport:
     """
     Creates a sensitivity label definition file from a set of Office documents.
 
+    The definition file is updated incrementally (see label_toolbox.label_definition): only the documents added or
+    modified since the previous call are opened, by max_workers threads each reusing its own Excel and Word
+    instances, and the labels are merged into the existing file (labels added by hand are kept).
+
     Args:
         extract_from: Directory containing Office documents to extract labels from.
         sensitivity_configuration_file: Path to save the generated configuration file.
+        max_workers: Number of documents opened concurrently, each thread starts its own Office applications.
+        full: Opens all the documents again, even the unchanged ones.
+        dispatch: Creates the Office applications from their ProgID (see ApplicationPool). Defaults to
+            dispatch_application.
+
+    Returns:
+        DefinitionReport: The labels added, removed and changed, and the documents that could not be read.
 
     Note:
         You have to create in extract_from - ex: sensitivity_model as series of files with the different sensitivity level you want to capture.
@@ -100,33 +209,12 @@ def create_sensitivity_label_definition(
         Each company have it's own sensitivity level and those have specific ids.
 
     """
-    sensitivity_label_definition: Dict[str, Any] = {}
-
-    for filename in glob(os.path.join(extract_from, "*")):
-        label, extension = os.path.splitext(os.path.basename(filename))
-        if extension not in [".xlsx", ".docx"]:
-            continue
-
-        document_manager = document_manager_factory(os.path.abspath(filename))
-        if not document_manager.document:
-            continue
-
-        sensitivity_label_manager = SensitivityLabelManager(document_manager.document)
-        current_label_info = sensitivity_label_manager.getlabel()
-        label_info_manager = LabelInfoManager(current_label_info)
-
-        sensitivity_label_definition[label] = {
-            "LabelId": label_info_manager.labelinfo.LabelId,
-            "LabelName": label_info_manager.labelinfo.LabelName,
-            "IsEnabled": label_info_manager.labelinfo.IsEnabled,
-            "SetDate": label_info_manager.labelinfo.SetDate,
-            "AssignmentMethod": label_info_manager.labelinfo.AssignmentMethod,
-            "SiteId": label_info_manager.labelinfo.SiteId,
-            "ActionId": label_info_manager.labelinfo.ActionId,
-            "ContentBits": label_info_manager.labelinfo.ContentBits,
-        }
-
-        document_manager.close_document(save=False)
-
-    with open(sensitivity_configuration_file, "w", encoding="utf8") as fh_out:
-        json.dump(sensitivity_label_definition, fh_out, indent=4)
+    return build_label_definition(
+        extract_from,
+        sensitivity_configuration_file,
+        is_template=lambda filename: os.path.splitext(filename)[1].lower()
+        in DOCUMENT_FACTORY,
+        worker=lambda: _template_reader(dispatch),
+        max_workers=max_workers,
+        full=full,
+    )
@@ -2,10 +2,11 @@ import logging
 import os
 from typing import Optional
 
-import pythoncom
-from win32com.client import Dispatch, CDispatch
+from label_toolbox.label_metrics import timed
 
+from ._com import CDispatch, com_error
 from .abstract_document_manager import AbstractDocumentManager
+from .application_pool import ApplicationPool
 
 logger = logging.getLogger(__name__)
 
@@ -20,16 +21,19 @@ class WordDocumentManager(AbstractDocumentManager):
         filename (str): Path to the document file being managed.
     """
 
-    def __init__(self, filename: str):
+    prog_id = "Word.Application"
+
+    def __init__(self, filename: str, pool: Optional[ApplicationPool] = None):
         """
         Initializes the WordDocumentManager with a specific document file.
 
         Args:
             filename (str): Path to the Word document file.
+            pool (Optional[ApplicationPool]): Leases Word from this pool instead of starting a new instance.
         """
-        super().__init__(filename)
+        super().__init__(filename, pool)
         # Initialize the Word application COM object with automatic COM threading model initialization.
-        self.app = Dispatch("Word.Application", pythoncom.CoInitialize())
+        self.app = self.start_application()
 
     def save_as_document(self, filename: str, *argv, **kwargs):
         """
@@ -83,9 +87,10 @@ class WordDocumentManager(AbstractDocumentManager):
         if self._document is None:
             self.app.Visible = visible
             try:
-                self._document = self.app.Documents.Open(self.filename)
+                with timed("com_open"):
+                    self._document = self.app.Documents.Open(self.filename)
                 self._new_document = False
-            except pythoncom.com_error as error:
+            except com_error as error:
                 logger.error(f"Error opening document: {error}")
                 self._document = None  # Ensure _document is None if open fails
         return self._document
@@ -105,7 +110,7 @@ class WordDocumentManager(AbstractDocumentManager):
             try:
                 self._document = self.app.Documents.Add()
                 self._new_document = True
-            except pythoncom.com_error as error:
+            except com_error as error:
                 logger.error(f"Error creating new document: {error}")
                 self._document = None  # Ensure _document is None if open fails
         return self._document
@@ -0,0 +1,49 @@
+"""
+Instrumentation hooks of the package level code: phase latency, handled errors and bytes read or written.
+
+The hooks do nothing until a recorder is installed. label_toolbox.label_metrics installs its LabelMetrics when the
+metrics are enabled (and re-exports the hooks), so that ooxml_toolbox does not depend on the higher level toolboxes.
+Off, a hook only pays a global lookup.
+
+Only the standard library is used.
+"""
+
+from contextlib import nullcontext
+from typing import Any, ContextManager, Optional
+
+# the enabled metrics (label_toolbox.label_metrics.LabelMetrics), None when the instrumentation is off
+_recorder: Optional[Any] = None
+_NO_PHASE = nullcontext()
+
+
+def set_recorder(recorder: Optional[Any]) -> None:
+    """Installs the metrics the hooks record into (phase, record_error and add_bytes methods), None to turn off."""
+    global _recorder
+    _recorder = recorder
+
+
+def get_recorder() -> Optional[Any]:
+    """Returns the installed metrics, None when the instrumentation is off."""
+    return _recorder
+
+
+def timed(phase: str) -> ContextManager[None]:
+    """Times a phase (see LabelMetrics.phase), does nothing when the instrumentation is off."""
+    recorder = _recorder
+    if recorder is None:
+        return _NO_PHASE
+    return recorder.phase(phase)
+
+
+def record_error(phase: str, error: BaseException) -> None:
+    """Counts an error that was handled (not raised) by a phase."""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record_error(phase, error)
+
+
+def add_bytes(read: int = 0, written: int = 0) -> None:
+    """Counts bytes read from or written to documents."""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.add_bytes(read, written)
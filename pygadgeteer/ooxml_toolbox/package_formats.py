@@ -0,0 +1,46 @@
+"""
+Office Open XML package formats that can be labeled at zip level.
+
+Word, Excel and PowerPoint documents, templates and their macro-enabled variants share the same package
+structure: the sensitivity label lives in docProps/custom.xml, whatever the application.
+"""
+
+import os
+from typing import Dict
+
+PACKAGE_EXTENSIONS: Dict[str, str] = {
+    ".docx": "Word",
+    ".docm": "Word",
+    ".dotx": "Word",
+    ".dotm": "Word",
+    ".xlsx": "Excel",
+    ".xlsm": "Excel",
+    ".xltx": "Excel",
+    ".xltm": "Excel",
+    ".pptx": "PowerPoint",
+    ".pptm": "PowerPoint",
+    ".potx": "PowerPoint",
+    ".potm": "PowerPoint",
+    ".ppsx": "PowerPoint",
+    ".ppsm": "PowerPoint",
+}
+
+
+def is_package(filename: str) -> bool:
+    """Tells if the file extension is an Office Open XML package format that can be labeled at zip level."""
+    _, extension = os.path.splitext(filename)
+    return extension.lower() in PACKAGE_EXTENSIONS
+
+
+def check_package(filename: str) -> None:
+    """
+    Checks the file extension is an Office Open XML package format.
+
+    Raises:
+        NotImplementedError: If the extension is not a supported package format (ex: legacy .xls or .doc files).
+    """
+    if not is_package(filename):
+        _, extension = os.path.splitext(filename)
+        raise NotImplementedError(
+            f"Package level labeling for {extension} is not implemented."
+        )
@@ -0,0 +1,211 @@
+"""
+Sensitivity labels of Word, Excel and PowerPoint documents, handled directly in the Office Open XML package.
+
+This is the package level (COM free) counterpart of office_toolbox: it reads and writes the MSIP_Label_* custom
+document properties of .docx, .docm, .xlsx, .xlsm, .xltx, .pptx, ... files without Office, so it also runs on
+Linux. The parts of the package that do not hold the label (document body, worksheets, VBA project, ...) are
+copied byte for byte.
+"""
+
+import io
+import os
+from typing import TYPE_CHECKING, BinaryIO, Optional, Union
+
+from label_toolbox.label_cache import LabelCache, has_label, remember_label
+from label_toolbox.label_registry import CompiledLabel
+from openpyxl_toolbox.label_record import (
+    LABEL_PROPERTY_PREFIX,
+    LabelRecord,
+    label_from_properties,
+    label_record_from_properties,
+    label_to_properties,
+    stale_label_properties,
+)
+
+from .custom_properties import (
+    CustomProperties,
+    edit_custom_properties,
+    read_custom_properties,
+    update_custom_properties,
+    update_custom_properties_stream,
+)
+from .package_formats import check_package
+from .zip_package import PackageSource, as_binary_stream
+
+if TYPE_CHECKING:
+    from openpyxl_toolbox.sensitivity_manager import MSIP_Label
+
+
+def get_label_from_package(filename: str) -> Optional["MSIP_Label"]:
+    """
+    Extracts the sensitivity label of an Office Open XML document.
+
+    Args:
+        filename (str): Path to the document (.docx, .docm, .xlsx, .xlsm, .xltx, .pptx, ...).
+
+    Returns:
+        Optional[MSIP_Label]: The sensitivity label of the document, None if the document is not labeled.
+
+    Raises:
+        NotImplementedError: If the file extension is not a supported package format.
+    """
+    check_package(filename)
+    return label_from_properties(read_custom_properties(filename))
+
+
+def get_label_record_from_package(filename: str) -> Optional[LabelRecord]:
+    """
+    Extracts the sensitivity label of an Office Open XML document, without validating it (see LabelRecord).
+
+    Args:
+        filename (str): Path to the document (.docx, .docm, .xlsx, .xlsm, .xltx, .pptx, ...).
+
+    Returns:
+        Optional[LabelRecord]: The sensitivity label of the document, None if the document is not labeled.
+
+    Raises:
+        NotImplementedError: If the file extension is not a supported package format.
+    """
+    check_package(filename)
+    return label_record_from_properties(read_custom_properties(filename))
+
+
+def set_label_to_package(
+    filename: str,
+    label: Union["MSIP_Label", CompiledLabel],
+    justification: Optional[str] = None,
+    output: Optional[str] = None,
+    force: bool = False,
+    cache: Optional[LabelCache] = None,
+    append: bool = False,
+) -> bool:
+    """
+    Applies a sensitivity label to an Office Open XML document.
+
+    Only docProps/custom.xml (and, when needed, [Content_Types].xml and _rels/.rels) is rewritten. Every other
+    part, VBA project of macro-enabled documents included, is copied byte for byte. The properties of a previous
+    label are removed. A document labeled in place that already carries the label is not rewritten.
+
+    Args:
+        filename (str): Path to the document (.docx, .docm, .xlsx, .xlsm, .xltx, .pptx, ...).
+        label (Union[MSIP_Label, CompiledLabel]): The sensitivity label to apply. The properties of a CompiledLabel
+            (see label_toolbox.label_registry) are already rendered, only its SetDate is.
+        justification (Optional[str]): Justification for applying the label, if any.
+        output (Optional[str]): Path of the labeled document. Defaults to filename (labeled in place).
+        force (bool): Rewrites the document even if it already carries the label.
+        cache (Optional[LabelCache]): Content hash cache of the document labels (see label_toolbox.label_cache).
+        append (bool): Labels in place by appending the new custom properties to the document instead of rewriting
+            it: the cost no longer depends on the size of the document (see zip_package.append_package).
+
+    Returns:
+        bool: True if the document was written, False if it already carried the label.
+
+    Raises:
+        NotImplementedError: If the file extension is not a supported package format.
+    """
+    check_package(filename)
+    label_id = label.label_id if isinstance(label, CompiledLabel) else label.LabelId
+    in_place = output is None or os.path.abspath(output) == os.path.abspath(filename)
+    if not force and in_place and has_label(filename, label_id, cache):
+        return False
+    if isinstance(label, CompiledLabel):
+        properties = label.properties(justification)
+    else:
+        properties = label_to_properties(label, justification)
+    update_custom_properties(
+        filename,
+        properties,
+        output,
+        remove_prefix=LABEL_PROPERTY_PREFIX,
+        append=append,
+    )
+    remember_label(output or filename, label_id, cache)
+    return True
+
+
+def get_label_from_buffer(source: PackageSource) -> Optional["MSIP_Label"]:
+    """
+    Extracts the sensitivity label of an Office Open XML document held in memory or read from a stream.
+
+    Args:
+        source (PackageSource): The document, as bytes, bytearray, memoryview or seekable binary stream.
+
+    Returns:
+        Optional[MSIP_Label]: The sensitivity label of the document, None if the document is not labeled.
+
+    Raises:
+        zipfile.BadZipFile: If source is not a zip archive.
+    """
+    return label_from_properties(read_custom_properties(as_binary_stream(source)))
+
+
+def set_label_to_buffer(
+    source: PackageSource,
+    label: Union["MSIP_Label", CompiledLabel],
+    justification: Optional[str] = None,
+    output: Optional[BinaryIO] = None,
+) -> Optional[bytes]:
+    """
+    Applies a sensitivity label to an Office Open XML document held in memory or read from a stream, ex: an upload.
+
+    The labeled document is written to output, or returned as bytes. The unchanged parts of an in-memory document
+    are written from slices of its buffer: apart from the output, labeling only allocates the (small) rewritten
+    parts.
+
+    Args:
+        source (PackageSource): The document, as bytes, bytearray, memoryview or seekable binary stream.
+        label (Union[MSIP_Label, CompiledLabel]): The sensitivity label to apply.
+        justification (Optional[str]): Justification for applying the label, if any.
+        output (Optional[BinaryIO]): Binary stream receiving the labeled document. It does not need to be seekable.
+
+    Returns:
+        Optional[bytes]: The labeled document when no output is given, else None.
+
+    Raises:
+        zipfile.BadZipFile: If source is not a zip archive.
+        ValueError: If source is not an Office Open XML package.
+    """
+    if isinstance(label, CompiledLabel):
+        properties = label.properties(justification)
+    else:
+        properties = label_to_properties(label, justification)
+    destination = output if output is not None else io.BytesIO()
+    update_custom_properties_stream(
+        as_binary_stream(source),
+        destination,
+        properties,
+        remove_prefix=LABEL_PROPERTY_PREFIX,
+    )
+    return destination.getvalue() if output is None else None
+
+
+def repair_package_label(
+    filename: str, output: Optional[str] = None, dry_run: bool = False
+) -> int:
+    """
+    Cleans the custom properties of a document labeled by appending: duplicated properties and the properties of
+    previous labels (see stale_label_properties) are removed. The document is only rewritten if it needs it.
+
+    Args:
+        filename (str): Path to the document (.docx, .docm, .xlsx, .xlsm, .xltx, .pptx, ...).
+        output (Optional[str]): Path of the repaired document. Defaults to filename (repaired in place).
+        dry_run (bool): Only counts the properties that would be removed, the document is not rewritten.
+
+    Returns:
+        int: The number of removed properties (to be removed, in a dry run).
+
+    Raises:
+        NotImplementedError: If the file extension is not a supported package format.
+    """
+    check_package(filename)
+    removed = 0
+
+    def edit(custom_properties: CustomProperties) -> bool:
+        nonlocal removed
+        removed = custom_properties.duplicates
+        for prop_name in stale_label_properties(custom_properties.properties):
+            removed += custom_properties.delete(prop_name)
+        return removed > 0 and not dry_run
+
+    edit_custom_properties(filename, edit, output)
+    return removed
@@ -0,0 +1,705 @@
+"""
+Zip level access to Office Open XML packages (xlsx, docx, pptx, ...).
+
+An OOXML document is a zip archive of XML parts. Changing a document property only touches a couple of small
+parts, so this module rewrites a package entry by entry: unchanged entries are streamed through with their raw
+compressed bytes (no decompression, no recompression) and only the replaced parts are compressed again. The cost
+of a rewrite scales with the number of entries, not with the size of the worksheets or of the document body.
+
+For very large packages, append_package avoids the copy altogether: the replaced parts and a new central directory
+are appended to the end of the existing file, the previous versions of the parts become unreferenced bytes.
+compact_package removes them with a full rewrite.
+"""
+
+import io
+import logging
+import os
+import struct
+import tempfile
+import time
+import zipfile
+import zlib
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+from .instrumentation import add_bytes, timed
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 1024 * 1024
+# append_package compacts the package once its unreferenced bytes exceed this part of the file
+DEFAULT_COMPACT_RATIO = 0.25
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+_END_RECORD64 = struct.Struct("<4sQ2H2L4Q")
+_END_RECORD64_LOCATOR = struct.Struct("<4sLQL")
+_EXTRA_HEADER = struct.Struct("<2H")
+
+_LOCAL_SIGNATURE = b"PK\003\004"
+_CENTRAL_SIGNATURE = b"PK\001\002"
+_END_SIGNATURE = b"PK\005\006"
+_END64_SIGNATURE = b"PK\006\006"
+_END64_LOCATOR_SIGNATURE = b"PK\006\007"
+_DATA_DESCRIPTOR_SIGNATURE = b"PK\007\010"
+
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_ZIP64_EXTRA_ID = 0x0001
+_ZIP64_VERSION = 45
+
+# Zip entries replacement: bytes is the new content of the part, None removes the part from the package.
+Replacements = Dict[str, Optional[bytes]]
+
+# A package given in memory (bytes, bytearray, memoryview) or as a seekable binary stream
+PackageSource = Union[bytes, bytearray, memoryview, BinaryIO]
+
+
+def _dos_date_time(date_time: Tuple[int, int, int, int, int, int]) -> Tuple[int, int]:
+    """Converts a ZipInfo.date_time tuple to the (time, date) MS-DOS pair stored in zip headers."""
+    year, month, day, hour, minute, second = date_time
+    dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | (second // 2)
+    return dos_time, dos_date
+
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    """Removes the zip64 extended information field, it is rebuilt when the entry is written again."""
+    stripped = []
+    position = 0
+    while position + _EXTRA_HEADER.size <= len(extra):
+        field_id, field_size = _EXTRA_HEADER.unpack_from(extra, position)
+        end = position + _EXTRA_HEADER.size + field_size
+        if field_id != _ZIP64_EXTRA_ID:
+            stripped.append(extra[position:end])
+        position = end
+    return b"".join(stripped)
+
+
+def _encode_filename(info: zipfile.ZipInfo) -> bytes:
+    """Encodes the entry name the way it was decoded by zipfile (utf-8 flag or cp437)."""
+    if info.flag_bits & _FLAG_UTF8:
+        return info.orig_filename.encode("utf-8")
+    try:
+        return info.orig_filename.encode("cp437")
+    except UnicodeEncodeError:
+        info.flag_bits |= _FLAG_UTF8
+        return info.orig_filename.encode("utf-8")
+
+
+def _data_offset(source: BinaryIO, info: zipfile.ZipInfo) -> int:
+    """Returns the position of the compressed data of an entry, just after its local header."""
+    source.seek(info.header_offset)
+    header = source.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size or header[:4] != _LOCAL_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad local header for zip entry {info.filename}")
+    fields = _LOCAL_HEADER.unpack(header)
+    return info.header_offset + _LOCAL_HEADER.size + fields[10] + fields[11]
+
+
+_ENTRY_ATTRIBUTES = (
+    "compress_type",
+    "comment",
+    "extra",
+    "create_system",
+    "create_version",
+    "extract_version",
+    "flag_bits",
+    "internal_attr",
+    "external_attr",
+    "CRC",
+    "compress_size",
+    "file_size",
+)
+
+
+def _copy_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    entry = zipfile.ZipInfo(info.orig_filename, info.date_time)
+    for attr in _ENTRY_ATTRIBUTES:
+        setattr(entry, attr, getattr(info, attr))
+    return entry
+
+
+def _entry_span(entry: zipfile.ZipInfo, name: bytes, extra: bytes) -> int:
+    """Approximate number of bytes of an entry in the archive: local header, data and data descriptor."""
+    span = _LOCAL_HEADER.size + len(name) + len(extra) + entry.compress_size
+    if entry.flag_bits & _FLAG_DATA_DESCRIPTOR:
+        span += 16
+    return span
+
+
+class BufferReader(io.BufferedIOBase):
+    """
+    Read only, seekable binary stream over a memory buffer (bytes, bytearray, memoryview, mmap, ...), without
+    copying it.
+
+    readview() returns slices of the buffer itself: raw zip entries are copied from an in-memory package to the
+    destination without intermediate copies.
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview]):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            # as a file does, zipfile relies on it for archives shorter than their end record
+            raise OSError("negative seek position")
+        self._position = offset
+        return offset
+
+    def readview(self, size: int = -1) -> memoryview:
+        """Reads up to size bytes (all the remaining bytes if size is negative), as a view of the buffer."""
+        end = len(self._view) if size is None or size < 0 else self._position + size
+        view = self._view[self._position : end]
+        self._position += len(view)
+        return view
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        return bytes(self.readview(size))
+
+    read1 = read
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+def as_binary_stream(source: PackageSource) -> BinaryIO:
+    """Returns source as a seekable binary stream: memory buffers are wrapped in a BufferReader, streams as is."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BufferReader(source)
+    return source
+
+
+def _copy_range(source: BinaryIO, destination: BinaryIO, length: int) -> None:
+    """Copies length bytes from the current position of source to destination, by chunks."""
+    readview = getattr(source, "readview", None)
+    if readview is not None:
+        # in-memory source: write the slice of the buffer, no copy
+        view = readview(length)
+        if len(view) != length:
+            raise zipfile.BadZipFile("Truncated zip entry")
+        destination.write(view)
+        return
+    while length > 0:
+        chunk = source.read(min(length, COPY_BUFFER_SIZE))
+        if not chunk:
+            raise zipfile.BadZipFile("Truncated zip entry")
+        destination.write(chunk)
+        length -= len(chunk)
+
+
+class _CountingWriter:
+    """Counts the bytes written to a stream, so that the stream does not need to support tell()."""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.position = 0
+
+    def write(self, data: Union[bytes, memoryview]) -> int:
+        self.stream.write(data)
+        self.position += len(data)
+        return len(data)
+
+
+class ZipEntryWriter:
+    """
+    Writes zip entries followed by the central directory to a binary stream (seekable or not).
+
+    Entries are either copied raw from another archive (copy_entry), compressed from bytes (write_entry) or, when
+    appending to an archive, kept where they are (keep_entry). Zip64 records are only emitted when sizes, offsets or
+    the number of entries require them. offset is the position of the first byte written in the archive (ex: the size
+    of the archive appended to).
+
+    Attributes:
+        destination (BinaryIO): The stream receiving the archive.
+        entries (List[Tuple[zipfile.ZipInfo, bytes, bytes]]): The written entries (info, encoded name, extra field).
+        central_directory_offset (Optional[int]): Offset of the central directory, once written by close().
+    """
+
+    def __init__(self, destination: BinaryIO, offset: int = 0):
+        self.destination = destination
+        self.entries: List[Tuple[zipfile.ZipInfo, bytes, bytes]] = []
+        self.central_directory_offset: Optional[int] = None
+        # offsets are counted from the first byte written, the destination can be a pipe or a socket
+        self._output = _CountingWriter(destination)
+        self._output.position = offset
+
+    @property
+    def position(self) -> int:
+        """Offset of the next byte written in the archive: its size once closed."""
+        return self._output.position
+
+    def _write_local_header(self, info: zipfile.ZipInfo) -> Tuple[bytes, bytes]:
+        name = _encode_filename(info)
+        extra = _strip_zip64_extra(info.extra)
+        compress_size, file_size = info.compress_size, info.file_size
+        extract_version = info.extract_version
+        local_extra = extra
+        if compress_size >= ZIP64_LIMIT or file_size >= ZIP64_LIMIT:
+            local_extra = (
+                struct.pack("<2H2Q", _ZIP64_EXTRA_ID, 16, file_size, compress_size)
+                + extra
+            )
+            compress_size = file_size = ZIP64_LIMIT
+            extract_version = max(extract_version, _ZIP64_VERSION)
+        crc = info.CRC
+        if info.flag_bits & _FLAG_DATA_DESCRIPTOR:
+            crc = compress_size = file_size = 0
+        dos_time, dos_date = _dos_date_time(info.date_time)
+        self._output.write(
+            _LOCAL_HEADER.pack(
+                _LOCAL_SIGNATURE,
+                extract_version,
+                0,
+                info.flag_bits,
+                info.compress_type,
+                dos_time,
+                dos_date,
+                crc,
+                compress_size,
+                file_size,
+                len(name),
+                len(local_extra),
+            )
+        )
+        self._output.write(name)
+        self._output.write(local_extra)
+        return name, extra
+
+    def _write_data_descriptor(self, info: zipfile.ZipInfo) -> None:
+        if info.compress_size >= ZIP64_LIMIT or info.file_size >= ZIP64_LIMIT:
+            descriptor = struct.pack(
+                "<4sL2Q",
+                _DATA_DESCRIPTOR_SIGNATURE,
+                info.CRC,
+                info.compress_size,
+                info.file_size,
+            )
+        else:
+            descriptor = struct.pack(
+                "<4s3L",
+                _DATA_DESCRIPTOR_SIGNATURE,
+                info.CRC,
+                info.compress_size,
+                info.file_size,
+            )
+        self._output.write(descriptor)
+
+    def copy_entry(self, source: BinaryIO, info: zipfile.ZipInfo) -> None:
+        """
+        Copies an entry of the source archive with its raw (still compressed) bytes.
+
+        Args:
+            source (BinaryIO): The seekable stream of the source archive.
+            info (zipfile.ZipInfo): The entry, as listed in the central directory of the source archive.
+        """
+        data_offset = _data_offset(source, info)
+        entry = _copy_info(info)
+        # sizes are known from the central directory: the data descriptor is only kept for encrypted entries,
+        # where the encryption header check byte depends on it
+        if not entry.flag_bits & _FLAG_ENCRYPTED:
+            entry.flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+        entry.header_offset = self.position
+        name, extra = self._write_local_header(entry)
+        source.seek(data_offset)
+        _copy_range(source, self._output, info.compress_size)
+        if entry.flag_bits & _FLAG_DATA_DESCRIPTOR:
+            self._write_data_descriptor(entry)
+        self.entries.append((entry, name, extra))
+
+    def keep_entry(self, info: zipfile.ZipInfo) -> None:
+        """
+        Lists an entry already present in the destination archive (append mode): nothing is written but its
+        central directory record.
+
+        Args:
+            info (zipfile.ZipInfo): The entry, as listed in the central directory of the destination archive.
+        """
+        entry = _copy_info(info)
+        entry.header_offset = info.header_offset
+        name = _encode_filename(entry)
+        self.entries.append((entry, name, _strip_zip64_extra(entry.extra)))
+
+    def write_entry(
+        self,
+        filename: str,
+        data: bytes,
+        template: Optional[zipfile.ZipInfo] = None,
+        compress_type: int = zipfile.ZIP_DEFLATED,
+    ) -> None:
+        """
+        Compresses and writes a new entry.
+
+        Args:
+            filename (str): Name of the entry inside the archive.
+            data (bytes): Uncompressed content of the entry.
+            template (Optional[zipfile.ZipInfo]): The entry being replaced, if any, to keep its attributes.
+            compress_type (int): zipfile.ZIP_DEFLATED (default) or zipfile.ZIP_STORED.
+        """
+        entry = zipfile.ZipInfo(filename, time.localtime(time.time())[:6])
+        entry.external_attr = template.external_attr if template else 0o600 << 16
+        entry.create_system = (
+            template.create_system if template else entry.create_system
+        )
+        entry.compress_type = compress_type
+        if compress_type == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15
+            )
+            payload = compressor.compress(data) + compressor.flush()
+            entry.extract_version = 20
+        else:
+            payload = data
+        entry.CRC = zlib.crc32(data)
+        entry.file_size = len(data)
+        entry.compress_size = len(payload)
+        entry.header_offset = self.position
+        name, extra = self._write_local_header(entry)
+        self._output.write(payload)
+        self.entries.append((entry, name, extra))
+
+    def close(self) -> None:
+        """Writes the central directory and the end of central directory record(s)."""
+        central_directory_offset = self.central_directory_offset = self.position
+        for entry, name, extra in self.entries:
+            zip64_fields = []
+            file_size, compress_size, header_offset = (
+                entry.file_size,
+                entry.compress_size,
+                entry.header_offset,
+            )
+            if file_size >= ZIP64_LIMIT:
+                zip64_fields.append(file_size)
+                file_size = ZIP64_LIMIT
+            if compress_size >= ZIP64_LIMIT:
+                zip64_fields.append(compress_size)
+                compress_size = ZIP64_LIMIT
+            if header_offset >= ZIP64_LIMIT:
+                zip64_fields.append(header_offset)
+                header_offset = ZIP64_LIMIT
+            extract_version, create_version = (
+                entry.extract_version,
+                entry.create_version,
+            )
+            if zip64_fields:
+                extra = (
+                    struct.pack(
+                        f"<2H{len(zip64_fields)}Q",
+                        _ZIP64_EXTRA_ID,
+                        8 * len(zip64_fields),
+                        *zip64_fields,
+                    )
+                    + extra
+                )
+                extract_version = max(extract_version, _ZIP64_VERSION)
+                create_version = max(create_version, _ZIP64_VERSION)
+            comment = entry.comment
+            dos_time, dos_date = _dos_date_time(entry.date_time)
+            self._output.write(
+                _CENTRAL_HEADER.pack(
+                    _CENTRAL_SIGNATURE,
+                    create_version,
+                    entry.create_system,
+                    extract_version,
+                    0,
+                    entry.flag_bits,
+                    entry.compress_type,
+                    dos_time,
+                    dos_date,
+                    entry.CRC,
+                    compress_size,
+                    file_size,
+                    len(name),
+                    len(extra),
+                    len(comment),
+                    0,
+                    entry.internal_attr,
+                    entry.external_attr,
+                    header_offset,
+                )
+            )
+            self._output.write(name)
+            self._output.write(extra)
+            self._output.write(comment)
+
+        end_offset = self.position
+        central_directory_size = end_offset - central_directory_offset
+        count = len(self.entries)
+        if (
+            count > ZIP_MAX_ENTRIES
+            or central_directory_offset >= ZIP64_LIMIT
+            or central_directory_size >= ZIP64_LIMIT
+        ):
+            self._output.write(
+                _END_RECORD64.pack(
+                    _END64_SIGNATURE,
+                    _END_RECORD64.size - 12,
+                    _ZIP64_VERSION,
+                    _ZIP64_VERSION,
+                    0,
+                    0,
+                    count,
+                    count,
+                    central_directory_size,
+                    central_directory_offset,
+                )
+            )
+            self._output.write(
+                _END_RECORD64_LOCATOR.pack(_END64_LOCATOR_SIGNATURE, 0, end_offset, 1)
+            )
+            count = min(count, ZIP_MAX_ENTRIES)
+            central_directory_offset = min(central_directory_offset, ZIP64_LIMIT)
+            central_directory_size = min(central_directory_size, ZIP64_LIMIT)
+        self._output.write(
+            _END_RECORD.pack(
+                _END_SIGNATURE,
+                0,
+                0,
+                count,
+                count,
+                central_directory_size,
+                central_directory_offset,
+                0,
+            )
+        )
+
+
+def copy_package(
+    source: BinaryIO, destination: BinaryIO, replacements: Replacements
+) -> None:
+    """
+    Copies a zip package from source to destination, replacing, adding or removing some of its entries.
+
+    Entries that are not listed in replacements are copied with their raw compressed bytes, in their original order.
+    Replaced entries keep their position, new entries are appended after the existing ones.
+
+    Args:
+        source (BinaryIO): Seekable binary stream of the original package.
+        destination (BinaryIO): Binary stream receiving the new package.
+        replacements (Replacements): Mapping of entry name to its new content, or None to remove the entry.
+
+    Raises:
+        zipfile.BadZipFile: If source is not a valid zip archive.
+    """
+    pending = dict(replacements)
+    copied = 0
+    with timed("write"), zipfile.ZipFile(source) as archive:
+        writer = ZipEntryWriter(destination)
+        for info in archive.infolist():
+            if info.filename in replacements:
+                # a replaced (or removed) part is written only once, even if the source has duplicated entries
+                if info.filename in pending:
+                    data = pending.pop(info.filename)
+                    if data is not None:
+                        writer.write_entry(info.filename, data, info)
+                continue
+            writer.copy_entry(source, info)
+            copied += info.compress_size
+        for filename, data in pending.items():
+            if data is not None:
+                writer.write_entry(filename, data)
+        writer.close()
+    add_bytes(read=copied, written=writer.position)
+
+
+def read_package_entries(
+    filename: Union[str, BinaryIO], names: Iterable[str]
+) -> Dict[str, Optional[bytes]]:
+    """
+    Reads a few entries of a zip package, without touching the other ones.
+
+    Only the central directory and the requested entries are read from the file.
+
+    Args:
+        filename (Union[str, BinaryIO]): Path to the package, or seekable binary stream of the package.
+        names (Iterable[str]): Names of the entries to read.
+
+    Returns:
+        Dict[str, Optional[bytes]]: The uncompressed content of each requested entry, None if it does not exist.
+    """
+    with timed("open"):
+        archive = zipfile.ZipFile(filename)
+    with archive:
+        available = archive.NameToInfo
+        entries = {
+            name: archive.read(name) if name in available else None for name in names
+        }
+        add_bytes(
+            read=sum(
+                available[name].compress_size for name in names if name in available
+            )
+        )
+        return entries
+
+
+def rewrite_package(
+    filename: str, replacements: Replacements, output: Optional[str] = None
+) -> None:
+    """
+    Rewrites a zip package with some of its entries replaced.
+
+    The new package is streamed to a temporary file in the target directory, which then atomically replaces
+    the target. A failure leaves the original file untouched.
+
+    Args:
+        filename (str): Path to the original package.
+        replacements (Replacements): Mapping of entry name to its new content, or None to remove the entry.
+        output (Optional[str]): Path of the new package. Defaults to filename (rewrite in place).
+    """
+    target = output or filename
+    fd, temporary = tempfile.mkstemp(
+        prefix="~", suffix=".tmp", dir=os.path.dirname(os.path.abspath(target))
+    )
+    try:
+        with open(filename, "rb") as source, os.fdopen(fd, "wb") as destination:
+            copy_package(source, destination, replacements)
+        os.chmod(temporary, os.stat(filename).st_mode & 0o7777)
+        os.replace(temporary, target)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def unreferenced_bytes(filename: Union[str, BinaryIO]) -> int:
+    """
+    Returns the approximate number of bytes of a zip package that are not referenced by its central directory (ex:
+    the previous versions of the parts replaced by append_package, and the previous central directories).
+    """
+    with zipfile.ZipFile(filename) as archive:
+        referenced = sum(
+            _entry_span(info, _encode_filename(_copy_info(info)), info.extra)
+            for info in archive.infolist()
+        )
+        return max(0, archive.start_dir - referenced)
+
+
+def append_package(
+    filename: str,
+    replacements: Replacements,
+    compact_ratio: Optional[float] = DEFAULT_COMPACT_RATIO,
+) -> bool:
+    """
+    Updates a zip package in place by appending the replaced entries and a new central directory to its end.
+
+    The existing entries are neither moved nor copied: the cost is proportional to the replaced entries and to
+    the central directory, not to the size of the package. The previous versions of the replaced entries stay in
+    the file, unreferenced, until the package is compacted (see compact_package). A failure while appending
+    truncates the file back to its original size.
+
+    Args:
+        filename (str): Path to the package.
+        replacements (Replacements): Mapping of entry name to its new content, or None to remove the entry.
+        compact_ratio (Optional[float]): Compacts the package when its unreferenced bytes exceed this part of the
+            file, after the append. None never compacts.
+
+    Returns:
+        bool: True if the package was updated, False if its layout does not allow an append (the file is left
+        untouched and should be rewritten, see update_package).
+
+    Raises:
+        zipfile.BadZipFile: If the file is not a zip archive.
+    """
+    with open(filename, "r+b") as package:
+        with timed("open"):
+            archive = zipfile.ZipFile(package)
+        with archive:
+            if archive.comment:
+                # the comment follows the end of central directory record, it would have to be moved
+                return False
+            infos = archive.infolist()
+        size = package.seek(0, io.SEEK_END)
+        pending = dict(replacements)
+        try:
+            with timed("write"):
+                writer = ZipEntryWriter(package, offset=size)
+                for info in infos:
+                    if info.filename in replacements:
+                        if info.filename in pending:
+                            data = pending.pop(info.filename)
+                            if data is not None:
+                                writer.write_entry(info.filename, data, info)
+                        continue
+                    writer.keep_entry(info)
+                for name, data in pending.items():
+                    if data is not None:
+                        writer.write_entry(name, data)
+                writer.close()
+                package.flush()
+        except BaseException:
+            package.truncate(size)
+            raise
+    total = writer.position
+    add_bytes(written=total - size)
+    if compact_ratio is not None:
+        referenced = sum(_entry_span(*entry) for entry in writer.entries)
+        unreferenced = writer.central_directory_offset - referenced
+        if unreferenced > compact_ratio * total:
+            logger.info(f"Compacting {filename}: {unreferenced} unreferenced bytes")
+            compact_package(filename)
+    return True
+
+
+def compact_package(filename: str, output: Optional[str] = None) -> int:
+    """
+    Rewrites a zip package without its unreferenced bytes (see append_package).
+
+    Args:
+        filename (str): Path to the package.
+        output (Optional[str]): Path of the compacted package. Defaults to filename (compacted in place).
+
+    Returns:
+        int: The number of bytes reclaimed.
+    """
+    size = os.path.getsize(filename)
+    rewrite_package(filename, {}, output)
+    return size - os.path.getsize(output or filename)
+
+
+def update_package(
+    filename: str,
+    replacements: Replacements,
+    output: Optional[str] = None,
+    append: bool = False,
+    compact_ratio: Optional[float] = DEFAULT_COMPACT_RATIO,
+) -> None:
+    """
+    Replaces some entries of a zip package, by a rewrite (see rewrite_package) or, with append, by an append to
+    the package (see append_package).
+
+    The append is only used for in place updates; when the package layout does not allow it, the package is
+    rewritten.
+
+    Args:
+        filename (str): Path to the original package.
+        replacements (Replacements): Mapping of entry name to its new content, or None to remove the entry.
+        output (Optional[str]): Path of the new package. Defaults to filename (update in place).
+        append (bool): Appends the replaced entries to the package instead of rewriting it.
+        compact_ratio (Optional[float]): See append_package.
+    """
+    in_place = output is None or os.path.abspath(output) == os.path.abspath(filename)
+    if append and in_place:
+        if append_package(filename, replacements, compact_ratio):
+            return
+        logger.info(f"{filename} cannot be appended to, it is rewritten")
+    rewrite_package(filename, replacements, output)
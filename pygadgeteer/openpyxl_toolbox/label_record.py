@@ -0,0 +1,176 @@
+"""
+MIP label records and the MSIP_Label_<LabelId>_<Attribute> custom document properties, without dependency.
+
+The package level code paths (ooxml_toolbox, label_toolbox) only need to read and write the label properties: this
+module does not import pydantic nor openpyxl. The MSIP_Label model (openpyxl_toolbox.sensitivity_manager) is imported
+when a label is validated (LabelRecord.to_msip_label, label_from_properties).
+"""
+
+from datetime import datetime
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, NamedTuple, Optional
+
+from label_toolbox.label_metrics import timed
+
+if TYPE_CHECKING:
+    from .sensitivity_manager import MSIP_Label
+
+DEFAULT_SENSITIVITY_LABELS_DEFINITION = (
+    "sensitivity_model/sensitivity_labels_definition_with_openpyxl.json"
+)
+DEFAULT_SENSITIVITY_TEMPLATES = "sensitivity_model"
+
+
+class MsoAssignmentMethod(Enum):
+    """Enum representing the assignment method of a sensitivity label."""
+
+    Not_Set = -1
+    Standard = 0
+    Privileged = 1
+    Auto = 2
+
+
+def label_to_properties(
+    msip_label: "MSIP_Label", justification: Optional[str] = None
+) -> Dict[str, str]:
+    """Stamps a MIP label and returns it as MSIP_Label_<LabelId>_<Attribute> custom document properties.
+
+    The label SetDate is set to now, and its justification is replaced when one is given.
+
+    Args:
+        msip_label (MSIP_Label): The MIP label to be applied.
+        justification (Optional[str]): Justification for applying the label, if any.
+
+    Returns:
+        Dict[str, str]: The text value of each custom property, by property name.
+    """
+    # change to now
+    if justification:
+        msip_label.Justification = justification
+    msip_label.SetDate = datetime.now()
+    return {
+        f"MSIP_Label_{msip_label.LabelId}_{prop_name}": str(prop_value)
+        for prop_name, prop_value in msip_label.model_dump(
+            by_alias=True, exclude={"LabelId"}
+        ).items()
+    }
+
+
+class LabelRecord(NamedTuple):
+    """Read only, unvalidated MIP label, as read from the custom document properties.
+
+    A lightweight alternative to MSIP_Label for reading and reporting many labels: a tuple with the same fields,
+    holding the text values of the properties ("None" read as None). to_msip_label() validates it when needed.
+
+    Attributes:
+        LabelId (str): The unique identifier for the label.
+        LabelName (Optional[str]): The name of the label.
+        ActionId (Optional[str]): The action identifier.
+        AssignmentMethod (Optional[str]): The method used to assign the label.
+        ContentBits (Optional[str]): The content bits.
+        IsEnabled (Optional[str]): Whether the label is enabled.
+        Justification (Optional[str]): The justification for applying the label.
+        SetDate (Optional[str]): The date the label was set.
+        SiteId (Optional[str]): The site identifier.
+    """
+
+    LabelId: str
+    LabelName: Optional[str] = None
+    ActionId: Optional[str] = None
+    AssignmentMethod: Optional[str] = None
+    ContentBits: Optional[str] = None
+    IsEnabled: Optional[str] = None
+    Justification: Optional[str] = None
+    SetDate: Optional[str] = None
+    SiteId: Optional[str] = None
+
+    def to_msip_label(self) -> "MSIP_Label":
+        """Validates the record as a MSIP_Label."""
+        from .sensitivity_manager import MSIP_Label
+
+        with timed("validate"):
+            return MSIP_Label.model_validate(self._asdict())
+
+
+# custom property attribute (MSIP_Label_<LabelId>_<Attribute>) to LabelRecord field, when they differ
+_ATTRIBUTE_FIELDS = {
+    "Name": "LabelName",
+    "Method": "AssignmentMethod",
+    "Enabled": "IsEnabled",
+}
+
+
+def label_record_from_properties(properties: Dict[str, Any]) -> Optional[LabelRecord]:
+    """Reads a MIP label record from the MSIP_Label_<LabelId>_<Attribute> custom document properties, without
+    validating it.
+
+    Args:
+        properties (Dict[str, Any]): Custom document property values, by property name.
+
+    Returns:
+        A LabelRecord if a label is found, otherwise None.
+    """
+    msip_info = dict()
+    for prop_name, prop_value in properties.items():
+        if prop_name.startswith("MSIP_Label"):
+            prop_name_parts = prop_name.split("_")
+            msip_info["LabelId"] = prop_name_parts[-2]
+            attr = prop_name_parts[-1]
+            if attr in LabelRecord._fields or attr in _ATTRIBUTE_FIELDS:
+                # unset attributes are written as "None" by label_to_properties
+                msip_info[_ATTRIBUTE_FIELDS.get(attr, attr)] = (
+                    None if prop_value == "None" else prop_value
+                )
+    if not msip_info:
+        return None
+    return LabelRecord(**msip_info)
+
+
+def label_from_properties(properties: Dict[str, Any]) -> Optional["MSIP_Label"]:
+    """Builds a MIP label from the MSIP_Label_<LabelId>_<Attribute> custom document properties.
+
+    Args:
+        properties (Dict[str, Any]): Custom document property values, by property name.
+
+    Returns:
+        An instance of MSIP_Label if a label is found, otherwise None.
+    """
+    label_record = label_record_from_properties(properties)
+    return label_record.to_msip_label() if label_record else None
+
+
+LABEL_PROPERTY_PREFIX = "MSIP_Label_"
+
+
+def label_property_id(prop_name: str) -> Optional[str]:
+    """Returns the LabelId of a MSIP_Label_<LabelId>_<Attribute> property name, None for other properties."""
+    if not prop_name.startswith(LABEL_PROPERTY_PREFIX):
+        return None
+    return prop_name[len(LABEL_PROPERTY_PREFIX) :].rpartition("_")[0] or None
+
+
+def stale_label_properties(prop_names: Iterable[str]) -> List[str]:
+    """Returns the properties of the labels that are not the current one.
+
+    A document holds a single sensitivity label. When the properties of several labels piled up (relabeling by
+    appending), the label whose properties come last is the current one.
+
+    Args:
+        prop_names (Iterable[str]): The custom document property names, in document order.
+
+    Returns:
+        List[str]: The names of the properties of the other labels.
+    """
+    labels: Dict[str, List[str]] = {}
+    current = None
+    for prop_name in prop_names:
+        label_id = label_property_id(prop_name)
+        if label_id is not None:
+            labels.setdefault(label_id, []).append(prop_name)
+            current = label_id
+    return [
+        prop_name
+        for label_id, names in labels.items()
+        if label_id != current
+        for prop_name in names
+    ]
@@ -4,35 +4,47 @@ Support for Microsoft Information Protection (MIP) labels in Excel files with op
 """
 
 from datetime import datetime
-from enum import Enum
 import json
-from glob import glob
 import os
 import logging
 from traceback import extract_stack
-from typing import Optional, Dict, Union
+from typing import TYPE_CHECKING, Any, Optional, Dict, Set, Union
 
 from pydantic import BaseModel, Field, ConfigDict
-from openpyxl import Workbook, load_workbook
-from openpyxl.packaging.custom import StringProperty
 
 from json_toolbox import DateTimeEncoder
-
-logger = logging.getLogger()
-
-DEFAULT_SENSITIVITY_LABELS_DEFINITION = (
-    "sensitivity_model/sensitivity_labels_definition_with_openpyxl.json"
+from label_toolbox.label_cache import LabelCache, has_label, remember_label
+from label_toolbox.label_definition import (
+    DEFAULT_MAX_WORKERS,
+    DefinitionReport,
+    build_label_definition,
+)
+from label_toolbox.label_registry import get_label_registry
+from ooxml_toolbox.custom_properties import (
+    read_custom_properties,
+    update_custom_properties,
+)
+from ooxml_toolbox.package_formats import is_package
+
+from .label_record import (
+    DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+    DEFAULT_SENSITIVITY_TEMPLATES,
+    LABEL_PROPERTY_PREFIX,
+    LabelRecord,
+    MsoAssignmentMethod,
+    label_from_properties,
+    label_property_id,
+    label_record_from_properties,
+    label_to_properties,
+    stale_label_properties,
 )
-DEFAULT_SENSITIVITY_TEMPLATES = "sensitivity_model"
-
 
-class MsoAssignmentMethod(Enum):
-    """Enum representing the assignment method of a sensitivity label."""
+if TYPE_CHECKING:
+    # openpyxl is imported when a workbook is labeled, not for the zip level reads
+    from openpyxl import Workbook
+    from openpyxl.packaging.custom import CustomPropertyList
 
-    Not_Set = -1
-    Standard = 0
-    Privileged = 1
-    Auto = 2
+logger = logging.getLogger()
 
 
 class MSIP_Label(BaseModel):
@@ -65,6 +77,72 @@ class MSIP_Label(BaseModel):
     SiteId: Optional[str]
 
 
+class CustomPropertyIndex:
+    """Name indexed view of the custom document properties of an openpyxl workbook.
+
+    openpyxl keeps the properties in a list: looking up a name is linear, and appending an existing name raises
+    a ValueError (openpyxl 3.1) or duplicates it (older versions, or files written by other tools). The index gives
+    constant time lookup, replacement and deletion, and the properties of a label by LabelId. Changes are written
+    back to the workbook by commit().
+
+    Attributes:
+        custom_doc_props (CustomPropertyList): The custom document properties of the workbook.
+        properties (Dict[str, Any]): The properties by name, in document order. The last value of a duplicated name
+            wins.
+        labels (Dict[str, Set[str]]): The names of the MSIP_Label_* properties, by LabelId.
+        duplicates (int): Number of duplicated names found in the workbook.
+    """
+
+    def __init__(self, custom_doc_props: "CustomPropertyList"):
+        self.custom_doc_props = custom_doc_props
+        self.properties: Dict[str, Any] = {}
+        self.labels: Dict[str, Set[str]] = {}
+        self.duplicates = 0
+        for prop in custom_doc_props.props:
+            if prop.name in self.properties:
+                self.duplicates += 1
+            self.set(prop)
+
+    def __contains__(self, prop_name: str) -> bool:
+        return prop_name in self.properties
+
+    def __getitem__(self, prop_name: str) -> Any:
+        return self.properties[prop_name]
+
+    def set(self, prop: Any) -> None:
+        """Adds a property, or replaces the property with the same name (keeping its position)."""
+        self.properties[prop.name] = prop
+        label_id = label_property_id(prop.name)
+        if label_id is not None:
+            self.labels.setdefault(label_id, set()).add(prop.name)
+
+    def delete(self, prop_name: str) -> bool:
+        """Deletes a property. Returns False if there was no property with that name."""
+        if self.properties.pop(prop_name, None) is None:
+            return False
+        label_id = label_property_id(prop_name)
+        if label_id is not None:
+            self.labels[label_id].discard(prop_name)
+            if not self.labels[label_id]:
+                del self.labels[label_id]
+        return True
+
+    def delete_label(self, label_id: str) -> int:
+        """Deletes the properties of a label. Returns the number of deleted properties."""
+        prop_names = self.labels.pop(label_id, set())
+        for prop_name in prop_names:
+            del self.properties[prop_name]
+        return len(prop_names)
+
+    def values(self) -> Dict[str, Any]:
+        """Returns the value of every property, by name."""
+        return {prop_name: prop.value for prop_name, prop in self.properties.items()}
+
+    def commit(self) -> None:
+        """Writes the properties back to the workbook, without duplicates."""
+        self.custom_doc_props.props = list(self.properties.values())
+
+
 class MSIP_Manager:
     """Manages Microsoft Information Protection (MIP) labels within an Excel workbook.
 
@@ -74,7 +152,7 @@ class MSIP_Manager:
         workbook (Workbook): The openpyxl Workbook instance.
     """
 
-    def __init__(self, workbook: Workbook):
+    def __init__(self, workbook: "Workbook"):
         self.workbook = workbook
 
     def getlabel(self) -> Optional[MSIP_Label]:
@@ -83,44 +161,66 @@ class MSIP_Manager:
         Returns:
             An instance of MSIP_Label if a label is found, otherwise None.
         """
+        label_record = self.getlabel_record()
+        return label_record.to_msip_label() if label_record else None
+
+    def getlabel_record(self) -> Optional[LabelRecord]:
+        """Retrieves the MIP label from the workbook's custom document properties, without validating it.
+
+        Returns:
+            A LabelRecord if a label is found, otherwise None.
+        """
         custom_doc_props = getattr(self.workbook, "custom_doc_props", None)
         if not custom_doc_props:
             return None
-        msip_info = dict()
-        for prop in custom_doc_props.props:
-            logger.debug(
-                f"GetProperty :  {type(prop) =}{prop.name = }: {prop.value = }"
-            )
-            if prop.name.startswith("MSIP_Label"):
-                prop_name_parts = prop.name.split("_")
-                label_id = prop_name_parts[-2]
-                attr = prop_name_parts[-1]
-                msip_info["LabelId"] = label_id
-                msip_info[attr] = prop.value
-        msip_label = MSIP_Label.model_validate(msip_info)
-        return msip_label
+        index = CustomPropertyIndex(custom_doc_props)
+        properties = dict()
+        for label_names in index.labels.values():
+            for prop_name in label_names:
+                prop = index[prop_name]
+                logger.debug(
+                    f"GetProperty :  {type(prop) =}{prop.name = }: {prop.value = }"
+                )
+                properties[prop.name] = prop.value
+        return label_record_from_properties(properties)
 
     def setlabel(self, msip_label: MSIP_Label, justification: Optional[str] = None):
         """Sets the MIP label to the workbook's custom document properties.
 
+        The properties of the label are replaced when the workbook already has them, and the properties of a
+        previous label are removed: setting a label again does not grow the workbook.
+
         Args:
             msip_label (MSIP_Label): The MIP label to be applied to the workbook.
             justification (Optional[str]): Justification for applying the label, if any.
         """
-        custom_doc_props = getattr(self.workbook, "custom_doc_props")
-        # change to now
-        if justification:
-            msip_label.Justification = justification
-        msip_label.SetDate = datetime.now()
-        for prop_name, prop_value in msip_label.model_dump(
-            by_alias=True, exclude={"LabelId"}
+        from openpyxl.packaging.custom import StringProperty
+
+        index = CustomPropertyIndex(getattr(self.workbook, "custom_doc_props"))
+        for label_id in list(index.labels):
+            if label_id != msip_label.LabelId:
+                index.delete_label(label_id)
+        for prop_name, prop_value in label_to_properties(
+            msip_label, justification
         ).items():
-            prop = StringProperty(
-                name=f"MSIP_Label_{msip_label.LabelId}_{prop_name}",
-                value=str(prop_value),
-            )
+            prop = StringProperty(name=prop_name, value=prop_value)
             logger.debug(f"SetProperty : {type(prop) =}{prop.name = }: {prop.value = }")
-            custom_doc_props.append(prop)
+            index.set(prop)
+        index.commit()
+
+    def repair(self) -> int:
+        """Removes the duplicated properties and the properties of previous labels from the workbook.
+
+        Returns:
+            int: The number of removed properties.
+        """
+        index = CustomPropertyIndex(getattr(self.workbook, "custom_doc_props"))
+        removed = index.duplicates
+        for prop_name in stale_label_properties(index.properties):
+            removed += index.delete(prop_name)
+        if removed:
+            index.commit()
+        return removed
 
 
 class MSIP_Configuration:
@@ -142,10 +242,10 @@ class MSIP_Configuration:
 
     def load(self):
         """Loads sensitivity label definitions from the configuration file."""
-        with open(self.sensitivity_configuration_file, "r") as fh_in:
-            for label_name, label_info in json.load(fh_in).items():
-                msip_label = MSIP_Label.model_validate(label_info, from_attributes=True)
-                self.add_sensitivity_label(label_name, msip_label)
+        # parsed and validated once per process, see label_toolbox.label_registry
+        registry = get_label_registry(self.sensitivity_configuration_file)
+        for label_name, compiled_label in registry.labels.items():
+            self.add_sensitivity_label(label_name, compiled_label.msip_label())
         return self
 
     def save(self):
@@ -170,41 +270,88 @@ class MSIP_Configuration:
         return self.sensitivity_labels.keys()
 
 
+def _label_definition(filename: str) -> Optional[Dict[str, Any]]:
+    msip_label = get_label_from_file(filename)
+    return msip_label.model_dump() if msip_label else None
+
+
+def update_sensitivity_label_definition(
+    extract_from: str = DEFAULT_SENSITIVITY_TEMPLATES,
+    sensitivity_configuration_file: str = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    full: bool = False,
+) -> DefinitionReport:
+    """
+    Updates a configuration of sensitivity labels from the label information of Office files, incrementally.
+
+    Only the files added or modified since the previous update are read, concurrently (see
+    label_toolbox.label_definition). The labels are merged into the existing configuration file.
+
+    Args:
+        extract_from (str): The directory path from which to extract sensitivity labels from Office files. Defaults to
+                            the value of DEFAULT_SENSITIVITY_TEMPLATES.
+        sensitivity_configuration_file (str): The file path to save the extracted sensitivity label configuration. Defaults
+                                              to the value of DEFAULT_SENSITIVITY_LABELS_DEFINITION.
+        max_workers (int): Number of files read concurrently.
+        full (bool): Reads all the files again, even the unchanged ones.
+
+    Returns:
+        DefinitionReport: The labels added, removed and changed, and the files that could not be read.
+    """
+    return build_label_definition(
+        extract_from,
+        sensitivity_configuration_file,
+        extractor=_label_definition,
+        is_template=is_package,
+        max_workers=max_workers,
+        full=full,
+    )
+
+
 def create_sensitivity_label_definition(
     extract_from: str = DEFAULT_SENSITIVITY_TEMPLATES,
     sensitivity_configuration_file: str = DEFAULT_SENSITIVITY_LABELS_DEFINITION,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    full: bool = False,
 ) -> MSIP_Configuration:
     """
-    Creates and saves a configuration of sensitivity labels based on label information extracted from Excel files.
+    Creates and saves a configuration of sensitivity labels based on label information extracted from Office files.
 
-    This function scans a directory for Excel files, extracts MIP label information from each file, and compiles
+    This function scans a directory for Office files (xlsx, but also docx, pptx, ... templates as the label is read
+    at zip level), extracts MIP label information from each file, and compiles
     a comprehensive configuration of all labels found. This configuration is then saved to a JSON file for future use.
 
+    The configuration is updated incrementally: only the files added or modified since the previous call are read,
+    concurrently, and labels added by hand to the configuration file are kept (see
+    update_sensitivity_label_definition).
+
     Args:
-        extract_from (str): The directory path from which to extract sensitivity labels from Excel files. Defaults to
+        extract_from (str): The directory path from which to extract sensitivity labels from Office files. Defaults to
                             the value of DEFAULT_SENSITIVITY_TEMPLATES.
         sensitivity_configuration_file (str): The file path to save the extracted sensitivity label configuration. Defaults
                                               to the value of DEFAULT_SENSITIVITY_LABELS_DEFINITION.
+        max_workers (int): Number of files read concurrently.
+        full (bool): Reads all the files again, even the unchanged ones.
 
     Returns:
         MSIP_Configuration: An instance of MSIP_Configuration loaded with the compiled sensitivity labels.
     """
-    msip_configuration = MSIP_Configuration(sensitivity_configuration_file)
-    for filename in glob(os.path.join(extract_from, "*.xlsx")):
-        label_name, _ = os.path.splitext(os.path.basename(filename))
-        msip_label = get_label_from_file(filename)
-        if msip_label:
-            msip_configuration.add_sensitivity_label(label_name, msip_label)
-    msip_configuration.save()
-    return msip_configuration
+    report = update_sensitivity_label_definition(
+        extract_from, sensitivity_configuration_file, max_workers, full
+    )
+    logger.info(report.report())
+    return MSIP_Configuration(sensitivity_configuration_file).load()
 
 
 def get_label_from_file(filename: str) -> Optional[MSIP_Label]:
     """
     Extracts the sensitivity label information from a given Excel file.
 
-    This function opens an Excel workbook and retrieves any sensitivity label information stored within its
-    custom document properties. It is useful for reading label data from individual files.
+    This function retrieves any sensitivity label information stored within the custom document properties of an
+    Excel workbook. It is useful for reading label data from individual files.
+
+    The workbook is not loaded: only the zip central directory is read and only docProps/custom.xml is
+    decompressed, so the cost does not depend on the size of the worksheets.
 
     Args:
         filename (str): The path to the Excel file from which to extract the sensitivity label.
@@ -213,41 +360,102 @@ def get_label_from_file(filename: str) -> Optional[MSIP_Label]:
         Optional[MSIP_Label]: An instance of MSIP_Label containing the extracted label information, if found. Returns
                               None if no label information is present in the file.
     """
-    wb = load_workbook(filename)
-    msip_manager = MSIP_Manager(wb)
-    return msip_manager.getlabel()
+    return label_from_properties(read_custom_properties(filename))
 
 
-def set_label_to_workbook(wb: Workbook, label: MSIP_Label):
+def set_label_to_workbook(
+    wb: Union["Workbook", Any], label: MSIP_Label, justification: Optional[str] = None
+):
     """
-    Applies a sensitivity label to an openpyxl Workbook object.
+    Applies a sensitivity label to a workbook being created, the label is written when the workbook is saved.
 
     This function sets the provided MIP label information as custom document properties of the given Workbook.
-    It's utilized to programmatically apply sensitivity labels to Excel files being managed through openpyxl.
+    Supported workbooks:
+
+    - an openpyxl Workbook, including a write-only one (Workbook(write_only=True)): the label must be set before
+      the workbook is saved,
+    - an xlsxwriter Workbook (ex: the book of a pandas ExcelWriter with the xlsxwriter engine): the label must be
+      set before the workbook is closed, and only once (xlsxwriter cannot remove a custom property).
+
+    The rows are neither loaded nor rewritten: a report streamed with a write-only workbook is labeled during its
+    single save.
 
     Args:
-        wb (Workbook): The openpyxl Workbook instance to which the label will be applied.
+        wb (Union[Workbook, xlsxwriter.Workbook]): The workbook to which the label will be applied.
         label (MSIP_Label): The sensitivity label to apply to the workbook.
+        justification (Optional[str]): Justification for applying the label, if any.
 
     No return value.
     """
+    if hasattr(wb, "set_custom_property"):
+        # xlsxwriter: the properties are written when the workbook is closed
+        for prop_name, prop_value in label_to_properties(label, justification).items():
+            wb.set_custom_property(prop_name, prop_value, "text")
+        return
     msip_manager = MSIP_Manager(wb)
-    msip_manager.setlabel(label)
+    msip_manager.setlabel(label, justification)
+
+
+def set_label_to_excel_writer(
+    writer: Any, label: MSIP_Label, justification: Optional[str] = None
+):
+    """
+    Applies a sensitivity label to the workbook of a pandas ExcelWriter, the label is written when the writer is
+    closed (end of the with block).
+
+    Both the openpyxl and the xlsxwriter engines are supported::
 
+        with pandas.ExcelWriter("report.xlsx", engine="xlsxwriter") as writer:
+            set_label_to_excel_writer(writer, label)
+            dataframe.to_excel(writer, sheet_name="Report")
 
-def set_label_to_file(filename: str, label: MSIP_Label):
+    pandas is not imported by this module, the writer is only expected to expose its workbook as writer.book.
+
+    Args:
+        writer (pandas.ExcelWriter): The ExcelWriter, opened with the openpyxl or the xlsxwriter engine.
+        label (MSIP_Label): The sensitivity label to apply to the workbook.
+        justification (Optional[str]): Justification for applying the label, if any.
+
+    Raises:
+        NotImplementedError: If the writer engine is not supported (ex: odf).
+    """
+    from openpyxl import Workbook
+
+    book = writer.book
+    if not isinstance(book, Workbook) and not hasattr(book, "set_custom_property"):
+        raise NotImplementedError(
+            f"Sensitivity labels are not supported with the {type(book).__module__} engine"
+        )
+    set_label_to_workbook(book, label, justification)
+
+
+def set_label_to_file(
+    filename: str,
+    label: MSIP_Label,
+    force: bool = False,
+    cache: Optional[LabelCache] = None,
+) -> bool:
     """
     Applies a sensitivity label to an Excel file.
 
-    Opens the specified Excel file, applies the given sensitivity label to it, and saves the changes. This is a
-    convenience function that combines file loading, label application, and saving operations into one step.
+    The label is written at zip level: only docProps/custom.xml (and, when the file had no custom properties yet,
+    [Content_Types].xml and _rels/.rels) is rewritten, every other part of the file is copied with its raw
+    compressed bytes. The workbook is neither loaded nor saved with openpyxl, so the cost does not depend on the
+    size of the worksheets. A file that already carries the label is not rewritten.
 
     Args:
         filename (str): The path to the Excel file to which the label will be applied.
         label (MSIP_Label): The sensitivity label to apply to the file.
+        force (bool): Rewrites the file even if it already carries the label.
+        cache (Optional[LabelCache]): Content hash cache of the file labels (see label_toolbox.label_cache).
 
-    No return value.
+    Returns:
+        bool: True if the file was written, False if it already carried the label.
     """
-    wb = load_workbook(filename)
-    set_label_to_workbook(wb, label)
-    wb.save(filename)
+    if not force and has_label(filename, label.LabelId, cache):
+        return False
+    update_custom_properties(
+        filename, label_to_properties(label), remove_prefix=LABEL_PROPERTY_PREFIX
+    )
+    remember_label(filename, label.LabelId, cache)
+    return True
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the packages live in pygadgeteer/ (see [tool.setuptools.packages.find])
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "pygadgeteer")
+)
@@ -0,0 +1,60 @@
+"""The hung leases of the office_toolbox application pool, against fake Office applications."""
+
+import threading
+import time
+
+from benchmarks.fake_office import FakeDispatch
+from office_toolbox.application_pool import ApplicationPool
+
+
+class HungDispatch(FakeDispatch):
+    """Fake Office applications whose Quit blocks until unblocked."""
+
+    def __init__(self):
+        super().__init__()
+        self.unblocked = threading.Event()
+
+    def call(self, name: str) -> None:
+        super().call(name)
+        if name == "Application.Quit":
+            self.unblocked.wait(5)
+
+
+def test_hung_lease_is_quit_without_holding_the_pool():
+    dispatch = HungDispatch()
+    pool = ApplicationPool(dispatch=dispatch, max_size=1, max_lease_time=0.05)
+    hung = pool.acquire("Excel.Application")
+    time.sleep(0.1)
+    acquired = []
+    thread = threading.Thread(
+        target=lambda: acquired.append(pool.acquire("Excel.Application"))
+    )
+    thread.start()
+    # the hung instance is being quit by the thread, the pool answers meanwhile
+    while not dispatch.calls["Application.Quit"]:
+        time.sleep(0.01)
+    start = time.monotonic()
+    assert pool.evict_idle() == 0
+    assert time.monotonic() - start < 1
+    dispatch.unblocked.set()
+    thread.join(5)
+    assert acquired and acquired[0] is not hung
+    # the owner of the dropped lease gives it back late, it is not quit twice
+    pool.release(hung)
+    assert dispatch.calls["Application.Quit"] == 1
+    pool.release(acquired[0])
+    pool.close()
+    assert dispatch.calls["Application.Quit"] == 2
+
+
+def test_instances_idle_since_a_burst_are_quit_on_release():
+    dispatch = FakeDispatch()
+    pool = ApplicationPool(dispatch=dispatch, max_size=2, idle_timeout=0.05)
+    first = pool.acquire("Excel.Application")
+    second = pool.acquire("Excel.Application")
+    pool.release(first)
+    time.sleep(0.1)
+    pool.release(second)
+    assert dispatch.calls["Application.Quit"] == 1
+    assert [app for app, _ in pool._idle["Excel.Application"]] == [second]
+    pool.close()
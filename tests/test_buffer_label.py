@@ -0,0 +1,81 @@
+"""Labeling of documents held in memory or read from a stream, ex: an upload."""
+
+import io
+import json
+import zipfile
+
+import pytest
+
+from benchmarks.synthetic_documents import write_synthetic_document
+from label_toolbox.label_registry import LabelRegistry
+from ooxml_toolbox.sensitivity_manager import (
+    get_label_from_buffer,
+    set_label_to_buffer,
+)
+
+
+class _WriteOnly(io.RawIOBase):
+    """An output that cannot seek, ex: an HTTP response."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+
+@pytest.fixture
+def label(tmp_path):
+    filename = tmp_path / "sensitivity_labels_definition.json"
+    filename.write_text(
+        json.dumps(
+            {
+                "Public": {
+                    "LabelId": "id-public",
+                    "LabelName": "Public",
+                    "ActionId": None,
+                    "Method": "Standard",
+                    "ContentBits": 0,
+                    "Enabled": True,
+                    "SetDate": None,
+                    "SiteId": "site",
+                }
+            }
+        )
+    )
+    return LabelRegistry.load(str(filename))["Public"]
+
+
+@pytest.fixture
+def upload(tmp_path):
+    document = tmp_path / "upload.docx"
+    write_synthetic_document(str(document), size=50000)
+    return document.read_bytes()
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview, io.BytesIO])
+def test_sources(upload, label, wrap):
+    assert get_label_from_buffer(wrap(upload)) is None
+    labeled = set_label_to_buffer(wrap(upload), label, justification="upload")
+    assert get_label_from_buffer(labeled).LabelId == "id-public"
+    with zipfile.ZipFile(io.BytesIO(labeled)) as archive:
+        assert archive.testzip() is None
+        with zipfile.ZipFile(io.BytesIO(upload)) as original:
+            assert archive.read("word/document.xml") == original.read(
+                "word/document.xml"
+            )
+
+
+def test_unseekable_output(upload, label):
+    output = _WriteOnly()
+    assert set_label_to_buffer(upload, label, output=output) is None
+    assert get_label_from_buffer(b"".join(output.chunks)).LabelId == "id-public"
+
+
+def test_not_a_package(label):
+    with pytest.raises(zipfile.BadZipFile):
+        set_label_to_buffer(b"not a zip archive", label)
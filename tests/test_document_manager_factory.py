@@ -0,0 +1,27 @@
+"""The document manager classes of the office_toolbox factory."""
+
+from label_toolbox.label_engine import ComLabelEngine, LabelOperation
+from office_toolbox import document_manager_factory as factory
+from office_toolbox.word_document_manager import WordDocumentManager
+
+
+class TextDocumentManager:
+    def __init__(self, fullpath, pool=None):
+        self.fullpath = fullpath
+
+
+def test_document_factory_imports_the_named_classes():
+    assert factory.get_document_manager_class(".docx") is WordDocumentManager
+    assert factory.get_document_manager_class(".pdf") is None
+
+
+def test_document_factory_keeps_accepting_classes(monkeypatch):
+    monkeypatch.setitem(factory.DOCUMENT_FACTORY, ".txt", TextDocumentManager)
+    manager = factory.document_manager_factory("notes.txt")
+    assert isinstance(manager, TextDocumentManager)
+
+
+def test_extensions_are_matched_in_any_case():
+    assert factory.get_document_manager_class(".DOCX") is WordDocumentManager
+    assert ComLabelEngine().supports("REPORT.Xlsx", LabelOperation.Write)
+    assert not ComLabelEngine().supports("report.pdf", LabelOperation.Write)
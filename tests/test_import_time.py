@@ -0,0 +1,40 @@
+"""The zip level entry modules do not import the heavy dependencies (see benchmarks.import_time)."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("pydantic", "openpyxl", "win32com", "pythoncom")
+
+# run in a fresh interpreter: the modules already imported by the test session do not count
+_PROBE = """
+import importlib, json, sys
+importlib.import_module(sys.argv[1])
+print(json.dumps([name for name in sys.argv[2:] if name in sys.modules]))
+"""
+
+_PACKAGES_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pygadgeteer")
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "ooxml_toolbox.sensitivity_manager",
+        "label_toolbox.bulk_label",
+        "label_toolbox.label_engine",
+        "office_toolbox.document_manager_factory",
+    ],
+)
+def test_entry_module_does_not_import_heavy_modules(module):
+    environment = dict(os.environ, PYTHONPATH=_PACKAGES_ROOT)
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE, module, *HEAVY_MODULES],
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert json.loads(completed.stdout) == []
@@ -0,0 +1,77 @@
+"""The documents already carrying their label are skipped, known copies without being read."""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from benchmarks.synthetic_documents import write_synthetic_document
+from label_toolbox import label_cache
+from label_toolbox.label_cache import LabelCache, content_hash, has_label
+from label_toolbox.label_registry import LabelRegistry
+from ooxml_toolbox.sensitivity_manager import set_label_to_package
+
+
+@pytest.fixture
+def label(tmp_path):
+    filename = tmp_path / "sensitivity_labels_definition.json"
+    filename.write_text(
+        json.dumps(
+            {
+                "Public": {
+                    "LabelId": "id-public",
+                    "LabelName": "Public",
+                    "ActionId": None,
+                    "Method": "Standard",
+                    "ContentBits": 0,
+                    "Enabled": True,
+                    "SetDate": None,
+                    "SiteId": "site",
+                }
+            }
+        )
+    )
+    return LabelRegistry.load(str(filename))["Public"]
+
+
+def test_labeled_document_is_not_rewritten(tmp_path, label):
+    document = str(tmp_path / "report.xlsx")
+    write_synthetic_document(document, size=10000)
+    assert set_label_to_package(document, label)
+    os.utime(document, (0, 0))
+    assert not set_label_to_package(document, label)
+    assert os.path.getmtime(document) == 0
+    assert set_label_to_package(document, label, force=True)
+    assert os.path.getmtime(document) != 0
+
+
+def test_copies_are_recognized_by_content_hash(tmp_path, label, monkeypatch):
+    template = str(tmp_path / "template.docx")
+    write_synthetic_document(template, size=10000)
+    with LabelCache(str(tmp_path / "label_cache.sqlite")) as cache:
+        assert not has_label(template, "id-public", cache)
+        assert set_label_to_package(template, label, cache=cache)
+        assert cache.get(content_hash(template)) == "id-public"
+
+        def read_label_id(filename):
+            raise AssertionError(f"{filename} was read")
+
+        monkeypatch.setattr(label_cache, "read_label_id", read_label_id)
+        copy = str(tmp_path / "folder" / "copy.docx")
+        os.mkdir(os.path.dirname(copy))
+        shutil.copyfile(template, copy)
+        assert not set_label_to_package(copy, label, cache=cache)
+        assert not has_label(copy, "id-secret", cache)
+
+
+def test_cache_covers_documents_labeled_through_com(tmp_path):
+    document = str(tmp_path / "legacy.xls")
+    with open(document, "wb") as fh_out:
+        fh_out.write(os.urandom(4096))
+    with LabelCache(str(tmp_path / "label_cache.sqlite")) as cache:
+        assert not has_label(document, "id-public", cache)
+        assert cache.get(content_hash(document)) is None
+        label_cache.remember_label(document, "id-public", cache)
+        assert has_label(document, "id-public", cache)
+    assert not has_label(document, "id-public")
@@ -0,0 +1,37 @@
+"""The classification rules of label_classifier, on plain text."""
+
+from label_toolbox.label_classifier import (
+    Classifier,
+    ClassificationRule,
+    luhn_checksum,
+)
+
+NIR = "1 85 05 78 006 084 91"
+
+
+def classify(rules, text):
+    rule, _, _ = Classifier(rules).classify_text([text])
+    return rule.name if rule is not None else None
+
+
+def test_rejected_detector_does_not_hide_an_overlapping_detector():
+    rules = [
+        ClassificationRule("bank", "Secret", detectors=("card_number",)),
+        ClassificationRule("hr", "Internal", detectors=("fr_nir",)),
+    ]
+    assert classify(rules, f"NIR: {NIR}") == "hr"
+
+
+def test_less_sensitive_match_does_not_hide_an_overlapping_match():
+    rules = [
+        ClassificationRule("project", "Secret", keywords=("secret project",)),
+        ClassificationRule("marking", "Internal", patterns=(r"top secret",)),
+    ]
+    assert classify(rules, "a top secret project") == "project"
+    assert classify(rules, "a top secret plan") == "marking"
+
+
+def test_luhn_checksum_rejects_repeated_digits():
+    assert luhn_checksum("4111 1111 1111 1111")
+    assert not luhn_checksum("0000000000000")
+    assert not luhn_checksum("0000 0000 0000 0000")
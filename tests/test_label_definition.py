@@ -0,0 +1,52 @@
+"""The merge of the labels of several templates with the same name."""
+
+import json
+
+from label_toolbox.label_definition import build_label_definition
+
+PUBLIC = {"LabelId": "id-public", "LabelName": "Public"}
+
+
+def extract(path):
+    with open(path) as fh_in:
+        return json.load(fh_in)
+
+
+def build(folder, configuration):
+    report = build_label_definition(str(folder), str(configuration), extract)
+    with open(configuration) as fh_in:
+        return report, json.load(fh_in)
+
+
+def test_label_is_removed_with_its_last_template(tmp_path):
+    folder, configuration = tmp_path / "templates", tmp_path / "labels.json"
+    folder.mkdir()
+    for name in ("Public.docx", "Public.xlsx"):
+        (folder / name).write_text(json.dumps(PUBLIC))
+    report, labels = build(folder, configuration)
+    assert report.added == ["Public"] and not report.conflicts
+    assert labels == {"Public": PUBLIC}
+
+    (folder / "Public.docx").unlink()
+    report, labels = build(folder, configuration)
+    assert report.removed == [] and labels == {"Public": PUBLIC}
+
+    (folder / "Public.xlsx").unlink()
+    report, labels = build(folder, configuration)
+    assert report.removed == ["Public"] and labels == {}
+
+
+def test_templates_defining_a_label_differently_are_reported(tmp_path):
+    folder, configuration = tmp_path / "templates", tmp_path / "labels.json"
+    folder.mkdir()
+    for name in ("Public.docx", "Public.xlsx"):
+        (folder / name).write_text(json.dumps(PUBLIC))
+    build(folder, configuration)
+
+    (folder / "Public.xlsx").write_text(json.dumps(dict(PUBLIC, LabelId="id-other")))
+    report, labels = build(folder, configuration)
+    assert report.conflicts == {
+        "Public": [str(folder / "Public.docx"), str(folder / "Public.xlsx")]
+    }
+    # the previous definition is kept
+    assert labels == {"Public": PUBLIC} and report.changed == []
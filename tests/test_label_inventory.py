@@ -0,0 +1,34 @@
+"""The purge of the label inventory, when directories cannot be read."""
+
+import logging
+import os
+
+from label_toolbox.label_inventory import LabelInventory
+
+
+def test_unreadable_directories_keep_their_documents(tmp_path, monkeypatch, caplog):
+    root = tmp_path / "share"
+    for name in ("a/report.docx", "a/sub/notes.docx", "b/budget.xlsx"):
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_bytes(b"not a package")
+    with LabelInventory(str(tmp_path / "inventory.sqlite")) as inventory:
+        assert len(list(inventory.scan(str(root)))) == 3
+
+        unreadable = str(root / "a")
+        scandir = os.scandir
+
+        def failing_scandir(path):
+            if path == unreadable:
+                raise PermissionError(13, "Permission denied", path)
+            return scandir(path)
+
+        monkeypatch.setattr(os, "scandir", failing_scandir)
+        (root / "b" / "budget.xlsx").unlink()
+        with caplog.at_level(logging.WARNING):
+            assert list(inventory.scan(str(root))) == []
+        assert unreadable in caplog.text
+        paths = sorted(entry.path for entry in inventory.entries(str(root)))
+        assert paths == [
+            str(root / "a" / "report.docx"),
+            str(root / "a" / "sub" / "notes.docx"),
+        ]
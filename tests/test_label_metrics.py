@@ -0,0 +1,71 @@
+"""The metrics of the package level code, recorded through the ooxml_toolbox hooks."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.synthetic_documents import write_synthetic_document
+from label_toolbox.label_metrics import disable_metrics, enable_metrics
+from label_toolbox.label_registry import LabelRegistry
+from ooxml_toolbox.sensitivity_manager import set_label_to_package
+
+_PACKAGES_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pygadgeteer")
+
+
+@pytest.fixture
+def metrics():
+    yield enable_metrics()
+    disable_metrics()
+
+
+def test_zip_level_labeling_is_recorded(tmp_path, metrics):
+    configuration = tmp_path / "labels.json"
+    configuration.write_text(
+        json.dumps(
+            {
+                "Public": {
+                    "LabelId": "id-public",
+                    "LabelName": "Public",
+                    "ActionId": None,
+                    "Method": "Standard",
+                    "ContentBits": 0,
+                    "Enabled": True,
+                    "SetDate": None,
+                    "SiteId": "site",
+                }
+            }
+        )
+    )
+    document = str(tmp_path / "report.xlsx")
+    write_synthetic_document(document, size=10000)
+    label = LabelRegistry.load(str(configuration))["Public"]
+    assert set_label_to_package(document, label)
+    counters = {
+        (counter["name"], tuple(sorted(counter["labels"].items())))
+        for counter in metrics.snapshot()["counters"]
+    }
+    assert ("bytes_total", (("direction", "written"),)) in counters
+    phases = {
+        histogram["labels"].get("phase")
+        for histogram in metrics.snapshot()["histograms"]
+    }
+    assert "write" in phases
+
+
+def test_zip_layer_does_not_import_label_toolbox():
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, ooxml_toolbox.custom_properties;"
+            " print('label_toolbox' in sys.modules)",
+        ],
+        env=dict(os.environ, PYTHONPATH=_PACKAGES_ROOT),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert completed.stdout.strip() == "False"
@@ -0,0 +1,70 @@
+"""The precedence of the rules of a labeling policy: the first matching rule wins."""
+
+import pytest
+
+from label_toolbox.bulk_label import BulkStatus, _iter_policy_chunks
+from label_toolbox.label_policy import LabelPolicy
+
+
+def resolve(rules, path, **kwargs):
+    return LabelPolicy(rules, case_sensitive=True, **kwargs).resolve(path)
+
+
+def test_subtree_rule_between_glob_rules_of_the_same_directory():
+    rules = [
+        ("/finance/*/archive/*.xlsx", "Archive"),
+        ("/finance/**", "Restricted"),
+        ("/finance/*.xlsx", "Public"),
+    ]
+    assert resolve(rules, "/finance/q.xlsx") == "Restricted"
+    assert resolve(rules, "/finance/2023/archive/q.xlsx") == "Archive"
+
+
+@pytest.mark.parametrize(
+    "path, label",
+    [
+        ("/finance/report.xlsx", "Restricted"),
+        ("/public/drafts/memo.docx", None),
+        ("/public/memo.docx", "Public"),
+        ("/public", "Public"),
+        ("/hr/team/budget.xlsm", "Confidential"),
+        ("/hr/team/budget.xlsx", "Internal"),
+    ],
+)
+def test_first_matching_rule_wins(path, label):
+    rules = [
+        ("/finance/**", "Restricted"),
+        ("/public/drafts/**", None),
+        ("/public", "Public"),
+        ("*.xlsm", "Confidential"),
+        ("/finance/*.xlsx", "Public"),
+    ]
+    assert resolve(rules, path, default="Internal") == label
+
+
+def test_paths_are_matched_relative_to_the_root():
+    rules = [("/finance/**", "Restricted")]
+    policy = LabelPolicy(rules, root="/srv/share", case_sensitive=True)
+    assert policy.resolve("/srv/share/finance/q.xlsx") == "Restricted"
+    assert policy.resolve("/srv/other/finance/q.xlsx") is None
+
+
+def test_case_insensitive_matching():
+    rules = [("/Finance/*.XLSX", "Restricted")]
+    assert LabelPolicy(rules, case_sensitive=False).resolve("/finance/q.xlsx")
+    assert resolve(rules, "/finance/q.xlsx") is None
+
+
+def test_excluded_paths_are_drained_every_chunk():
+    policy = LabelPolicy([("/archive/**", None)], default="Public", case_sensitive=True)
+    paths = [f"/archive/{index}.docx" for index in range(10)] + ["/q.docx"]
+    excluded, drained, chunks = [], [], []
+    for chunk in _iter_policy_chunks(paths, policy, 3, excluded):
+        assert len(excluded) <= 3
+        chunks.extend(chunk)
+        drained.extend(excluded)
+        excluded.clear()
+    drained.extend(excluded)
+    assert chunks == [("/q.docx", "Public")]
+    assert [result.path for result in drained] == paths[:10]
+    assert {result.status for result in drained} == {BulkStatus.Excluded}
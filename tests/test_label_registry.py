@@ -0,0 +1,41 @@
+"""The JSON cache of the label registry."""
+
+import json
+import pickle
+
+from label_toolbox.label_registry import CACHE_SUFFIX, LabelRegistry
+
+DEFINITIONS = {
+    "Public": {
+        "LabelId": "id-public",
+        "LabelName": "Public",
+        "ActionId": None,
+        "Method": "Standard",
+        "ContentBits": 0,
+        "Enabled": True,
+        "SetDate": "2024-05-01T10:30:00+00:00",
+        "SiteId": "site",
+    }
+}
+
+
+def test_cache_round_trip(tmp_path):
+    configuration = tmp_path / "labels.json"
+    configuration.write_text(json.dumps(DEFINITIONS))
+    loaded = LabelRegistry.load(str(configuration), use_cache=True)
+    cache = json.loads((tmp_path / f"labels.json{CACHE_SUFFIX}").read_text())
+    assert cache[2] == DEFINITIONS
+    cached = LabelRegistry._load_cache(str(configuration), loaded.signature)
+    assert cached is not None
+    assert cached["Public"].label == loaded["Public"].label
+    assert cached["Public"].payload == loaded["Public"].payload
+
+
+def test_pickled_cache_is_not_loaded(tmp_path):
+    configuration = tmp_path / "labels.json"
+    configuration.write_text(json.dumps(DEFINITIONS))
+    cache = tmp_path / f"labels.json{CACHE_SUFFIX}"
+    cache.write_bytes(pickle.dumps((1, (0, 0), {}, {})))
+    registry = LabelRegistry.load(str(configuration), use_cache=True)
+    assert registry["Public"].label_id == "id-public"
+    assert json.loads(cache.read_text())[0] == 2
@@ -0,0 +1,61 @@
+"""The HTTP requests of the labeling service."""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from benchmarks.synthetic_documents import write_synthetic_document
+from label_toolbox.label_service import LabelService
+
+
+@pytest.fixture
+def configuration(tmp_path):
+    filename = tmp_path / "labels.json"
+    filename.write_text(
+        json.dumps({"Public": {"LabelId": "id-public", "LabelName": "Public"}})
+    )
+    return str(filename)
+
+
+async def http_request(service, request):
+    server = await asyncio.start_server(service._handle_connection, "127.0.0.1", 0)
+    async with server:
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+
+def test_malformed_content_length_is_a_bad_request(configuration):
+    service = LabelService(configuration)
+    for content_length in (b"abc", b"-1"):
+        response = asyncio.run(
+            http_request(
+                service,
+                b"POST / HTTP/1.1\r\nContent-Length: " + content_length + b"\r\n\r\n",
+            )
+        )
+        head, _, body = response.partition(b"\r\n\r\n")
+        assert head.startswith(b"HTTP/1.1 400 Bad Request")
+        assert json.loads(body)["status"] == "failed"
+
+
+def test_worker_crash_only_fails_the_running_batch(tmp_path, configuration):
+    document = str(tmp_path / "report.xlsx")
+    write_synthetic_document(document)
+    service = LabelService(configuration, max_workers=1)
+    # a worker process dies
+    service.executor.submit(os._exit, 1)
+
+    async def get_label_twice():
+        return [await service.handle({"op": "get", "path": document}) for _ in range(2)]
+
+    first, second = asyncio.run(get_label_twice())
+    assert first["status"] == "failed" and "BrokenProcessPool" in first["error"]
+    assert second == {"path": document, "status": "ok", "label": None}
+    service.executor.shutdown()
@@ -0,0 +1,88 @@
+"""The watch-folder daemon, polling a folder of synthetic documents."""
+
+import json
+import os
+
+import pytest
+
+from benchmarks.synthetic_documents import write_synthetic_document
+from label_toolbox.bulk_label import BulkResult, BulkStatus
+from label_toolbox.label_registry import LabelRegistry
+from label_toolbox.label_watcher import LabelWatcher
+
+
+@pytest.fixture
+def label(tmp_path):
+    filename = tmp_path / "sensitivity_labels_definition.json"
+    filename.write_text(
+        json.dumps(
+            {
+                "Public": {
+                    "LabelId": "id-public",
+                    "LabelName": "Public",
+                    "ActionId": None,
+                    "Method": "Standard",
+                    "ContentBits": 0,
+                    "Enabled": True,
+                    "SetDate": None,
+                    "SiteId": "site",
+                }
+            }
+        )
+    )
+    return LabelRegistry.load(str(filename))["Public"]
+
+
+def test_documents_in_flight_when_stopped_are_remembered(tmp_path, label):
+    root = tmp_path / "share"
+    root.mkdir()
+    document = str(root / "report.xlsx")
+    write_synthetic_document(document)
+    watcher = LabelWatcher(
+        str(root),
+        label=label,
+        settle=0,
+        use_inotify=False,
+        initial_scan=True,
+        max_workers=1,
+    )
+    # stops before the worker process answers
+    results = list(watcher.run(duration=0.01))
+    assert [(result.path, result.status) for result in results] == [
+        (document, BulkStatus.Labeled)
+    ]
+    assert not watcher._queued
+    # the rewrite by the worker is recognized, the document is not labeled again
+    watcher.notify(document)
+    assert list(watcher.run(duration=0.5)) == []
+
+
+def test_documents_are_labeled_once_settled(tmp_path, label):
+    document = str(tmp_path / "report.xlsx")
+    write_synthetic_document(document)
+    watcher = LabelWatcher(str(tmp_path), label=label, settle=10, use_inotify=False)
+    watcher.notify(document, now=0)
+    assert list(watcher._settled(5)) == []
+    # still written: the deadline is pushed back
+    write_synthetic_document(document, size=10000)
+    assert list(watcher._settled(10)) == []
+    assert list(watcher._settled(15)) == []
+    assert list(watcher._settled(20)) == [document]
+    assert list(watcher._settled(30)) == []
+
+
+def test_notifications_are_deduplicated(tmp_path, label):
+    document = str(tmp_path / "report.xlsx")
+    removed = str(tmp_path / "removed.xlsx")
+    write_synthetic_document(document)
+    write_synthetic_document(removed)
+    watcher = LabelWatcher(str(tmp_path), label=label, settle=10, use_inotify=False)
+    for now in range(5):
+        watcher.notify(document, now=now)
+        watcher.notify(removed, now=now)
+    os.remove(removed)
+    assert list(watcher._settled(14)) == [document]
+    # the rewrite of a document labeled by the watcher is not labeled again
+    watcher._remember(BulkResult(document, BulkStatus.Labeled))
+    watcher.notify(document, now=20)
+    assert list(watcher._settled(30)) == []
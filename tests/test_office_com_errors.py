@@ -0,0 +1,40 @@
+"""The COM error handling of office_toolbox, against fake Office applications (also runs without pywin32)."""
+
+import json
+
+import pytest
+
+from benchmarks.fake_office import FakeDispatch
+from office_toolbox.application_pool import ApplicationPool
+from office_toolbox.labeling_session import LabelingSession
+
+
+@pytest.fixture
+def configuration(tmp_path):
+    filename = tmp_path / "sensitivity_labels_definition.json"
+    filename.write_text(
+        json.dumps({"Public": {"LabelId": "id-public", "LabelName": "Public"}})
+    )
+    return str(filename)
+
+
+def test_lease_keeps_the_error_of_the_caller():
+    pool = ApplicationPool(dispatch=FakeDispatch(), max_size=1)
+    with pytest.raises(ValueError):
+        with pool.lease("Excel.Application"):
+            raise ValueError("not a COM error")
+    pool.close()
+
+
+def test_labeling_session_reports_failures_and_goes_on(tmp_path, configuration):
+    pool = ApplicationPool(dispatch=FakeDispatch(), max_size=1)
+    paths = [str(tmp_path / "report.pdf"), str(tmp_path / "report.xlsx")]
+    with LabelingSession(configuration, pool=pool) as session:
+        unknown = session.label_file(paths[1], "Secret", force=True)
+        outcomes = list(session.label_files(paths, "Public", force=True))
+    pool.close()
+
+    assert not unknown.success and unknown.error.startswith("KeyError")
+    assert not outcomes[0].success
+    assert outcomes[0].error.startswith("NotImplementedError")
+    assert outcomes[1].success
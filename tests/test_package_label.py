@@ -0,0 +1,142 @@
+"""Labels written and read at zip level, without loading the documents."""
+
+import io
+import json
+import os
+import zipfile
+
+import pytest
+
+from benchmarks.synthetic_documents import write_synthetic_document
+from label_toolbox.label_cache import read_label_id
+from label_toolbox.label_registry import LabelRegistry
+from ooxml_toolbox.custom_properties import read_custom_properties
+from ooxml_toolbox.sensitivity_manager import (
+    get_label_from_package,
+    set_label_to_package,
+)
+from ooxml_toolbox.zip_package import compact_package
+from openpyxl_toolbox.sensitivity_manager import get_label_from_file, set_label_to_file
+
+LABEL_PARTS = {"docProps/custom.xml", "[Content_Types].xml", "_rels/.rels"}
+
+
+class _Unseekable(io.RawIOBase):
+    """A write-only stream: zipfile writes its entries with a data descriptor."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.stream.write(data)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    filename = tmp_path / "sensitivity_labels_definition.json"
+    filename.write_text(
+        json.dumps(
+            {
+                name: {
+                    "LabelId": f"id-{name.lower()}",
+                    "LabelName": name,
+                    "ActionId": None,
+                    "Method": "Standard",
+                    "ContentBits": 0,
+                    "Enabled": True,
+                    "SetDate": None,
+                    "SiteId": "site",
+                }
+                for name in ("Public", "Secret")
+            }
+        )
+    )
+    return LabelRegistry.load(str(filename))
+
+
+def read_parts(filename):
+    with zipfile.ZipFile(filename) as archive:
+        assert archive.testzip() is None
+        return {info.filename: archive.read(info) for info in archive.infolist()}
+
+
+def label_ids(filename):
+    return {
+        name.split("_")[2]
+        for name in read_custom_properties(filename)
+        if name.startswith("MSIP_Label_")
+    }
+
+
+def with_data_descriptors(filename):
+    parts = read_parts(filename)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(_Unseekable(buffer), "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in parts.items():
+            archive.writestr(name, data)
+    with open(filename, "wb") as fh_out:
+        fh_out.write(buffer.getvalue())
+    with zipfile.ZipFile(filename) as archive:
+        assert all(info.flag_bits & 0x08 for info in archive.infolist())
+
+
+def test_workbook_label_round_trip(tmp_path, registry):
+    document = str(tmp_path / "report.xlsx")
+    write_synthetic_document(document, size=100000, custom_properties=5)
+    before = read_parts(document)
+    assert get_label_from_file(document) is None
+    assert set_label_to_file(document, registry["Public"].msip_label())
+    assert get_label_from_file(document).LabelId == "id-public"
+    after = read_parts(document)
+    assert set(after) == set(before) | {"docProps/custom.xml"}
+    for name, data in before.items():
+        if name not in LABEL_PARTS:
+            assert after[name] == data
+    assert read_custom_properties(document)["Property_0"]
+
+
+def test_relabel_removes_the_previous_label(tmp_path, registry):
+    document = str(tmp_path / "memo.docx")
+    write_synthetic_document(document, size=10000)
+    assert set_label_to_package(document, registry["Public"])
+    assert set_label_to_package(document, registry["Secret"])
+    assert get_label_from_package(document).LabelId == "id-secret"
+    assert label_ids(document) == {"id-secret"}
+    assert not set_label_to_package(document, registry["Secret"])
+
+
+def test_data_descriptor_input(tmp_path, registry):
+    document = str(tmp_path / "report.xlsx")
+    write_synthetic_document(document, size=10000)
+    with_data_descriptors(document)
+    before = read_parts(document)
+    assert set_label_to_package(document, registry["Secret"])
+    after = read_parts(document)
+    assert read_label_id(document) == "id-secret"
+    for name, data in before.items():
+        if name not in LABEL_PARTS:
+            assert after[name] == data
+
+
+@pytest.mark.parametrize("data_descriptors", [False, True])
+def test_append_relabel(tmp_path, registry, data_descriptors):
+    document = str(tmp_path / "report.xlsx")
+    write_synthetic_document(document, size=200000, seed=1)
+    if data_descriptors:
+        with_data_descriptors(document)
+    before = read_parts(document)
+    size = os.path.getsize(document)
+    assert set_label_to_package(document, registry["Public"], append=True)
+    assert set_label_to_package(document, registry["Secret"], append=True)
+    # only the label parts and the central directory were appended
+    assert os.path.getsize(document) - size < 10000
+    assert label_ids(document) == {"id-secret"}
+    after = read_parts(document)
+    for name, data in before.items():
+        if name not in LABEL_PARTS:
+            assert after[name] == data
+    assert compact_package(document) > 0
+    assert read_parts(document) == after
@@ -0,0 +1,41 @@
+"""Labeling a file through COM, against fake Office applications."""
+
+import json
+
+import pytest
+
+from benchmarks.fake_office import FakeDispatch, FakeDocuments
+from label_toolbox.label_cache import LabelCache, content_hash
+from office_toolbox._com import com_error
+from office_toolbox.application_pool import ApplicationPool
+from office_toolbox.set_sensitivity_label import set_sensitivity_label_to_file
+
+
+@pytest.fixture
+def configuration(tmp_path):
+    filename = tmp_path / "sensitivity_labels_definition.json"
+    filename.write_text(
+        json.dumps({"Public": {"LabelId": "id-public", "LabelName": "Public"}})
+    )
+    return str(filename)
+
+
+def test_document_that_cannot_be_opened_is_not_remembered(
+    tmp_path, configuration, monkeypatch
+):
+    def failing_open(self, filename, *argv, **kwargs):
+        raise com_error("cannot open")
+
+    monkeypatch.setattr(FakeDocuments, "Open", failing_open)
+    document = tmp_path / "report.docx"
+    document.write_bytes(b"not a package")
+    pool = ApplicationPool(dispatch=FakeDispatch(), max_size=1)
+    with LabelCache(str(tmp_path / "cache.sqlite")) as cache:
+        with pytest.raises(OSError):
+            set_sensitivity_label_to_file(
+                str(document), "Public", configuration, pool, cache=cache
+            )
+        assert cache.get(content_hash(str(document))) != "id-public"
+    # the application went back to the pool
+    assert not pool._leased
+    pool.close()